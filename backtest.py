@@ -1,19 +1,42 @@
 import os
+import time
 import logging
+import numpy as np
 import pandas as pd
+from typing import List, Optional
 
 import backtrader as bt
-import backtrader.feeds as btfeeds
 
-from data import load_stock_data
-from strategies import DMAStrategy
+from data import load_stock_data, make_data_feed, set_data_backend, suspension_filler, needs_suspension_filler
+from strategies import DMAStrategy, IndicatorCache, BacktestSnapshot, SNAPSHOT_FILE
 from utils import *
+from vectorized import run_vectorized, supports
 
 
-def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: dict, bt_analyzers:list):
-    
+def load_pool_data(global_options: dict) -> dict:
+    """按 global_options 中的数据设置 (backend / load_mode / cache / align_calendar) 加载股票池数据。"""
+    if "backend" in global_options:
+        set_data_backend(global_options["backend"], global_options.get("parquet_root"))
+    return load_stock_data(global_options["data_pool"], global_options["start_date"], global_options["end_date"],
+                           mode=global_options.get("load_mode", "serial"),
+                           cache=global_options.get("cache", False),
+                           align_calendar=global_options.get("align_calendar", False))
+
+
+def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: dict, bt_analyzers:list,
+                 snapshot: bool = False, resume: Optional[str] = None):
+    """
+    snapshot 为 True 时在输出目录中保存回测结束时的快照 (snapshot.pkl)。
+    resume 为之前保存的快照文件或其输出目录: 只加载快照最后几根 K 线之后的数据, 从快照继续回测到 end_date, 结果与从 start_date 完整回测相同。
+    续跑时策略、参数、股票池、start_date、资金、佣金与分析器需要与快照一致; 每日增量回测时同时设置 snapshot=True, 供下一次续跑。
+
+    各阶段 (A ~ F) 的耗时、K 线/秒与峰值内存保存在输出目录的 telemetry.json / telemetry_phases.csv 中。
+    """
+
     # --- A.1 初始化输出和日志 ---
     output_dir, logger = setup_logger(global_options["strategy_name"], global_options["start_date"], global_options["end_date"])
+    telemetry = RunTelemetry("backtest", global_options["strategy_name"], output_dir)
+    telemetry.phase("A", "初始化输出与参数")
     print_and_log(f"回测开始: {global_options["strategy_name"]}")
     print(f"回测结果保存路径: {output_dir}")
 
@@ -21,30 +44,56 @@ def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: d
     params_log = ",".join([f"{k}={v}" for k,v in strategy_params.items()])
     print_and_log(f"回测策略参数: {params_log}")
 
+    snapshot_meta = {"strategy": f"{strategy.__module__}:{strategy.__qualname__}",
+                     "params": {k: v for k, v in strategy_params.items() if k != 'log_dir'},
+                     "data_pool": list(global_options["data_pool"]), "start_date": global_options["start_date"],
+                     "cash": global_options['cash'], "commission": global_options['commission'], "analyzers": list(bt_analyzers)}
     strategy_params['log_dir'] = output_dir
 
+    # --- A.3 回测快照 ---
+    bt_snapshot, load_options = None, global_options
+    if (snapshot or resume) and "snapshot" not in strategy.params._getkeys():
+        raise ValueError(f"回测快照需要策略继承 Strategy_withlog, {strategy.__name__} 不支持")
+    if resume:
+        bt_snapshot = BacktestSnapshot.load(resume)
+        bt_snapshot.check(snapshot_meta)
+        load_options = global_options | {"start_date": bt_snapshot.warm_start}
+        print_and_log(f"从快照继续回测: 快照截止 {bt_snapshot.end_date}, 从 {bt_snapshot.warm_start} 开始加载数据")
+    elif snapshot:
+        bt_snapshot = BacktestSnapshot(meta=snapshot_meta)
+    snapshot_kwargs = {"snapshot": bt_snapshot} if bt_snapshot is not None else {}
+
     # --- B. 加载数据 ---
-    stock_data_dict = load_stock_data(global_options["data_pool"], global_options["start_date"], global_options["end_date"])
+    telemetry.phase("B", "加载数据")
+    stock_data_dict = load_pool_data(load_options)
 
     if not stock_data_dict:
         print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 回测结束", level=logging.ERROR)
+        telemetry.save(status="no_data")
         return
+    telemetry.count(stocks=len(stock_data_dict), bars=sum(len(df) for df in stock_data_dict.values()))
     
     # --- C. 配置 Cerebro ---
+    telemetry.phase("C", "配置 Cerebro")
     cerebro = bt.Cerebro()
 
     # --- C.1 初始资金与费用设置 ---
     cerebro.broker.setcash(global_options['cash'])
     cerebro.broker.setcommission(commission=global_options['commission'])
+    if needs_suspension_filler(stock_data_dict):
+        # 对齐到交易日历时, 停牌日不成交
+        cerebro.broker.set_filler(suspension_filler)
     # cerebro.addsizer(bt.sizers.FixedSize, stake=1)
 
     # --- C.2 添加数据源 ---
+    telemetry.phase("C.2", "添加数据源")
     for code, df in stock_data_dict.items():
-        data = btfeeds.PandasData(dataname=df, name=code)
+        data = make_data_feed(df, code)
         cerebro.adddata(data)
 
     # --- C.3 添加策略 ---
-    cerebro.addstrategy(strategy, **strategy_params)
+    telemetry.phase("C.3", "添加策略与分析器")
+    cerebro.addstrategy(strategy, **strategy_params, **snapshot_kwargs)
 
     # --- C.4 配置分析器 ---
     analyzers_list = bt_analyzers
@@ -55,17 +104,26 @@ def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: d
     cerebro.addwriter(bt.WriterFile, csv=True, out=trades_path)
 
     # --- D. 运行回测 ---
+    telemetry.phase("D", "运行回测")
     print_and_log("初始价值: %.2f" % cerebro.broker.getvalue())
     results = cerebro.run()
     print_and_log('最终价值: %.2f' % cerebro.broker.getvalue())
 
     # --- E. 回测结果分析 ---
+    telemetry.phase("E", "回测结果分析")
     if not results:
         print_and_log("策略运行失败，无返回结果，回测结束")
+        telemetry.save(status="failed")
         return
     
     strat = results[0]
+    if snapshot:
+        snapshot_path = os.path.join(output_dir, SNAPSHOT_FILE)
+        bt_snapshot.save(snapshot_path)
+        print_and_log(f"回测快照已保存到: {snapshot_path}")
+
     metrics, ret_series = generate_analysis(strat, analyzers_list)
+    telemetry.phase("E.2", "QuantStats 报告")
     report_path = generate_quantstats_report(ret_series, output_dir, global_options["strategy_name"])
 
     if report_path:
@@ -74,6 +132,7 @@ def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: d
         print_and_log("QuantStats HTML 报告生成失败。", level=logging.ERROR)
 
     # --- F. 控制台输出指标 ---
+    telemetry.phase("F", "输出指标")
     metrics_formatted = format_float_output(metrics)
     print_and_log(f"总回报率 (rtot): { metrics_formatted.get('rtot')}")
     print_and_log(f"年化回报率 (rnorm): { metrics_formatted.get('rnorm')}")
@@ -82,25 +141,64 @@ def run_backtest(strategy: bt.Strategy, strategy_params: dict, global_options: d
     print_and_log(f"总交易数 (total): { metrics_formatted.get('total')}")
     print_and_log(f"胜率 (winrate): { metrics_formatted.get('winrate')}")
     print("--------------------------------------")
+    telemetry.save()
 
     logging.shutdown()
     cerebro.plot()
     return
 
-def run_opt(strategy: bt.Strategy ,opt_params: dict, opt_vars: list, global_options: dict, opt_analyzers: list, gen_report: bool = False):
-    # --- A. 初始化输出和日志 ---
-    output_dir, logger = setup_logger_opt(global_options["strategy_name"], global_options["start_date"], global_options["end_date"])
-    print_and_log(f"参数优化开始: {global_options["strategy_name"]}")
-    print(f"优化结果保存路径: {output_dir}")
+def run_combo(combo: dict, stock_data_dict: dict, strategy: bt.Strategy, remains_params: dict, global_options: dict,
+              opt_analyzers: list, output_dir: str, gen_report: bool = False, ind_cache: Optional[IndicatorCache] = None,
+              with_returns: bool = False):
+    """
+    回测单个参数组合, 返回指标与参数合并后的结果, 失败时返回 None。并行优化时在工作进程中执行。
+    ind_cache 为同一次优化共享的指标缓存, 为 None 时每个参数组合独立计算指标。
+    with_returns 为 True 时结果中附带日收益率序列 (键 "returns", 需要 opt_analyzers 包含 PyFolio)。
+    """
+    # --- a. 配置 Cerebro ---
+    cerebro = bt.Cerebro()
+    cerebro.broker.setcash(global_options["cash"])
+    cerebro.broker.setcommission(commission=global_options["commission"])
+    if needs_suspension_filler(stock_data_dict):
+        cerebro.broker.set_filler(suspension_filler)
+    # cerebro.addsizer(bt.sizers.FixedSize, stake=1)
 
-    # --- B. 预加载数据 ---
-    stock_data_dict = load_stock_data(global_options["data_pool"], global_options["start_date"], global_options["end_date"])
+    # --- b. 添加数据源 ---
+    for code, df in stock_data_dict.items():
+        data = make_data_feed(df, code)
+        cerebro.adddata(data)
 
-    if not stock_data_dict:
-        print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 优化结束", level=logging.ERROR)
-        return None, output_dir
-    
-    # --- C. 生成参数组合 ---
+    # --- c. 添加策略 ---
+    cache_kwargs = {"ind_cache": ind_cache} if ind_cache is not None else {}
+    cerebro.addstrategy(strategy, **combo, **remains_params, is_opt=True, **cache_kwargs)
+
+    # --- d. 配置分析器 ---
+    analyzers_list = opt_analyzers
+    configure_analyzers(cerebro=cerebro, analyzers_list=analyzers_list)
+
+    # --- e. 运行回测 ---
+    results = cerebro.run()
+
+    # --- f. 回测结果分析 ---
+    if not results:
+        print_and_log("本次回测运行失败，无结果", level=logging.ERROR)
+        return None
+
+    strat = results[0]
+    metrics, ret_series = generate_analysis(strat, analyzers_list)
+    if gen_report:
+        generate_quantstats_report(ret_series, output_dir, global_options["strategy_name"], suffix=True)
+    bt_result = metrics | combo
+    bt_result['combo'] = combo
+    if with_returns:
+        bt_result['returns'] = ret_series
+    return bt_result
+
+def build_opt_combos(opt_params: dict, opt_vars: list):
+    """
+    返回 (待优化参数的参数网格 ParamGrid, 其余固定参数)。
+    参数网格可以迭代、len() 为满足约束的参数组合数, 参数组合在迭代时才逐个生成, 大网格不需要一次性展开。
+    """
     opt_dict = {}
     for optvar in opt_vars:
         opt_dict[optvar] = opt_params[optvar]
@@ -108,53 +206,352 @@ def run_opt(strategy: bt.Strategy ,opt_params: dict, opt_vars: list, global_opti
     if not constraints:
         print_and_log(f"注意：优化参数组合没有约束条件", level=logging.WARNING)
 
-    possible_combos = opt_param_combination(opt_dict, constraints)
+    grid = ParamGrid(opt_dict, constraints)
+    print_and_log(f"参数网格共 {grid.size} 个点, 满足约束的参数组合 {grid.count()} 个")
     remains_params = {k: v for k, v in opt_params.items() if k not in opt_vars and k != "constraints"}
+    return grid, remains_params
+
+def run_opt(strategy: bt.Strategy ,opt_params: dict, opt_vars: list, global_options: dict, opt_analyzers: list, gen_report: bool = False,
+            workers: Optional[int] = 1, chunksize: Optional[int] = None, ind_cache: bool = True, resume: Optional[str] = None,
+            search=None, queue=None, local_workers: Optional[int] = None, search_kwargs: Optional[dict] = None):
+    """
+    参数优化。workers 为 1 时在当前进程中逐个回测; 大于 1 时使用进程池并行, 为 None 或 0 时使用全部 CPU 核心。
+    chunksize 为并行时每个任务包含的参数组合数, 默认按每个进程约 4 个任务划分。两种方式返回的 df_results 相同。
+    ind_cache 为 True 且策略支持 (继承 Strategy_withlog 并通过 self.indicator 创建指标) 时, 参数相同的指标在本次优化中只计算一次,
+    并行时每个工作进程各自缓存。
+
+    每个完成的参数组合都会追加写入 output_dir/results.jsonl。resume 为中断的优化的 output_dir 时沿用该目录,
+    跳过其中已完成的参数组合 (策略、参数、global_options、opt_analyzers 与数据均相同), 只回测剩余的组合。
+
+    search 为 utils.search 中的搜索策略 (RandomSearch / SuccessiveHalving / TPESearch 的实例, 或 "random" / "halving" / "tpe")
+    时不再回测全部网格, 而是在网格内按搜索策略和预算回测, 返回的 df_results 为搜索记录 (每次回测一行, 附 step / fraction / elapsed 列),
+    同时保存为 output_dir/search_trace.csv。search 为名称时按 search_kwargs 创建 (如 {"max_evals": 60}), 且必须设置 max_evals 或 max_seconds。
+
+    queue 为任务队列 (utils.work_queue 的队列或地址, 如 "sqlite:///opt_queue.db") 时作为分布式优化的协调进程: 参数组合按 chunksize 个一批
+    (默认 16) 发布到队列, 由各节点上的工作进程 (python distributed.py <队列地址>) 回测, 结果按参数网格的顺序收集, df_results 与单机运行相同。
+    local_workers 为本机同时启动的工作进程数, 默认按 workers 确定, 为 0 时只发布与收集。
+
+    回测过程中按间隔输出进度 (参数组合/秒、预计剩余时间); 各阶段耗时、参数组合/秒、各工作进程的利用率与峰值内存
+    保存在 output_dir 的 telemetry.json / telemetry_phases.csv / telemetry_combos.csv 中 (本次运行, 续跑时覆盖)。
+    """
+    if search is not None:
+        search = make_search(search, search_kwargs)
+
+    # --- A. 初始化输出和日志 ---
+    output_dir, logger = setup_logger_opt(global_options["strategy_name"], global_options["start_date"], global_options["end_date"],
+                                          output_dir=resume)
+    telemetry = RunTelemetry("opt", global_options["strategy_name"], output_dir)
+    telemetry.phase("A", "初始化输出和日志")
+    print_and_log(f"参数优化{"续跑" if resume else "开始"}: {global_options["strategy_name"]}")
+    print(f"优化结果保存路径: {output_dir}")
+
+    # --- B. 预加载数据 ---
+    telemetry.phase("B", "加载数据")
+    stock_data_dict = load_pool_data(global_options)
+
+    if not stock_data_dict:
+        print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 优化结束", level=logging.ERROR)
+        telemetry.save(status="no_data")
+        return None, output_dir
+    telemetry.count(stocks=len(stock_data_dict), bars=sum(len(df) for df in stock_data_dict.values()))
+    
+    # --- C. 生成参数网格, 读取已完成的结果 ---
+    telemetry.phase("C", "生成参数网格")
+    grid, remains_params = build_opt_combos(opt_params, opt_vars)
+    n_combos = grid.count()
+    cache = IndicatorCache() if ind_cache and "ind_cache" in strategy.params._getkeys() else None
+    combo_kwargs = dict(strategy=strategy, remains_params=remains_params, global_options=global_options,
+                        opt_analyzers=opt_analyzers, output_dir=output_dir, gen_report=gen_report, ind_cache=cache)
+
+    results_log = ResultsLog(output_dir)
+    fingerprint = data_fingerprint(stock_data_dict)
+
+    def key_of(combo):
+        return combo_key(strategy, combo | remains_params, global_options, fingerprint, opt_analyzers)
+
+    # 参数组合按网格顺序以序号表示, 只在回测时逐个生成; 续跑时逐个核对已完成的结果, 不保留参数组合
+    done = results_log.load() if resume else {}
+    all_results: List[Optional[dict]] = [None] * n_combos
+    pending_mask = np.ones(n_combos, dtype=bool)
+    if done:
+        for i, combo in enumerate(grid):
+            result = done.get(key_of(combo))
+            if result is not None:
+                all_results[i] = result
+                pending_mask[i] = False
+    n_pending = int(pending_mask.sum())
+    if resume:
+        print_and_log(f"已完成 {n_combos - n_pending} 个参数组合, 剩余 {n_pending} 个")
+
+    def pending_combos():
+        """按网格顺序逐个生成待回测的 (序号, 参数组合)。"""
+        for i, combo in enumerate(grid):
+            if pending_mask[i]:
+                yield i, combo
+
+    def save_result(i, combo, result):
+        all_results[i] = result
+        results_log.append(key_of(combo), result)
+
+    telemetry.count(grid_combos=n_combos, workers=resolve_workers(workers))
+
+    if search is not None:
+        # 搜索策略需要在全部参数组合中抽样, 展开整个网格
+        telemetry.phase("D", "参数搜索")
+        df_results = run_search(search, list(grid), stock_data_dict, fingerprint, done, results_log, combo_kwargs,
+                                workers=workers, chunksize=chunksize)
+        if cache is not None:
+            cache.close()
+        telemetry.combos_done = len(df_results)
+        telemetry.save()
+        logging.shutdown()
+        return df_results, output_dir
 
     # --- D. 遍历参数进行回测 ---
-    all_results = []
-    for combo in possible_combos:
-        print_and_log(f"正在回测参数组合：{", ".join([f"{k}={v}" for k,v in combo.items()])}")
-
-        # --- a. 配置 Cerebro ---
-        cerebro = bt.Cerebro()
-        cerebro.broker.setcash(global_options["cash"])
-        cerebro.broker.setcommission(commission=global_options["commission"])
-        # cerebro.addsizer(bt.sizers.FixedSize, stake=1)
-
-        # --- b. 添加数据源 ---
-        for code, df in stock_data_dict.items():
-            data = btfeeds.PandasData(dataname=df, name=code)
-            cerebro.adddata(data)
-
-        # --- c. 添加策略 ---
-        cerebro.addstrategy(strategy, **combo, **remains_params, is_opt=True)
-
-        # --- d. 配置分析器 ---
-        analyzers_list = opt_analyzers
-        configure_analyzers(cerebro=cerebro, analyzers_list=analyzers_list)
-
-        # --- e. 运行回测 ---
-        results = cerebro.run()    
-
-        # --- f. 回测结果分析 ---
-        if not results:
-            print_and_log("本次回测运行失败，无结果", level=logging.ERROR)
-            continue
-            
-        strat = results[0]
-        metrics, ret_series = generate_analysis(strat, analyzers_list)
-        if gen_report:
-            generate_quantstats_report(ret_series, output_dir, global_options["strategy_name"], suffix=True)
-        bt_result = metrics | combo
-        bt_result['combo'] = combo
-        all_results.append(bt_result)
+    telemetry.phase("D", "回测参数组合")
+    telemetry.start_combos(n_pending)
+    run_status = "failed"
+    try:
+        if queue is not None:
+            # distributed 依赖本模块, 在此处导入
+            from distributed import run_distributed, strategy_path
+            spec = {"strategy": strategy_path(strategy), "remains_params": remains_params, "global_options": global_options,
+                    "opt_analyzers": opt_analyzers, "output_dir": output_dir, "gen_report": gen_report,
+                    "ind_cache": cache is not None, "fingerprint": fingerprint}
+            # job 由参数网格的定义 (而不是每个参数组合的键) 确定, 续跑时沿用同一个 job
+            grid_params = {"grid": dict(zip(grid.keys, grid.values)), "constraints": grid.constraints,
+                           "remains_params": remains_params}
+            job_key = combo_key(strategy, grid_params, global_options, fingerprint, opt_analyzers)
+            n_local = resolve_workers(workers) if local_workers is None else local_workers
+            def on_collected(i, combo, result):
+                save_result(i, combo, result)
+                telemetry.combo_done()
+
+            run_distributed(queue, grid, job_key, pending_mask, on_collected, spec,
+                            batch_size=chunksize, local_workers=n_local, stock_data_dict=stock_data_dict)
+        elif resolve_workers(workers) == 1:
+            for i, combo in pending_combos():
+                print_and_log(f"正在回测参数组合：{", ".join([f"{k}={v}" for k,v in combo.items()])}")
+                started, start_time = time.time(), time.perf_counter()
+                save_result(i, combo, run_combo(combo, stock_data_dict, **combo_kwargs))
+                telemetry.combo_done((os.getpid(), started, time.perf_counter() - start_time))
+        elif n_pending:
+            print_and_log(f"并行回测 {n_pending} 个参数组合, 进程数: {resolve_workers(workers)}")
+            pending_idx = np.flatnonzero(pending_mask)
+            n_done = 0
+
+            def on_result(j, combo, result):
+                nonlocal n_done
+                n_done += 1
+                save_result(int(pending_idx[j]), combo, result)
+                status = "完成" if result is not None else "失败"
+                print_and_log(f"[{n_done}/{n_pending}] 参数组合{status}：{", ".join([f"{k}={v}" for k,v in combo.items()])}")
+                telemetry.combo_done()
+
+            run_combos_parallel(run_combo, (combo for _, combo in pending_combos()), stock_data_dict, workers=workers,
+                                chunksize=chunksize, on_result=on_result, timings=telemetry.combo_timings,
+                                n_combos=n_pending, collect=False, **combo_kwargs)
+        run_status = "ok"
+    except KeyboardInterrupt:
+        run_status = "interrupted"
+        print_and_log(f"优化被中断, 已完成的结果保存在 {results_log.path}, 可使用 resume=\"{output_dir}\" 继续", level=logging.WARNING)
+        raise
+    finally:
+        if cache is not None:
+            if cache.hits or cache.misses:
+                print_and_log(f"指标缓存: 计算 {cache.misses} 个, 复用 {cache.hits} 次")
+            cache.close()
+        if run_status != "ok":
+            telemetry.save(status=run_status)
+    all_results = [result for result in all_results if result is not None]
     
     # --- E. 格式化输出所有结果 ---
+    telemetry.phase("E", "汇总结果")
     print_and_log("优化已完成")
     if gen_report:
         print_and_log(f"回测报告存放位置为: {output_dir}")
     df_results = pd.DataFrame(all_results)
+    telemetry.save()
+    logging.shutdown()
+    return df_results, output_dir
+
+
+def run_search(search, possible_combos: list, stock_data_dict: dict, fingerprint: str, done: dict, results_log: ResultsLog,
+               combo_kwargs: dict, workers: Optional[int] = 1, chunksize: Optional[int] = None) -> pd.DataFrame:
+    """run_opt 的搜索模式: 按 search 选择参数组合回测, 结果同样写入 results_log, 已有结果 (续跑) 直接复用。"""
+    search = make_search(search)
+    strategy, remains_params, global_options = combo_kwargs["strategy"], combo_kwargs["remains_params"], combo_kwargs["global_options"]
+    n_workers = resolve_workers(workers)
+    print_and_log(f"参数搜索: {type(search).__name__}, 网格共 {len(possible_combos)} 个参数组合, "
+                  f"预算: {search.max_evals or "不限"} 次 / {search.max_seconds or "不限"} 秒")
+
+    def evaluate(batch, fraction):
+        data = window_data(stock_data_dict, fraction)
+        data_fp = fingerprint if data is stock_data_dict else data_fingerprint(data)
+        batch_keys = [combo_key(strategy, combo | remains_params, global_options, data_fp, combo_kwargs["opt_analyzers"])
+                      for combo in batch]
+        results = [done.get(key) for key in batch_keys]
+        todo = [i for i, result in enumerate(results) if result is None]
+        if n_workers > 1 and len(todo) > 1:
+            new_results = run_combos_parallel(run_combo, [batch[i] for i in todo], data, workers=workers, chunksize=chunksize,
+                                              **combo_kwargs)
+        else:
+            new_results = [run_combo(batch[i], data, **combo_kwargs) for i in todo]
+        for i, result in zip(todo, new_results):
+            results[i] = result
+            results_log.append(batch_keys[i], result)
+        for j, (combo, result) in enumerate(zip(batch, results)):
+            status = "完成" if result is not None else "失败"
+            print_and_log(f"[{len(search.trace) + j + 1}] 窗口 {fraction:.0%} 参数组合{status}：{", ".join([f"{k}={v}" for k,v in combo.items()])}, "
+                          f"{search.metric}={None if result is None else result.get(search.metric)}")
+        return results
+
+    trace = search.run(possible_combos, evaluate, batch_size=n_workers)
+    print_and_log(f"搜索完成, 共回测 {len(trace)} 次, 用时 {trace["elapsed"].max() if not trace.empty else 0:.1f} 秒")
+    for metric in ("sharpe", "rtot"):
+        best = best_of(trace, metric)
+        if best is not None:
+            print_and_log(f"最佳 {metric} = {best[metric]}: {", ".join([f"{k}={v}" for k,v in best["combo"].items()])}")
+
+    trace_path = os.path.join(combo_kwargs["output_dir"], "search_trace.csv")
+    trace.to_csv(trace_path, index=False)
+    print_and_log(f"搜索记录已保存到: {trace_path}")
+    return trace
+
+def screen_opt(strategy: bt.Strategy, opt_params: dict, opt_vars: list, global_options: dict, opt_analyzers: list,
+               top_n: int = 10, sort_by: str = "sharpe", ascending: bool = False, batch_size: int = 512, workers: Optional[int] = 1):
+    """
+    先用向量化引擎回测全部参数组合做初筛, 再用 backtrader 对按 sort_by 排名前 top_n 的组合重新回测确认。
+
+    只支持单只股票与 vectorized.VECTOR_STRATEGIES 中的内置策略。返回 (全部组合的初筛结果, 前 top_n 个组合的 backtrader 结果, 输出目录),
+    两个结果表的格式都与 run_opt 的 df_results 相同。
+    """
+    # --- A. 初始化输出和日志 ---
+    output_dir, logger = setup_logger_opt(global_options["strategy_name"], global_options["start_date"], global_options["end_date"])
+    print_and_log(f"参数初筛开始: {global_options["strategy_name"]}")
+    print(f"优化结果保存路径: {output_dir}")
+
+    if not supports(strategy):
+        raise ValueError(f"向量化引擎不支持策略 {strategy.__name__}, 请使用 run_opt")
+
+    # --- B. 预加载数据 ---
+    stock_data_dict = load_pool_data(global_options)
+
+    if not stock_data_dict:
+        print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 优化结束", level=logging.ERROR)
+        return None, None, output_dir
+    if len(stock_data_dict) > 1:
+        raise ValueError("向量化初筛只支持单只股票, data_pool 中有多只股票时请使用 run_opt")
+    df = next(iter(stock_data_dict.values()))
+
+    # --- C. 向量化初筛 ---
+    grid, remains_params = build_opt_combos(opt_params, opt_vars)
+    possible_combos = list(grid)
+    print_and_log(f"向量化回测 {len(possible_combos)} 个参数组合")
+    start_time = time.perf_counter()
+    metrics_list = run_vectorized(strategy, [combo | remains_params for combo in possible_combos], df,
+                                  global_options["cash"], global_options["commission"], opt_analyzers, batch_size=batch_size)
+    print_and_log(f"向量化回测完成, 用时 {time.perf_counter() - start_time:.1f} 秒")
+
+    all_results = []
+    for combo, metrics in zip(possible_combos, metrics_list):
+        bt_result = metrics | combo
+        bt_result['combo'] = combo
+        all_results.append(bt_result)
+    df_results = pd.DataFrame(all_results)
+
+    # --- D. backtrader 确认 ---
+    ranked = pd.to_numeric(df_results[sort_by], errors="coerce").sort_values(ascending=ascending, na_position="last")
+    top_combos = [possible_combos[i] for i in ranked.index[:top_n]]
+    print_and_log(f"使用 backtrader 确认按 {sort_by} 排名前 {len(top_combos)} 的参数组合")
+
+    combo_kwargs = dict(strategy=strategy, remains_params=remains_params, global_options=global_options,
+                        opt_analyzers=opt_analyzers, output_dir=output_dir)
+    if resolve_workers(workers) == 1:
+        confirmed = [run_combo(combo, stock_data_dict, **combo_kwargs) for combo in top_combos]
+    else:
+        confirmed = run_combos_parallel(run_combo, top_combos, stock_data_dict, workers=workers, **combo_kwargs)
+    df_confirmed = pd.DataFrame([result for result in confirmed if result is not None])
+
+    if not df_confirmed.empty:
+        screened = df_results.loc[ranked.index[:top_n], sort_by].tolist()
+        mismatched = [c for c, a, b in zip(top_combos, screened, df_confirmed[sort_by]) if a != b]
+        if mismatched:
+            print_and_log(f"注意：{len(mismatched)} 个参数组合的初筛结果与 backtrader 不一致: {mismatched}", level=logging.WARNING)
+
+    print_and_log("优化已完成")
+    logging.shutdown()
+    return df_results, df_confirmed, output_dir
+
+def run_symbol(code: str, stock_data_dict: dict, strategy: bt.Strategy, strategy_params: dict, global_options: dict,
+               analyzers_list: list, output_dir: str, vectorized: bool = False):
+    """对单只股票独立回测, 返回 {code, bars, 各项指标}, 失败时返回 None。并行时在工作进程中执行。"""
+    df = stock_data_dict[code]
+    if vectorized:
+        metrics = run_vectorized(strategy, [strategy_params], df, global_options["cash"], global_options["commission"], analyzers_list)[0]
+        return {"code": code, "bars": len(df)} | metrics
+    result = run_combo(strategy_params, {code: df}, strategy, {}, global_options, analyzers_list, output_dir)
+    if result is None:
+        return None
+    metrics = {k: v for k, v in result.items() if k != "combo" and k not in strategy_params}
+    return {"code": code, "bars": len(df)} | metrics
+
+def run_sweep(strategy: bt.Strategy, strategy_params: dict, global_options: dict, analyzers_list: list,
+              workers: Optional[int] = None, chunksize: Optional[int] = None, vectorized: bool = False):
+    """
+    逐股回测: 用同一组策略参数对 data_pool 中的每只股票分别回测 (每只股票一个独立的 Cerebro, 不需要同步多个数据源),
+    在进程池中并行执行。返回 (每只股票一行的指标表, 输出目录), 指标表保存为 sweep_results.csv。
+    vectorized 为 True 时使用向量化引擎 (只支持 vectorized.VECTOR_STRATEGIES 中的内置策略, 结果与 backtrader 一致)。
+    """
+    if vectorized and not supports(strategy):
+        raise ValueError(f"向量化引擎不支持策略 {strategy.__name__}, 请使用 vectorized=False")
+    # --- A. 初始化输出和日志 ---
+    name = global_options["strategy_name"]
+    output_dir = make_filename("results", "Sweep", name, global_options["start_date"], global_options["end_date"],
+                               time.strftime(r'%H%M%S'))
+    output_dir, logger = setup_logger_opt(name, global_options["start_date"], global_options["end_date"], output_dir=output_dir)
+    print_and_log(f"逐股回测开始: {name}, 股票池 {len(global_options["data_pool"])} 只")
+    print_and_log(f"策略参数: {",".join([f"{k}={v}" for k,v in strategy_params.items()])}")
+    print(f"结果保存路径: {output_dir}")
+
+    # --- B. 预加载数据 ---
+    start_time = time.perf_counter()
+    stock_data_dict = load_pool_data(global_options)
+    if not stock_data_dict:
+        print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 回测结束", level=logging.ERROR)
+        return None, output_dir
+    load_time = time.perf_counter() - start_time
+    missing = len(global_options["data_pool"]) - len(stock_data_dict)
+    print_and_log(f"数据加载完成: {len(stock_data_dict)} 只股票, 用时 {load_time:.1f} 秒" + (f", {missing} 只无数据" if missing else ""))
+
+    # --- C. 逐股回测 ---
+    codes = list(stock_data_dict)
+    symbol_kwargs = dict(strategy=strategy, strategy_params=strategy_params, global_options=global_options,
+                         analyzers_list=analyzers_list, output_dir=output_dir, vectorized=vectorized)
+    start_time = time.perf_counter()
+    if resolve_workers(workers) == 1:
+        results = [run_symbol(code, stock_data_dict, **symbol_kwargs) for code in codes]
+    else:
+        print_and_log(f"并行回测 {len(codes)} 只股票, 进程数: {resolve_workers(workers)}")
+        results = run_combos_parallel(run_symbol, codes, stock_data_dict, workers=workers, chunksize=chunksize, **symbol_kwargs)
+    run_time = time.perf_counter() - start_time
+
+    # --- D. 汇总 ---
+    df_results = pd.DataFrame([result for result in results if result is not None])
+    failed = len(codes) - len(df_results)
+    n_bars = int(df_results["bars"].sum()) if not df_results.empty else 0
+    print_and_log(f"逐股回测完成: {len(df_results)} 只股票" + (f", {failed} 只失败" if failed else "") +
+                  f", 用时 {run_time:.1f} 秒, {len(codes) / max(run_time, 1e-9):.1f} 只/秒, {n_bars / max(run_time, 1e-9):,.0f} 根K线/秒")
+
+    for metric in ("rtot", "rnorm", "sharpe"):
+        if metric in df_results:
+            values = pd.to_numeric(df_results[metric], errors="coerce").dropna()
+            if not values.empty:
+                print_and_log(f"{metric}: 均值 {values.mean():.4f}, 中位数 {values.median():.4f}, 大于 0 的比例 {(values > 0).mean():.2%}")
+
+    results_path = os.path.join(output_dir, "sweep_results.csv")
+    df_results.to_csv(results_path, index=False)
+    print_and_log(f"逐股结果已保存到: {results_path}")
     logging.shutdown()
     return df_results, output_dir
 
@@ -180,7 +577,13 @@ if __name__ == "__main__":
     bt_analyzers = ["Returns", "DrawDown", "SharpeRatio", 'TradeAnalyzer', 'PyFolio']
 
     run_backtest(DMAStrategy, strategy_params, global_options, bt_analyzers)
+    # 每日增量回测: 首次完整回测并保存快照, 之后更新 end_date, 从上一次的输出目录续跑并保存新的快照:
+    # run_backtest(DMAStrategy, strategy_params, global_options, bt_analyzers, snapshot=True)
+    # run_backtest(DMAStrategy, strategy_params, global_options, bt_analyzers, snapshot=True, resume="results/...")
     
+    # --- 逐股回测: 同一组参数在整个股票池上的表现 ---
+    # sweep_df, output_dir = run_sweep(DMAStrategy, strategy_params, global_options | {"data_pool": ["600519", "000858", "000333"]}, bt_analyzers[:-1], workers=None)
+
     # --- 参数优化 ---
     opt_params = {
         "fast": range(5, 51, 5),
@@ -192,7 +595,15 @@ if __name__ == "__main__":
     opt_vars = ['fast', 'slow']
     opt_analyzers = ["Returns", "DrawDown", "SharpeRatio", 'TradeAnalyzer']
 
-    # results_df, output_dir = run_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers)
+    # results_df, output_dir = run_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers, workers=None)
+    # 中断后从同一输出目录继续:
+    # results_df, output_dir = run_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers, workers=None, resume=output_dir)
+    # 网格较大时只按搜索策略回测一部分参数组合 (搜索记录保存在 search_trace.csv):
+    # trace_df, output_dir = run_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers, search=TPESearch(max_evals=60))
+    # 多台机器分布式优化: 各节点运行 python distributed.py /shared/opt_queue, 本机作为协调进程:
+    # results_df, output_dir = run_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers, queue="/shared/opt_queue", local_workers=0)
+    # 大网格先用向量化引擎初筛, 再用 backtrader 确认排名靠前的组合:
+    # results_df, confirmed_df, output_dir = screen_opt(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers, top_n=10)
     # best_sharpe_row = plot_heatmap(results_df, "sharpe", output_dir, 'fast', 'slow')
     # best_rtot_row = plot_heatmap(results_df, "rtot", output_dir, 'fast', 'slow')
 
@@ -0,0 +1 @@
+from .synthetic import synthetic_codes, trading_days, generate_market, iter_market, loader_frames, fill_parquet, fill_postgres, fill_cache
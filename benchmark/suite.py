@@ -0,0 +1,347 @@
+"""
+可重复的性能基准, 在 synthetic.py 生成的合成行情上测量:
+
+    load      加载 N 只股票的耗时 (DuckDB 后端读取 Parquet 数据集 / 本地缓存), 行/秒
+    backtest  各内置策略单只股票回测的耗时 (run_combo, 分析器与 run_backtest 相同, 不含画图与报告), K 线/秒
+    pool      N 只股票组合回测 (一个 Cerebro 中 N 个数据源) 的耗时, K 线/秒
+    opt       参数优化 run_opt 的耗时 (含数据加载与结果汇总), 参数组合/秒
+
+每个用例在新的进程 (spawn) 中运行, 先预热 warmup 次再计时 repeat 次, 记录各次耗时、中位耗时与进程的峰值常驻内存 (RSS)。
+合成数据集按 (seed, 股票数, 区间) 生成一次, 保存在 cache/benchmark 下重复使用。
+结果连同环境信息 (Python 与依赖版本、CPU、git 提交) 保存为 results/Benchmark_<时间>.json, compare 按用例对比两次结果。
+
+用法 (在项目根目录):
+    python -m benchmark.suite run
+    python -m benchmark.suite run --scales 1 100 --strategies DMAStrategy --repeat 5
+    python -m benchmark.suite compare results/Benchmark_20250101_120000.json results/Benchmark_20250102_120000.json
+"""
+import os
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import multiprocessing as mp
+from importlib import metadata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .synthetic import BENCH_ROOT, synthetic_codes, generate_market, loader_frames, fill_parquet, fill_cache
+from data import StockDataCache, load_stock_data, set_data_backend
+from utils.telemetry import peak_rss_mb
+
+SCALES = (1, 100, 5000)
+LOADERS = ("duckdb", "cache")
+
+BT_ANALYZERS = ["Returns", "DrawDown", "SharpeRatio", "TradeAnalyzer", "PyFolio"]
+OPT_ANALYZERS = ["Returns", "DrawDown", "SharpeRatio", "TradeAnalyzer"]
+
+# 单次回测的参数 (与 Strategy_Configs.py 相同)
+BT_PARAMS = {
+    "DMAStrategy": {"fast": 15, "slow": 50, "loss_stop": 0.05, "target_pos": 0.95},
+    "RSI_Reversal_Strategy": {"period": 14, "low_level": 40, "high_level": 70, "sma_period": 30, "lma_period": 200,
+                              "atr_period": 14, "atr_multiplier": 2.0, "target_pos": 0.95},
+    "RSI_Trend_Strategy": {"period": 19, "low_level": 45, "high_level": 60, "lma_period": 100, "atr_period": 14,
+                           "atr_multiplier": 2.0, "target_pos": 0.95},
+    "Bollinger_Strategy": {"period": 19, "devfactor": 2.0, "lma_period": 100, "atr_period": 14, "atr_multiplier": 2.0,
+                           "target_pos": 0.95},
+}
+
+# 参数优化的小网格: (opt_params, opt_vars), 每个 18 ~ 32 个参数组合
+OPT_GRIDS = {
+    "DMAStrategy": ({"fast": range(5, 31, 5), "slow": range(40, 101, 20), "loss_stop": 0.05, "target_pos": 0.95,
+                     "constraints": ["fast < slow"]}, ["fast", "slow"]),
+    "RSI_Reversal_Strategy": ({"period": [9, 14], "low_level": [30, 40], "high_level": 70, "sma_period": [20, 30],
+                               "lma_period": [120, 200], "atr_period": 14, "atr_multiplier": [2.0, 3.0], "target_pos": 0.95,
+                               "constraints": ["sma_period < lma_period"]},
+                              ["period", "low_level", "sma_period", "lma_period", "atr_multiplier"]),
+    "RSI_Trend_Strategy": ({"period": [9, 14, 19], "low_level": [40, 45], "high_level": [60, 70], "lma_period": 100,
+                            "atr_period": 14, "atr_multiplier": [2.0, 3.0], "target_pos": 0.95,
+                            "constraints": ["low_level <= high_level"]},
+                           ["period", "low_level", "high_level", "atr_multiplier"]),
+    "Bollinger_Strategy": ({"period": [14, 19, 24], "devfactor": [1.5, 2.0, 2.5], "lma_period": 100, "atr_period": 14,
+                            "atr_multiplier": [2.0, 3.0], "target_pos": 0.95},
+                           ["period", "devfactor", "atr_multiplier"]),
+}
+
+
+def _strategy(name: str):
+    import strategies
+    return getattr(strategies, name)
+
+
+# --- A. 环境 ---
+def environment() -> dict:
+    """运行环境: Python 与依赖版本、平台、CPU 与 git 提交, 用于判断两次结果是否可比。"""
+    versions = {}
+    for package in ["numpy", "pandas", "backtrader", "duckdb", "pyarrow"]:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True).stdout.strip())
+    except OSError:
+        commit, dirty = None, None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "git_commit": commit or None,
+        "git_dirty": dirty,
+    }
+
+
+def _has_duckdb() -> bool:
+    try:
+        import duckdb
+    except ImportError:
+        return False
+    return True
+
+
+# --- B. 数据集 ---
+def prepare_dataset(n_stocks: int, start_date: str, end_date: str, seed: int = 0, loaders=LOADERS,
+                    root: str = BENCH_ROOT) -> dict:
+    """
+    生成 (或复用) n_stocks 只股票的合成数据集: DuckDB 后端读取的 Parquet 数据集, loaders 包含 "cache" 时同时写入本地缓存。
+    返回数据集设置 {dir, parquet_root, cache_dir, n_stocks, start_date, end_date, seed}, 路径均为绝对路径。
+    """
+    dataset_dir = os.path.abspath(os.path.join(root, f"seed{seed}_{n_stocks}_{start_date}_{end_date}"))
+    dataset = {"dir": dataset_dir, "parquet_root": os.path.join(dataset_dir, "parquet"),
+               "cache_dir": os.path.join(dataset_dir, "cache"),
+               "n_stocks": n_stocks, "start_date": start_date, "end_date": end_date, "seed": seed}
+    marker = os.path.join(dataset_dir, "dataset.json")
+    done = json.load(open(marker, encoding="utf-8")).get("parts", []) if os.path.exists(marker) else []
+
+    parts = ["parquet"] + (["cache"] if "cache" in loaders else [])
+    for part in parts:
+        if part in done:
+            continue
+        print(f"-> 生成合成数据 ({part}): {n_stocks} 只股票, {start_date} ~ {end_date}, seed={seed}")
+        if part == "parquet":
+            shutil.rmtree(dataset["parquet_root"], ignore_errors=True)
+            fill_parquet(n_stocks, start_date, end_date, seed, root=dataset["parquet_root"])
+        else:
+            shutil.rmtree(dataset["cache_dir"], ignore_errors=True)
+            fill_cache(n_stocks, start_date, end_date, seed, cache=StockDataCache(dataset["cache_dir"], validate=False))
+        done.append(part)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump(dataset | {"parts": done}, f, ensure_ascii=False, indent=2)
+    return dataset
+
+
+def _global_options(dataset: dict, strategy: str, codes: List[str]) -> dict:
+    return {"strategy_name": strategy, "data_pool": codes, "start_date": dataset["start_date"],
+            "end_date": dataset["end_date"], "commission": 0.001, "cash": 1000000.0}
+
+
+def _stock_data(dataset: dict, codes: List[str]) -> Dict[str, pd.DataFrame]:
+    return loader_frames(generate_market(codes, dataset["start_date"], dataset["end_date"], dataset["seed"]))
+
+
+# --- C. 用例 (在子进程中执行) ---
+def _timed(fn: Callable[[], int], repeat: int, warmup: int) -> Tuple[List[float], int]:
+    """预热 warmup 次后计时 repeat 次, 返回 (各次耗时, fn 返回的处理量)。"""
+    for _ in range(warmup):
+        fn()
+    seconds, items = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        items = fn()
+        seconds.append(time.perf_counter() - t0)
+    return seconds, items
+
+
+def bench_load(dataset: dict, n_stocks: int, loader: str, repeat: int, warmup: int) -> Tuple[List[float], int]:
+    """load_stock_data 加载 n_stocks 只股票 (bulk), 处理量为行数。"""
+    codes = synthetic_codes(n_stocks)
+    if loader == "duckdb":
+        set_data_backend("duckdb", dataset["parquet_root"])
+
+    def run():
+        cache = StockDataCache(dataset["cache_dir"], validate=False) if loader == "cache" else False
+        data = load_stock_data(codes, dataset["start_date"], dataset["end_date"], mode="bulk", cache=cache)
+        if len(data) < n_stocks:
+            raise RuntimeError(f"只加载到 {len(data)}/{n_stocks} 只股票")
+        return sum(len(df) for df in data.values())
+
+    return _timed(run, repeat, warmup)
+
+
+def bench_backtest(dataset: dict, strategy: str, n_stocks: int, repeat: int, warmup: int) -> Tuple[List[float], int]:
+    """run_combo 回测 n_stocks 只股票组成的股票池, 处理量为 K 线数 (各股票之和)。"""
+    from backtest import run_combo
+
+    codes = synthetic_codes(n_stocks)
+    stock_data_dict = _stock_data(dataset, codes)
+    global_options = _global_options(dataset, strategy, codes)
+    n_bars = sum(len(df) for df in stock_data_dict.values())
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        def run():
+            result = run_combo(BT_PARAMS[strategy], stock_data_dict, _strategy(strategy), {}, global_options,
+                               BT_ANALYZERS, output_dir)
+            if result is None:
+                raise RuntimeError("回测失败")
+            return n_bars
+
+        return _timed(run, repeat, warmup)
+
+
+def bench_opt(dataset: dict, strategy: str, workers: int, repeat: int, warmup: int) -> Tuple[List[float], int]:
+    """run_opt 在第一只股票上优化 OPT_GRIDS 中的参数网格 (DuckDB 后端加载数据), 处理量为参数组合数。"""
+    from backtest import run_opt
+
+    opt_params, opt_vars = OPT_GRIDS[strategy]
+    global_options = _global_options(dataset, strategy, synthetic_codes(1)) | {
+        "backend": "duckdb", "parquet_root": dataset["parquet_root"]}
+
+    def run():
+        df_results, output_dir = run_opt(_strategy(strategy), opt_params, opt_vars, global_options, OPT_ANALYZERS,
+                                         workers=workers)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return len(df_results)
+
+    return _timed(run, repeat, warmup)
+
+
+CASES = {"load": bench_load, "backtest": bench_backtest, "pool": bench_backtest, "opt": bench_opt}
+UNITS = {"load": "行/秒", "backtest": "K线/秒", "pool": "K线/秒", "opt": "参数组合/秒"}
+
+
+def _run_case(kind: str, params: dict, repeat: int, warmup: int) -> dict:
+    base_rss = peak_rss_mb()
+    seconds, items = CASES[kind](**params, repeat=repeat, warmup=warmup)
+    return {"seconds": [round(s, 4) for s in seconds], "items": items,
+            "base_rss_mb": base_rss, "peak_rss_mb": peak_rss_mb(), "children_peak_rss_mb": peak_rss_mb(children=True)}
+
+
+# --- D. 运行与比较 ---
+def plan_cases(scales=SCALES, strategies=None, loaders=LOADERS, pool_scales=(1, 100), opt_workers: int = 1) -> List[dict]:
+    """用例列表, 每个用例为 {case, kind, params} (params 不含数据集)。"""
+    strategies = list(strategies or BT_PARAMS)
+    cases = []
+    for loader in loaders:
+        for n in scales:
+            cases.append({"case": f"load/{loader}/{n}", "kind": "load", "params": {"n_stocks": n, "loader": loader}})
+    for strategy in strategies:
+        cases.append({"case": f"backtest/{strategy}", "kind": "backtest", "params": {"strategy": strategy, "n_stocks": 1}})
+    for n in pool_scales:
+        if n > 1:
+            cases.append({"case": f"pool/{strategies[0]}/{n}", "kind": "pool", "params": {"strategy": strategies[0], "n_stocks": n}})
+    for strategy in strategies:
+        cases.append({"case": f"opt/{strategy}", "kind": "opt", "params": {"strategy": strategy, "workers": opt_workers}})
+    return cases
+
+
+def run_suite(scales=SCALES, strategies=None, loaders=LOADERS, pool_scales=(1, 100), opt_workers: int = 1,
+              start_date: str = "2019-01-01", end_date: str = "2023-12-31", seed: int = 0, repeat: int = 3,
+              warmup: int = 1, output: Optional[str] = None) -> dict:
+    """运行全部用例, 返回并保存结果 {meta, results}。output 默认为 results/Benchmark_<时间>.json。"""
+    if not _has_duckdb():
+        print("注意: 未安装 duckdb, 跳过 DuckDB 加载与参数优化用例")
+        loaders = [loader for loader in loaders if loader != "duckdb"]
+    cases = plan_cases(scales, strategies, loaders, pool_scales, opt_workers)
+    if not _has_duckdb():
+        cases = [case for case in cases if case["kind"] != "opt"]
+
+    n_max = max([case["params"]["n_stocks"] for case in cases if "n_stocks" in case["params"]] + [1])
+    dataset = prepare_dataset(n_max, start_date, end_date, seed, loaders)
+
+    meta = environment() | {"started": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": repeat, "warmup": warmup,
+                            "dataset": {k: dataset[k] for k in ["n_stocks", "start_date", "end_date", "seed"]}}
+    results = []
+    print(f"基准测试开始: {len(cases)} 个用例, 每个用例预热 {warmup} 次、计时 {repeat} 次")
+    for case in cases:
+        record = {"case": case["case"], "kind": case["kind"], "params": case["params"]}
+        try:
+            # 每个用例一个新进程, 峰值内存互不影响
+            with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as executor:
+                record |= executor.submit(_run_case, case["kind"], case["params"] | {"dataset": dataset}, repeat, warmup).result()
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            print(f"   {case['case']:<36} 失败: {record['error']}")
+            results.append(record)
+            continue
+
+        record["median_s"] = round(statistics.median(record["seconds"]), 4)
+        record["min_s"] = round(min(record["seconds"]), 4)
+        record["throughput"] = round(record["items"] / max(record["median_s"], 1e-9), 1)
+        record["unit"] = UNITS[case["kind"]]
+        results.append(record)
+        print(f"   {case['case']:<36} {record['median_s']:>9.3f} 秒  {record['throughput']:>14,.1f} {record['unit']:<6}"
+              f"  峰值内存 {record['peak_rss_mb']} MB")
+
+    report = {"meta": meta, "results": results}
+    if output is None:
+        os.makedirs("results", exist_ok=True)
+        output = os.path.join("results", f"Benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {output}")
+    return report
+
+
+def compare_results(old: str, new: str) -> pd.DataFrame:
+    """按用例对比两次基准结果 (JSON 路径): 中位耗时、加速比 (旧 / 新, 大于 1 为变快) 与峰值内存。"""
+    reports = []
+    for path in [old, new]:
+        with open(path, encoding="utf-8") as f:
+            reports.append(json.load(f))
+
+    frames = []
+    for label, report in zip(["old", "new"], reports):
+        df = pd.DataFrame([r for r in report["results"] if "error" not in r])
+        frames.append(df.set_index("case")[["median_s", "peak_rss_mb"]].add_prefix(f"{label}_"))
+    result = pd.concat(frames, axis=1, join="inner")
+    result["speedup"] = (result["old_median_s"] / result["new_median_s"]).round(2)
+    result["rss_ratio"] = (result["new_peak_rss_mb"] / result["old_peak_rss_mb"]).round(2)
+
+    for key in ["python", "platform", "cpu_count", "versions", "dataset"]:
+        if reports[0]["meta"].get(key) != reports[1]["meta"].get(key):
+            print(f"注意: 两次运行的 {key} 不同: {reports[0]['meta'].get(key)} -> {reports[1]['meta'].get(key)}")
+    print(f"{reports[0]['meta'].get('git_commit')} -> {reports[1]['meta'].get('git_commit')}")
+    print(result.to_string())
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="数据加载、回测与参数优化的性能基准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="运行基准测试")
+    run_parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES), help="加载用例的股票数")
+    run_parser.add_argument("--pool-scales", type=int, nargs="*", default=[1, 100], help="组合回测用例的股票数")
+    run_parser.add_argument("--strategies", nargs="+", default=list(BT_PARAMS), choices=list(BT_PARAMS))
+    run_parser.add_argument("--loaders", nargs="+", default=list(LOADERS), choices=list(LOADERS))
+    run_parser.add_argument("--opt-workers", type=int, default=1, help="参数优化的进程数, 0 为全部 CPU 核心")
+    run_parser.add_argument("--start", default="2019-01-01")
+    run_parser.add_argument("--end", default="2023-12-31")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--output", default=None)
+
+    compare_parser = subparsers.add_parser("compare", help="对比两次基准结果")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_suite(args.scales, args.strategies, args.loaders, args.pool_scales, args.opt_workers, args.start, args.end,
+                  args.seed, args.repeat, args.warmup, args.output)
+    else:
+        compare_results(args.old, args.new)
@@ -0,0 +1,301 @@
+"""
+确定性的合成行情, 结构与 daily_price 表相同, 用于基准测试和没有 CSMAR 数据时的本地运行。
+
+generate_market 生成的长表包含未复权 OHLC、成交量额、hfq/qfq 复权因子、trade_status、涨跌停价与市值:
+    - 代码在沪市主板 / 深市主板 / 创业板 / 科创板之间交替分配, 涨跌幅限制分别为 10% / 10% / 20% / 20%, ST 期间为 5%
+    - 日收益率 = 个股漂移 + beta × 市场因子 + 个股波动 × t 分布噪声 (厚尾), 并向初始价格弱均值回归;
+      价格保留两位小数, 收盘价与开盘价受涨跌停价限制, 满足 high >= open/close >= low
+    - 每年约一次除权除息 (现金分红或送转), 除权日未复权价格跳空, hfq 累积因子相应增大, 后复权价格连续; qfq = hfq / 最后一天的 hfq
+    - 部分股票在区间内上市, 部分股票停牌 (trade_status = 0, 价格沿用前收盘价, 成交量为 0) 或被 ST (trade_status = 2)
+
+随机数按 (seed, 股票代码, 年份) 与 (seed, 年份) 生成, 从 start_date 所在年份的第一个交易日开始模拟:
+同一 seed 下任意股票子集、任意分块得到的数据相同; 起始年份相同时延长 end_date 不改变已有日期的数据 (qfq 除外)。
+
+数据可以写入 DuckDB 后端读取的 Parquet 数据集 (fill_parquet, 不需要数据库服务)、PostgreSQL (fill_postgres)
+或本地缓存 (fill_cache); loader_frames 直接给出与 load_stock_data 相同结构的 {code: DataFrame}。
+
+用法 (在项目根目录):
+    python -m benchmark.synthetic --n-stocks 100 --start 2019-01-01 --end 2023-12-31 --target parquet --root cache/benchmark/parquet
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Union
+
+from data.cache import StockDataCache
+from data.data_download_save import parquet_upsert
+from data.data_loader import _cache_fq
+
+BENCH_ROOT = os.path.join("cache", "benchmark")
+
+# 板块: (代码起点, market 编码, 涨跌幅限制)
+BOARDS = {
+    "sh": (600000, 1, 0.10),
+    "sz": (1, 4, 0.10),
+    "gem": (300001, 16, 0.20),
+    "star": (688001, 32, 0.20),
+}
+BOARD_CYCLE = ("sh", "sz", "sh", "gem", "sz", "sh", "star", "sz", "gem", "sh")
+ST_LIMIT = 0.05
+
+# 固定的休市日 (近似的元旦、春节、清明、劳动节、国庆)
+HOLIDAYS = ("01-01", "02-10", "02-11", "02-12", "02-13", "02-14", "04-04", "04-05",
+            "05-01", "05-02", "05-03", "10-01", "10-02", "10-03", "10-04", "10-05", "10-06", "10-07")
+
+MEAN_REVERSION = 0.003
+
+
+# --- A. 代码与交易日 ---
+def synthetic_codes(n_stocks: int) -> List[str]:
+    """前 n_stocks 个合成股票代码, 按 BOARD_CYCLE 在各板块之间交替。"""
+    counters = {board: 0 for board in BOARDS}
+    codes = []
+    for i in range(n_stocks):
+        board = BOARD_CYCLE[i % len(BOARD_CYCLE)]
+        codes.append(f"{BOARDS[board][0] + counters[board]:06d}")
+        counters[board] += 1
+    return codes
+
+
+def _board_of(code: str) -> str:
+    if code.startswith("688"):
+        return "star"
+    if code.startswith("6"):
+        return "sh"
+    if code.startswith("3"):
+        return "gem"
+    return "sz"
+
+
+def trading_days(start_date: str, end_date: str) -> pd.DatetimeIndex:
+    """合成行情的交易日: 工作日去掉 HOLIDAYS 中的固定休市日。"""
+    days = pd.bdate_range(start_date, end_date)
+    return days[~days.strftime("%m-%d").isin(HOLIDAYS)]
+
+
+def _resolve_codes(codes: Union[int, List[str]]) -> List[str]:
+    return synthetic_codes(codes) if isinstance(codes, int) else list(codes)
+
+
+# --- B. 随机数 ---
+def _static_params(code: str, seed: int) -> dict:
+    """个股不随时间变化的参数。"""
+    rng = np.random.default_rng([seed, int(code), 0])
+    params = {
+        "p0": float(np.clip(np.round(np.exp(rng.normal(np.log(15), 0.6)), 2), 3, 200)),
+        "beta": rng.uniform(0.6, 1.4),
+        "sigma": rng.uniform(0.012, 0.03),
+        "mu": rng.normal(2e-4, 3e-4),
+        "float_shares": float(np.exp(rng.normal(np.log(5e8), 1.0))),
+        "turnover": rng.uniform(0.003, 0.02),
+    }
+    params["total_shares"] = params["float_shares"] * rng.uniform(1.0, 2.0)
+    # 7 成在模拟开始前已上市, 带有之前累积的复权因子; 2 成在前两年内上市 (ipo 为上市日在模拟交易日中的序号)
+    params["hfq0"] = rng.uniform(1.0, 4.0) if rng.random() < 0.7 else 1.0
+    params["ipo"] = int(rng.integers(1, 490)) if rng.random() < 0.2 else 0
+    return params
+
+
+def _market_returns(year: int, n_days: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng([seed, 0, year])
+    return 0.012 * rng.standard_t(4, n_days) / np.sqrt(2)
+
+
+def _year_draws(code: str, year: int, n_days: int, seed: int) -> dict:
+    """个股在一年内的随机数: 收益率噪声、开盘跳空、上下影线、成交量噪声、停牌、ST 与除权。"""
+    rng = np.random.default_rng([seed, int(code), year])
+    draws = {
+        "eps": rng.standard_t(4, n_days) / np.sqrt(2),
+        "gap": rng.normal(0, 0.004, n_days),
+        "wick_up": np.abs(rng.normal(0, 0.006, n_days)),
+        "wick_down": np.abs(rng.normal(0, 0.006, n_days)),
+        "volume": rng.normal(0, 0.35, n_days),
+        "status": np.ones(n_days, dtype=np.int16),
+        "ratio": np.ones(n_days),
+    }
+    # ST 先于停牌写入, 停牌覆盖 ST
+    if rng.random() < 0.03:
+        begin = int(rng.integers(0, n_days))
+        draws["status"][begin:begin + int(rng.integers(60, 200))] = 2
+    for _ in range(rng.poisson(0.4)):
+        begin = int(rng.integers(0, n_days))
+        draws["status"][begin:begin + int(rng.integers(1, 20))] = 0
+    if rng.random() < 0.8 and n_days > 160:
+        ex_day = int(rng.integers(80, 160))
+        if rng.random() < 0.25:
+            draws["ratio"][ex_day] = rng.choice([1.2, 1.3, 1.5, 2.0])
+        else:
+            draws["ratio"][ex_day] = 1 / (1 - rng.uniform(0.005, 0.04))
+    return draws
+
+
+# --- C. 生成 ---
+def _simulate_chunk(codes: List[str], days: pd.DatetimeIndex, seed: int) -> pd.DataFrame:
+    """按交易日逐日推进, 每一步对这一批股票向量化计算, 返回按 (code, date) 排序的长表。"""
+    n_days, k = len(days), len(codes)
+    static = [_static_params(code, seed) for code in codes]
+    col = lambda name: np.array([s[name] for s in static])
+    p0, beta, sigma, mu = col("p0"), col("beta"), col("sigma"), col("mu")
+    ipo, hfq0, float_shares, total_shares = col("ipo"), col("hfq0"), col("float_shares"), col("total_shares")
+    base_volume = float_shares * col("turnover")
+    board_limit = np.array([BOARDS[_board_of(code)][2] for code in codes])
+    market = np.array([BOARDS[_board_of(code)][1] for code in codes], dtype=np.int16)
+
+    # 随机数按年生成后拼接, (交易日, 股票) 矩阵
+    years = days.year
+    market_ret = np.concatenate([_market_returns(y, int((years == y).sum()), seed) for y in np.unique(years)])
+    per_year = [[_year_draws(code, y, int((years == y).sum()), seed) for code in codes] for y in np.unique(years)]
+    draw = lambda name: np.concatenate([np.column_stack([d[name] for d in year]) for year in per_year])
+    eps, gap, wick_up, wick_down, vol_noise = (draw(name) for name in ["eps", "gap", "wick_up", "wick_down", "volume"])
+    status, ratio = draw("status"), draw("ratio")
+
+    shape = (n_days, k)
+    o, h, l, c = np.empty(shape), np.empty(shape), np.empty(shape), np.empty(shape)
+    up, down, factor = np.empty(shape), np.empty(shape), np.empty(shape)
+    volume = np.empty(shape, dtype=np.int64)
+    status = status.astype(np.int16)
+
+    prev, hfq, log_p0 = p0.copy(), hfq0.copy(), np.log(p0)
+    for t in range(n_days):
+        # 除权: 前收盘价折算为参考价, 复权因子补偿跳空
+        ref = np.maximum(np.round(prev / ratio[t], 2), 0.01)
+        hfq = hfq * prev / ref
+        limit = np.where(status[t] == 2, ST_LIMIT, board_limit)
+        up[t], down[t] = np.round(ref * (1 + limit), 2), np.maximum(np.round(ref * (1 - limit), 2), 0.01)
+
+        ret = mu + beta * market_ret[t] + sigma * eps[t] - MEAN_REVERSION * (np.log(ref) - log_p0)
+        close = np.clip(np.round(ref * np.exp(ret), 2), down[t], up[t])
+        open_ = np.clip(np.round(ref * np.exp(gap[t]), 2), down[t], up[t])
+        top, bottom = np.maximum(open_, close), np.minimum(open_, close)
+        high = np.minimum(np.maximum(np.round(top * (1 + wick_up[t]), 2), top), up[t])
+        low = np.maximum(np.minimum(np.round(bottom * (1 - wick_down[t]), 2), bottom), down[t])
+
+        suspended = status[t] == 0
+        o[t], h[t], l[t], c[t] = (np.where(suspended, ref, x) for x in (open_, high, low, close))
+        shares = base_volume * np.exp(vol_noise[t]) * (1 + 10 * np.abs(close / ref - 1))
+        volume[t] = np.where(suspended, 0, np.maximum(np.round(shares / 100), 1) * 100)
+        factor[t] = hfq
+        prev = c[t]
+
+    hfq_round = np.round(factor, 6)
+    limit_status = np.where(status == 0, 0, np.where(c >= up, 1, np.where(c <= down, -1, 0))).astype(np.int16)
+    listed = np.arange(n_days)[:, None] >= ipo[None, :]
+
+    # (交易日, 股票) -> 按股票代码排序的长表
+    flat = lambda x: x.T[listed.T]
+    df = pd.DataFrame({
+        "code": np.repeat(codes, listed.sum(axis=0)),
+        "date": np.tile(days.values, k)[listed.T.ravel()],
+        "open": flat(o), "high": flat(h), "low": flat(l), "close": flat(c),
+        "volume": flat(volume),
+        "amount": np.round(flat(volume) * (flat(o) + flat(h) + flat(l) + flat(c)) / 4, 3),
+        "hfq": flat(hfq_round),
+        "trade_status": flat(status).astype(np.int16),
+        "limit_status": flat(limit_status),
+        "up_limit": flat(up), "down_limit": flat(down),
+        "float_value": np.round(flat(c * float_shares), 2),
+        "total_value": np.round(flat(c * total_shares), 2),
+        "market": flat(np.broadcast_to(market, shape)),
+    })
+    return df
+
+
+def iter_market(codes: Union[int, List[str]], start_date: str, end_date: str, seed: int = 0,
+                chunk_size: int = 500) -> Iterator[pd.DataFrame]:
+    """逐批生成合成行情, 每批 chunk_size 只股票, 只保留 [start_date, end_date] 内的交易日。codes 为代码列表或股票数。"""
+    codes = _resolve_codes(codes)
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    days = trading_days(f"{start.year}-01-01", f"{end.year}-12-31")
+    for i in range(0, len(codes), chunk_size):
+        df = _simulate_chunk(codes[i:i + chunk_size], days, seed)
+        # qfq 以 end_date 当天 (或之前最后一个交易日) 的 hfq 为基准
+        df = df[df["date"] <= end]
+        df.insert(df.columns.get_loc("hfq") + 1, "qfq", np.round(df["hfq"] / df.groupby("code")["hfq"].transform("last"), 6))
+        yield df[df["date"] >= start].reset_index(drop=True)
+
+
+def generate_market(codes: Union[int, List[str]], start_date: str, end_date: str, seed: int = 0) -> pd.DataFrame:
+    """一次生成全部合成行情, 结构与 daily_price 相同。股票数较多时用 iter_market 分批生成。"""
+    return pd.concat(iter_market(codes, start_date, end_date, seed), ignore_index=True)
+
+
+def loader_frames(market: pd.DataFrame, fq: str = "hfq") -> Dict[str, pd.DataFrame]:
+    """将合成行情转换为 load_stock_data 的返回结构: 只保留 trade_status = 1 的交易日, 价格乘以复权因子 (与 DuckDB 后端相同)。"""
+    df = market[market["trade_status"] == 1]
+    factor = df[fq.lower()]
+    frames = pd.DataFrame({
+        "open": df["open"] * factor, "high": df["high"] * factor, "low": df["low"] * factor, "close": df["close"] * factor,
+        "volume": df["volume"],
+    }).set_index(pd.DatetimeIndex(pd.to_datetime(df["date"]), name="date"))
+    return {code: g for code, g in frames.groupby(df["code"].values, sort=False)}
+
+
+# --- D. 写入 ---
+def fill_parquet(codes: Union[int, List[str]], start_date: str, end_date: str, seed: int = 0,
+                 root: str = os.path.join(BENCH_ROOT, "parquet"), chunk_size: int = 500) -> int:
+    """写入 DuckDB 后端读取的 Parquet 数据集, 返回行数。读取时 set_data_backend("duckdb", root)。"""
+    return parquet_upsert(iter_market(codes, start_date, end_date, seed, chunk_size), root)
+
+
+def fill_postgres(engine, codes: Union[int, List[str]], start_date: str, end_date: str, seed: int = 0,
+                  table: str = "bench_daily_price", workers: int = 1, adjusted: bool = False, chunk_size: int = 500) -> int:
+    """
+    写入 PostgreSQL 中 schema.py 结构的分区表 (不存在时创建), 写入后 VACUUM ANALYZE, 返回行数。
+    adjusted 为 True 时同时刷新物化的后复权价格表 (refresh_adjusted_table)。
+    默认写入单独的 bench_daily_price 表: 合成代码与真实代码重叠, 不要写入实际使用的 daily_price。
+    """
+    from sqlalchemy import inspect
+    from data.schema import create_daily_price_table, vacuum_analyze
+    from data.data_download_save import postgres_upsert, refresh_adjusted_table
+
+    if not inspect(engine).has_table(table):
+        create_daily_price_table(engine, table, partitioned=True,
+                                 start_year=pd.Timestamp(start_date).year, end_year=pd.Timestamp(end_date).year)
+    n_rows = postgres_upsert(iter_market(codes, start_date, end_date, seed, chunk_size), table, engine, workers=workers)
+    vacuum_analyze(engine, table)
+    if adjusted:
+        refresh_adjusted_table(engine, table=table)
+    return n_rows
+
+
+def fill_cache(codes: Union[int, List[str]], start_date: str, end_date: str, seed: int = 0,
+               cache: Optional[StockDataCache] = None, fq: str = "hfq", chunk_size: int = 500) -> int:
+    """
+    按 load_stock_data 的缓存键写入本地缓存, 返回股票数; 之后以相同的区间和 fq 加载时全部命中缓存, 不访问数据库。
+    默认使用 BENCH_ROOT 下单独的缓存目录: 合成代码与真实代码重叠, 不要写入实际使用的缓存目录。
+    """
+    cache = cache or StockDataCache(os.path.join(BENCH_ROOT, "cache"), validate=False)
+    n_stocks = 0
+    for chunk in iter_market(codes, start_date, end_date, seed, chunk_size):
+        for code, df in loader_frames(chunk, fq).items():
+            cache.put(code, start_date, end_date, _cache_fq(fq.lower(), False), df)
+            n_stocks += 1
+        cache.flush()
+    return n_stocks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成行情并写入 Parquet 数据集 / PostgreSQL / 本地缓存")
+    parser.add_argument("--n-stocks", type=int, default=100)
+    parser.add_argument("--start", default="2019-01-01")
+    parser.add_argument("--end", default="2023-12-31")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target", choices=["parquet", "postgres", "cache"], default="parquet")
+    parser.add_argument("--root", default=None, help="Parquet 数据集或缓存目录, 默认在 cache/benchmark 下")
+    parser.add_argument("--table", default="bench_daily_price", help="PostgreSQL 表名")
+    parser.add_argument("--workers", type=int, default=1, help="PostgreSQL 并行写入的连接数")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    if args.target == "parquet":
+        fill_parquet(args.n_stocks, args.start, args.end, args.seed, root=args.root or os.path.join(BENCH_ROOT, "parquet"))
+    elif args.target == "postgres":
+        from data.data_loader import get_db_engine
+        fill_postgres(get_db_engine(), args.n_stocks, args.start, args.end, args.seed, table=args.table, workers=args.workers)
+    else:
+        cache = StockDataCache(args.root or os.path.join(BENCH_ROOT, "cache"), validate=False)
+        n = fill_cache(args.n_stocks, args.start, args.end, args.seed, cache=cache)
+        print(f"缓存写入完毕: {n} 只股票")
+    print(f"用时 {time.perf_counter() - start_time:.1f} 秒")
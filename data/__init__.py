@@ -1,3 +1,11 @@
-from .data_loader import load_stock_data
+from .data_loader import load_stock_data, load_stock_data_bulk, load_stock_data_concurrent, get_db_engine
+from .cache import StockDataCache
+from .panel_store import PanelStore, build_panel_store
+from .trading_calendar import TradingCalendar, align_stock_data
+from .backends import set_data_backend, get_data_backend, DuckDBBackend
+from .feeds import make_data_feed, suspension_filler, needs_suspension_filler
 
-__all__ = ['load_stock_data']
\ No newline at end of file
+__all__ = ['load_stock_data', 'load_stock_data_bulk', 'load_stock_data_concurrent', 'get_db_engine', 'StockDataCache',
+           'PanelStore', 'build_panel_store', 'TradingCalendar', 'align_stock_data',
+           'set_data_backend', 'get_data_backend', 'DuckDBBackend', 'make_data_feed',
+           'suspension_filler', 'needs_suspension_filler']
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+可插拔的存储后端。
+
+    'postgres' : 默认, 本地 PostgreSQL (data_loader.DB_URL)
+    'duckdb'   : 嵌入式 DuckDB, 在进程内直接扫描 Parquet 数据集, 不需要数据库服务
+
+通过环境变量 STOCK_DATA_BACKEND / STOCK_PARQUET_ROOT, 或在程序中调用 set_data_backend() 选择;
+加载函数 (load_stock_data 等) 的接口与返回结果不随后端改变。
+
+Parquet 数据集的布局与 data_download_save.parquet_upsert 一致:
+    PARQUET_ROOT/year=2016/part.parquet, 每个文件内按 (code, date) 排序, 列与 daily_price 相同 (数值列为 float64)
+"""
+import os
+import pandas as pd
+from typing import List, Dict, Optional
+
+from .trading_calendar import TradingCalendar
+
+DATA_BACKEND = os.environ.get("STOCK_DATA_BACKEND", "postgres")
+PARQUET_ROOT = os.environ.get("STOCK_PARQUET_ROOT", os.path.join("cache", "parquet", "daily_price"))
+
+BACKENDS = ['postgres', 'duckdb']
+
+
+def set_data_backend(name: str, parquet_root: Optional[str] = None) -> None:
+    global DATA_BACKEND, PARQUET_ROOT
+    if name not in BACKENDS:
+        raise ValueError(f"存储后端必须是 {BACKENDS} 之一")
+    DATA_BACKEND = name
+    if parquet_root is not None:
+        PARQUET_ROOT = parquet_root
+
+
+def get_data_backend() -> str:
+    return DATA_BACKEND
+
+
+class DuckDBBackend:
+    """
+    用 DuckDB 查询按年份分区的 Parquet 数据集。日期条件同时作用在分区列 year 上以跳过无关文件,
+    文件内按 (code, date) 排序, 行组统计信息可以跳过无关股票。
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        import duckdb
+
+        self.root = root or PARQUET_ROOT
+        self._duckdb = duckdb
+        pattern = os.path.join(self.root, "*", "*.parquet").replace("\\", "/")
+        self.source = f"read_parquet('{pattern}', hive_partitioning = true)"
+
+    def _query(self, sql: str, params: Optional[dict] = None) -> pd.DataFrame:
+        with self._duckdb.connect() as conn:
+            return conn.execute(sql, params or {}).df()
+
+    @staticmethod
+    def _window_params(start_date: str, end_date: str) -> dict:
+        start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+        return {"start_date": start.date(), "end_date": end.date(), "start_year": start.year, "end_year": end.year}
+
+    def max_date(self) -> Optional[str]:
+        value = self._query(f"SELECT max(date) AS max_date FROM {self.source}")["max_date"].iloc[0]
+        return None if pd.isna(value) else pd.Timestamp(value).strftime("%Y-%m-%d")
+
+    def load_prices(self, stock_list: List[str], start_date: str, end_date: str, fq: str = "hfq",
+                    adjusted: bool = False) -> Dict[str, pd.DataFrame]:
+        """
+        返回与 data_loader.load_stock_data 相同结构的 {code: DataFrame}。
+
+        adjusted=False 时与原始表一致, 价格乘以存储的 hfq/qfq 因子;
+        adjusted=True 时 qfq 由请求区间内最后一个 hfq 折算 (与物化表的含义一致)。
+        """
+        codes = list(dict.fromkeys(stock_list))
+        if not codes:
+            return {}
+
+        if adjusted and fq == "qfq":
+            factor = "hfq / last_value(hfq) OVER (PARTITION BY code ORDER BY date ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)"
+        else:
+            factor = fq
+
+        sql = f"""
+        SELECT code, date, open * f AS open, high * f AS high, low * f AS low, close * f AS close, volume
+        FROM (
+            SELECT code, date, open, high, low, close, volume, {factor} AS f
+            FROM {self.source}
+            WHERE
+                year BETWEEN $start_year AND $end_year
+                AND list_contains($codes, code)
+                AND date BETWEEN $start_date AND $end_date
+                AND trade_status = 1
+        )
+        ORDER BY code, date
+        """
+        df_all = self._query(sql, {"codes": codes} | self._window_params(start_date, end_date))
+        if df_all.empty:
+            return {}
+
+        df_all['date'] = pd.to_datetime(df_all['date'])
+        groups = {code: df.set_index('date')['open high low close volume'.split()]
+                  for code, df in df_all.groupby('code', sort=False)}
+        return {code: groups[code] for code in codes if code in groups}
+
+    def calendar(self, start_date: str, end_date: str, codes: Optional[List[str]] = None) -> TradingCalendar:
+        params = self._window_params(start_date, end_date)
+        window = "year BETWEEN $start_year AND $end_year AND date BETWEEN $start_date AND $end_date"
+        dates = self._query(f"SELECT DISTINCT date FROM {self.source} WHERE {window} ORDER BY date", params)["date"]
+
+        code_filter = ""
+        if codes is not None:
+            code_filter = "AND list_contains($codes, code)"
+            params = params | {"codes": list(codes)}
+        status = self._query(f"SELECT date, code, trade_status FROM {self.source} WHERE {window} {code_filter}", params)
+
+        return TradingCalendar.from_status(dates, status, codes)
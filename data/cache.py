@@ -0,0 +1,218 @@
+"""
+股票数据的本地列式缓存 (Parquet), 位于 load_single_stock_data 之前。
+
+缓存条目以 (code, fq, 日期区间) 为键:
+    - 请求区间被某个已缓存的更宽区间覆盖时, 直接从该条目切片返回
+    - 以 daily_price 的最大日期作为失效依据: 数据库有了新数据, 且条目区间延伸到旧的最大日期之后, 条目失效
+    - 原始表的 qfq 以最新交易日为基准, 新的除权除息会改写全部历史价格, 因此数据库有了新数据时 qfq 条目全部失效;
+      hfq 与物化表的 qfq (以请求区间的结束日为基准, 见 data_loader._cache_fq) 的历史价格不受新数据影响
+    - 缓存总大小超过上限时, 按最近访问时间 (LRU) 淘汰
+    - 失效检查需要查询数据库的最大日期, 默认关闭 (validate=False), 全部命中缓存时不访问数据库; 数据库更新后以 validate=True 加载一次即可
+
+多个进程 (如同一节点上的分布式工作进程) 可以共用一个缓存目录: flush 时在文件锁内重新读取 index.json,
+合并本进程新增、访问与删除的条目后再写回, 淘汰也在合并后的索引上进行。
+"""
+import os
+import json
+import time
+import contextlib
+import pandas as pd
+from typing import Optional, Dict, Set
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+CACHE_DIR = os.path.join("cache", "daily_price")
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def _norm_date(date) -> str:
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """进程间的排他文件锁 (POSIX 使用 fcntl.flock, Windows 使用 msvcrt.locking), 都不可用时不加锁。"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class StockDataCache:
+    """
+    以 Parquet 文件保存每个 (code, fq, start, end) 条目, 索引文件 index.json 记录条目的区间、大小、访问时间和写入时数据库的最大日期。
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, validate: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.validate = validate
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.lock_path = os.path.join(cache_dir, "index.lock")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.entries: Dict[str, dict] = self._read_index()
+        # 本进程自上次 flush 以来写入或访问过的条目与删除的条目, flush 时合并到磁盘上的索引
+        self._touched: Set[str] = set()
+        self._removed: Set[str] = set()
+        self._dirty = False
+
+    # --- 索引文件读写 ---
+    def _read_index(self) -> Dict[str, dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self) -> None:
+        """
+        将索引的改动写回磁盘, 批量读写结束后调用一次即可。
+        在文件锁内重新读取磁盘上的索引 (其他进程可能已写入), 合并本进程的改动并按合并后的总大小淘汰, 再写回。
+        """
+        if not self._dirty:
+            return
+        with _file_lock(self.lock_path):
+            entries = self._read_index()
+            for key in self._removed:
+                entries.pop(key, None)
+            for key in self._touched:
+                if key in self.entries:
+                    entries[key] = self.entries[key]
+            self.entries = entries
+            self._evict()
+
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.index_path)
+        self._touched.clear()
+        self._removed.clear()
+        self._dirty = False
+
+    def _touch(self, key: str) -> None:
+        self._touched.add(key)
+        self._removed.discard(key)
+        self._dirty = True
+
+    def _remove(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self._touched.discard(key)
+        self._removed.add(key)
+        self._dirty = True
+        try:
+            os.remove(os.path.join(self.cache_dir, entry["file"]))
+        except OSError:
+            pass
+
+    @staticmethod
+    def _is_stale(entry: dict, db_max_date: Optional[str]) -> bool:
+        if db_max_date is None or entry["db_max_date"] is None:
+            return False
+        if db_max_date <= entry["db_max_date"]:
+            return False
+        return entry["fq"] == "qfq" or entry["end"] > entry["db_max_date"]
+
+    # --- 读取 ---
+    def get(self, code: str, start_date: str, end_date: str, fq: str, db_max_date: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """
+        返回覆盖请求区间的缓存数据 (已切片到请求区间), 未命中返回 None。
+
+        db_max_date 为当前数据库中的最大日期, 为 None 时不做失效检查 (如无法连接数据库)。
+        """
+        start_date, end_date = _norm_date(start_date), _norm_date(end_date)
+
+        candidates = []
+        for key, entry in list(self.entries.items()):
+            if entry["code"] != code or entry["fq"] != fq:
+                continue
+            if self._is_stale(entry, db_max_date):
+                self._remove(key)
+                continue
+            if entry["start"] <= start_date and entry["end"] >= end_date:
+                candidates.append((entry["size"], key))
+
+        if not candidates:
+            return None
+
+        # 优先使用最小的覆盖条目
+        _, key = min(candidates)
+        entry = self.entries[key]
+        try:
+            df = pd.read_parquet(os.path.join(self.cache_dir, entry["file"]))
+        except Exception as e:
+            print(f"缓存文件读取失败 {entry['file']}: {e}")
+            self._remove(key)
+            return None
+
+        entry["last_access"] = time.time()
+        self._touch(key)
+        return df.loc[start_date:end_date]
+
+    # --- 写入 ---
+    def put(self, code: str, start_date: str, end_date: str, fq: str, df: pd.DataFrame, db_max_date: Optional[str] = None) -> None:
+        if df.empty:
+            return
+
+        start_date, end_date = _norm_date(start_date), _norm_date(end_date)
+        key = f"{code}_{fq}_{start_date}_{end_date}"
+        file_name = f"{key}.parquet"
+        file_path = os.path.join(self.cache_dir, file_name)
+
+        df = df.astype({col: "float64" for col in df.columns if col != "volume"})
+        # 先写入本进程的临时文件再替换, 其他进程不会读到写了一半的文件
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, file_path)
+
+        # 新条目覆盖的更窄条目不再需要
+        for old_key, entry in list(self.entries.items()):
+            if old_key != key and entry["code"] == code and entry["fq"] == fq \
+                    and entry["start"] >= start_date and entry["end"] <= end_date:
+                self._remove(old_key)
+
+        self.entries[key] = {
+            "code": code,
+            "fq": fq,
+            "start": start_date,
+            "end": end_date,
+            "db_max_date": db_max_date,
+            "file": file_name,
+            "size": os.path.getsize(file_path),
+            "last_access": time.time(),
+        }
+        self._touch(key)
+        self._evict()
+
+    def _evict(self) -> None:
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            total -= entry["size"]
+            self._remove(key)
+
+    def clear(self) -> None:
+        for key in list(self.entries):
+            self._remove(key)
+        self.flush()
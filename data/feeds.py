@@ -0,0 +1,35 @@
+"""
+回测数据源: 根据加载结果选择合适的 Backtrader 数据源类型。
+"""
+import pandas as pd
+import backtrader.feeds as btfeeds
+
+
+class CalendarPandasData(btfeeds.PandasData):
+    """
+    对齐到交易日历的数据源, 多出一条 tradeable 线 (1 正常交易 / 0 停牌), 策略可通过 data.tradeable[0] 判断当日能否成交。
+    停牌日的 K 线由前收盘价补齐, 需配合 suspension_filler 使用, 否则订单会按补齐的价格成交。
+    """
+    lines = ('tradeable',)
+    params = (('tradeable', -1),)
+
+
+def make_data_feed(df: pd.DataFrame, name: str) -> btfeeds.PandasData:
+    if 'tradeable' in df.columns:
+        return CalendarPandasData(dataname=df, name=name)
+    return btfeeds.PandasData(dataname=df, name=name)
+
+
+def suspension_filler(order, price, ago) -> float:
+    """
+    Backtrader 的成交量填充函数 (broker.set_filler): 停牌日 (tradeable 为 0) 成交 0 股, 订单保留到复牌后按当日价格成交;
+    其余情况全部成交。没有 tradeable 线的数据源不受影响。
+    """
+    data = order.data
+    if hasattr(data.lines, "tradeable") and data.tradeable[ago] == 0:
+        return 0
+    return abs(order.executed.remsize)
+
+
+def needs_suspension_filler(data_dict: dict) -> bool:
+    return any('tradeable' in df.columns for df in data_dict.values())
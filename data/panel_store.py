@@ -0,0 +1,227 @@
+"""
+全市场宽表存储: 将 daily_price 物化为 (交易日 × 股票代码) 的内存映射 NumPy 数组, 每个字段一个 .npy 文件。
+
+目录结构:
+    store_dir/
+        meta.json            形状、字段类型、交易日轴和股票代码轴
+        open.npy high.npy ... trade_status.npy
+
+读取时以 mmap 只读方式打开, 多个进程打开同一目录时共享操作系统的同一份页缓存;
+日期窗口与连续的代码区间返回零拷贝视图, 逐只股票的 DataFrame 仍可通过 PanelStore.load_stock_data 得到。
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, text
+from typing import List, Dict, Optional, Union
+
+PANEL_DIR = os.path.join("cache", "panel")
+
+# 价格、成交额与复权因子用 float64 (float32 只有约 7 位有效数字, 复权后与数据库加载的价格不一致); 状态字段用 int8
+PANEL_FIELDS = {
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.int64,
+    "amount": np.float64,
+    "hfq": np.float64,
+    "qfq": np.float64,
+    "limit_status": np.int8,
+    "trade_status": np.int8,
+}
+
+# 股票在该交易日没有记录 (未上市、退市) 时的填充值
+FILL_VALUES = {
+    np.float32: np.nan,
+    np.float64: np.nan,
+    np.int64: 0,
+    np.int8: -1,
+}
+
+
+def build_panel_store(
+        engine: Engine,
+        store_dir: str = PANEL_DIR,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        chunksize: int = 500_000
+        ) -> str:
+    """
+    从数据库物化宽表存储, 先写入临时目录, 完成后整体替换 store_dir, 读取方不会看到写了一半的文件。
+    """
+    start_date = start_date or "1990-01-01"
+    end_date = end_date or "2099-12-31"
+    params = {"start_date": start_date, "end_date": end_date}
+
+    print(f"-> 正在物化宽表存储 {start_date} ~ {end_date} 到 {store_dir}...")
+
+    # --- A. 交易日轴与股票代码轴 ---
+    with engine.connect() as conn:
+        dates = pd.DatetimeIndex(pd.read_sql(
+            text("SELECT DISTINCT date FROM daily_price WHERE date BETWEEN :start_date AND :end_date ORDER BY date"),
+            conn, params=params, parse_dates=["date"])["date"])
+        codes = pd.read_sql(
+            text("SELECT DISTINCT code FROM daily_price WHERE date BETWEEN :start_date AND :end_date ORDER BY code"),
+            conn, params=params)["code"].str.strip().tolist()
+
+    if len(dates) == 0 or len(codes) == 0:
+        raise ValueError(f"daily_price 在 {start_date} ~ {end_date} 期间没有数据")
+
+    shape = (len(dates), len(codes))
+    code_index = pd.Index(codes)
+
+    # --- B. 创建各字段的内存映射文件 ---
+    tmp_dir = store_dir.rstrip("/\\") + ".building"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    arrays = {}
+    for field, dtype in PANEL_FIELDS.items():
+        arr = np.lib.format.open_memmap(os.path.join(tmp_dir, f"{field}.npy"), mode="w+", dtype=dtype, shape=shape)
+        arr[:] = FILL_VALUES[dtype]
+        arrays[field] = arr
+
+    # --- C. 分块读取并写入对应的 (行, 列) 位置 ---
+    fields_sql = ", ".join(f"{field}::float8 AS {field}" if PANEL_FIELDS[field] in (np.float32, np.float64) else field
+                           for field in PANEL_FIELDS)
+    sql_query = text(f"""
+    SELECT code, date, {fields_sql}
+    FROM daily_price
+    WHERE date BETWEEN :start_date AND :end_date
+    ORDER BY date ASC;
+    """)
+
+    n_rows = 0
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        for chunk in pd.read_sql(sql_query, conn, params=params, parse_dates=["date"], chunksize=chunksize):
+            rows = dates.get_indexer(chunk["date"])
+            cols = code_index.get_indexer(chunk["code"].str.strip())
+            for field, dtype in PANEL_FIELDS.items():
+                values = chunk[field]
+                if dtype not in (np.float32, np.float64):
+                    values = values.fillna(FILL_VALUES[dtype])
+                arrays[field][rows, cols] = values.to_numpy(dtype=dtype)
+            n_rows += len(chunk)
+            print(f"   已写入 {n_rows} 行")
+
+    for arr in arrays.values():
+        arr.flush()
+    del arrays
+
+    meta = {
+        "shape": list(shape),
+        "fields": {field: np.dtype(dtype).name for field, dtype in PANEL_FIELDS.items()},
+        "dates": [d.strftime("%Y-%m-%d") for d in dates],
+        "codes": codes,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+
+    print(f"<- 宽表存储完成: {shape[0]} 个交易日 × {shape[1]} 只股票, 共 {n_rows} 行")
+    return store_dir
+
+
+class PanelStore:
+    """
+    只读打开宽表存储。字段数组在首次访问时以 mmap_mode='r' 映射, 不会读入整张表。
+    """
+
+    def __init__(self, store_dir: str = PANEL_DIR):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.dates = pd.DatetimeIndex(self.meta["dates"])
+        self.codes = pd.Index(self.meta["codes"])
+        self.fields = list(self.meta["fields"])
+        self._arrays: Dict[str, np.memmap] = {}
+
+    # --- 索引 ---
+    def field(self, name: str) -> np.ndarray:
+        """返回整个字段的内存映射数组 (交易日 × 股票代码)。"""
+        if name not in self._arrays:
+            if name not in self.fields:
+                raise KeyError(f"宽表中没有字段 {name}")
+            self._arrays[name] = np.load(os.path.join(self.store_dir, f"{name}.npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    def date_slice(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> slice:
+        """日期窗口 -> 行切片 (闭区间)。"""
+        start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side="left")
+        end = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        return slice(start, end)
+
+    def code_columns(self, codes: Optional[List[str]] = None) -> Union[slice, np.ndarray]:
+        """
+        股票代码 -> 列位置。代码在存储中连续且有序时返回切片 (可以零拷贝), 否则返回位置数组。
+        """
+        if codes is None:
+            return slice(0, len(self.codes))
+
+        cols = self.codes.get_indexer(codes)
+        if (cols < 0).any():
+            missing = [code for code, col in zip(codes, cols) if col < 0]
+            raise KeyError(f"宽表中没有股票 {missing}")
+
+        if len(cols) > 0 and np.array_equal(cols, np.arange(cols[0], cols[0] + len(cols))):
+            return slice(int(cols[0]), int(cols[0]) + len(cols))
+        return cols
+
+    # --- 读取 ---
+    def get(self, name: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+            codes: Optional[List[str]] = None) -> np.ndarray:
+        """
+        返回字段在日期窗口与代码子集上的数组。日期窗口以及连续的代码区间为零拷贝视图, 不连续的代码子集需要按列收集 (会复制)。
+        """
+        rows = self.date_slice(start_date, end_date)
+        cols = self.code_columns(codes)
+        return self.field(name)[rows, cols]
+
+    def frame(self, name: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+              codes: Optional[List[str]] = None) -> pd.DataFrame:
+        """以 DataFrame 形式返回 get() 的结果, 行为交易日, 列为股票代码。"""
+        rows = self.date_slice(start_date, end_date)
+        cols = self.code_columns(codes)
+        return pd.DataFrame(self.field(name)[rows, cols], index=self.dates[rows], columns=self.codes[cols], copy=False)
+
+    def load_single_stock_data(self, code: str, start_date: str, end_date: str, fq: str = "hfq") -> pd.DataFrame:
+        """
+        与 data_loader.load_single_stock_data 输出相同格式的单只股票数据 (仅正常交易日, 已复权)。
+        复权在 float64 中相乘, 数据库在 numeric 中精确相乘后再转为 float8, 两者可能相差最后一位 (约 1e-16 的相对误差)。
+        旧版本以 float32 保存价格的存储仍可读取, 但误差约为 1e-7, 需要重新 build_panel_store。
+        """
+        fq = fq.lower()
+        if fq not in ['qfq', 'hfq']:
+            raise ValueError("fq 参数必须是 'qfq' 或 'hfq'")
+
+        rows = self.date_slice(start_date, end_date)
+        col = self.codes.get_loc(code)
+        mask = self.field("trade_status")[rows, col] == 1
+        if not mask.any():
+            return pd.DataFrame()
+
+        factor = self.field(fq)[rows, col][mask]
+        df = pd.DataFrame(
+            {price: self.field(price)[rows, col][mask].astype(np.float64) * factor
+             for price in ['open', 'high', 'low', 'close']},
+            index=self.dates[rows][mask].rename("date"))
+        df['volume'] = self.field("volume")[rows, col][mask]
+        return df
+
+    def load_stock_data(self, stock_list: List[str], start_date: str, end_date: str, fq: str = "hfq") -> Dict[str, pd.DataFrame]:
+        """与 data_loader.load_stock_data 输出相同的 {code: DataFrame} 字典, 不在存储中的股票会被跳过。"""
+        data_dict = {}
+        for code in stock_list:
+            if code not in self.codes:
+                print(f"注意：宽表中没有股票 {code}")
+                continue
+            df = self.load_single_stock_data(code, start_date, end_date, fq)
+            if not df.empty:
+                data_dict[code] = df
+        return data_dict
@@ -0,0 +1,185 @@
+"""
+daily_price 及相关表的表结构 (DDL) 与迁移。
+
+    daily_price      按年份范围分区 (PARTITION BY RANGE (date)), 每年一个分区, 另有默认分区接收范围外的数据
+    loader 覆盖索引   (code, date) INCLUDE (OHLCV、复权因子、trade_status), 加载查询可以只扫描索引 (Index Only Scan)
+    date BRIN 索引    数据按日期顺序写入时体积极小, 全市场按日期窗口的截面扫描 (宽表物化、交易日历) 可以跳过无关的数据块
+
+分区表的主键必须包含分区键, (code, date) 满足这一点, 因此 postgres_upsert 的 ON CONFLICT (code, date) 不需要改动。
+索引只扫描依赖可见性映射 (visibility map), 大批量写入后需要 VACUUM ANALYZE, 见 vacuum_analyze()。
+"""
+import pandas as pd
+from sqlalchemy import Engine, text
+from typing import List, Optional
+
+PRICE_TABLE = "daily_price"
+ADJUSTED_TABLE = "daily_price_adj"
+
+# 覆盖索引中携带的列: 正好是 data_loader._price_query 读取与过滤的列
+LOADER_INCLUDE_COLUMNS = ["open", "high", "low", "close", "volume", "hfq", "qfq", "trade_status"]
+
+DAILY_PRICE_COLUMNS = """
+    code          character(6)   NOT NULL,
+    date          date           NOT NULL,
+    open          numeric(9,3)   NOT NULL,
+    high          numeric(9,3)   NOT NULL,
+    low           numeric(9,3)   NOT NULL,
+    close         numeric(9,3)   NOT NULL,
+    volume        bigint         NOT NULL,
+    amount        numeric(16,3)  NOT NULL,
+    hfq           numeric(12,6)  NOT NULL,
+    qfq           numeric(12,6)  NOT NULL,
+    trade_status  smallint       NOT NULL,
+    limit_status  smallint,
+    up_limit      numeric(10,3),
+    down_limit    numeric(10,3),
+    float_value   numeric(16,2)  NOT NULL,
+    total_value   numeric(16,2)  NOT NULL,
+    market        smallint       NOT NULL,
+    PRIMARY KEY (code, date),
+    CONSTRAINT factor_positive_check CHECK (qfq > 0 AND hfq > 0),
+    CONSTRAINT ohlc_range_check CHECK (high >= open AND high >= close AND low <= open AND low <= close AND high >= low),
+    CONSTRAINT price_integrity_check CHECK (open >= 0 AND high >= 0 AND low >= 0 AND close >= 0),
+    CONSTRAINT volume_amount_check CHECK (volume >= 0 AND amount >= 0)
+"""
+
+
+# --- A. 价格表 ---
+def create_daily_price_table(engine: Engine, table: str = PRICE_TABLE, partitioned: bool = True,
+                             start_year: int = 2016, end_year: Optional[int] = None, migrate: bool = False) -> bool:
+    """
+    创建价格表 (已存在时不做改动)。partitioned 为 True 时按年份分区, 并创建 start_year ~ end_year 的分区与默认分区。
+
+    partitioned 为 True 但 table 已经是普通表时: migrate 为 True 则先迁移为分区表 (migrate_to_partitioned),
+    否则沿用普通表, 不创建年份分区。返回 table 最终是否为分区表。
+    """
+    end_year = end_year or pd.Timestamp.today().year + 1
+    partition_clause = " PARTITION BY RANGE (date)" if partitioned else ""
+
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table}" ({DAILY_PRICE_COLUMNS}){partition_clause}'))
+
+    if partitioned and not is_partitioned(engine, table):
+        if migrate:
+            migrate_to_partitioned(engine, table)
+        else:
+            print(f"-> {table} 已存在且不是分区表, 沿用普通表 (可使用 migrate_to_partitioned 迁移为分区表)")
+            partitioned = False
+
+    if partitioned:
+        ensure_year_partitions(engine, range(start_year, end_year + 1), table)
+    create_loader_indexes(engine, table)
+    return partitioned
+
+
+def ensure_year_partitions(engine: Engine, years, table: str = PRICE_TABLE) -> List[str]:
+    """
+    为每个年份创建分区 table_YYYY (已存在时跳过), 以及默认分区 table_default。返回年份分区的表名。
+
+    默认分区中已有某年份的数据时不能再创建该年份的分区, 需要先把这些行移出默认分区。
+    """
+    names = []
+    with engine.begin() as conn:
+        for year in years:
+            name = f"{table}_{year}"
+            conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}"
+            FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')
+            """))
+            names.append(name)
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT'))
+    return names
+
+
+def create_loader_indexes(engine: Engine, table: str = PRICE_TABLE) -> None:
+    """
+    覆盖索引与 date 上的 BRIN 索引。在分区表的父表上创建时会自动建到每个分区 (包括之后新建的分区)。
+    """
+    include = ", ".join(LOADER_INCLUDE_COLUMNS)
+    with engine.begin() as conn:
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{table}_loader_idx" ON "{table}" (code, date) INCLUDE ({include})'))
+        conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{table}_date_brin" ON "{table}" USING brin (date) WITH (pages_per_range = 32)'))
+
+
+def vacuum_analyze(engine: Engine, table: str = PRICE_TABLE) -> None:
+    """更新统计信息和可见性映射。VACUUM 不能在事务中执行, 使用 AUTOCOMMIT 连接。"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'VACUUM ANALYZE "{table}"'))
+
+
+def is_partitioned(engine: Engine, table: str = PRICE_TABLE) -> bool:
+    with engine.connect() as conn:
+        value = conn.execute(text("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :table AND n.nspname = current_schema()
+        """), {"table": table}).scalar()
+    return value == "p"
+
+
+def migrate_to_partitioned(engine: Engine, table: str = PRICE_TABLE, drop_old: bool = False) -> str:
+    """
+    将已有的普通价格表迁移为按年份分区的表:
+        原表改名为 table_unpartitioned -> 以原名创建分区表 -> 按年份逐段复制数据 -> 建索引 -> VACUUM ANALYZE
+
+    表名不变, 加载与写入代码不需要改动。drop_old 为 False 时保留原表, 确认无误后可手动删除。返回原表的新名字。
+    """
+    if is_partitioned(engine, table):
+        print(f"-> {table} 已经是分区表, 无需迁移")
+        return table
+
+    old_table = f"{table}_unpartitioned"
+    print(f"-> 正在将 {table} 迁移为按年份分区的表...")
+
+    with engine.begin() as conn:
+        years = conn.execute(text(f'SELECT extract(year FROM min(date))::int, extract(year FROM max(date))::int FROM "{table}"')).one()
+        conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{old_table}"'))
+        for index in ["pkey", "loader_idx", "date_brin"]:
+            conn.execute(text(f'ALTER INDEX IF EXISTS "{table}_{index}" RENAME TO "{old_table}_{index}"'))
+
+    start_year, end_year = years if years[0] is not None else (2016, pd.Timestamp.today().year)
+    create_daily_price_table(engine, table, partitioned=True, start_year=start_year, end_year=end_year + 1)
+
+    # 按年份复制, 每个事务只涉及一个分区
+    n_rows = 0
+    for year in range(start_year, end_year + 1):
+        with engine.begin() as conn:
+            result = conn.execute(text(f"""
+            INSERT INTO "{table}" SELECT * FROM "{old_table}"
+            WHERE date >= :start AND date < :end
+            """), {"start": f"{year}-01-01", "end": f"{year + 1}-01-01"})
+            n_rows += result.rowcount
+        print(f"   {year} 年: 累计复制 {n_rows} 行")
+
+    vacuum_analyze(engine, table)
+
+    if drop_old:
+        with engine.begin() as conn:
+            conn.execute(text(f'DROP TABLE "{old_table}"'))
+
+    print(f"<- 迁移完成: 共 {n_rows} 行")
+    return old_table
+
+
+# --- B. 物化的后复权价格表 ---
+def ensure_adjusted_table(engine: Engine) -> None:
+    """物化的后复权价格表: OHLC 已乘以 hfq 并存为 float8, 保留 hfq 用于按区间折算前复权价格。"""
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS "{ADJUSTED_TABLE}" (
+            code          character(6)      NOT NULL,
+            date          date              NOT NULL,
+            open          double precision  NOT NULL,
+            high          double precision  NOT NULL,
+            low           double precision  NOT NULL,
+            close         double precision  NOT NULL,
+            volume        bigint            NOT NULL,
+            hfq           double precision  NOT NULL,
+            trade_status  smallint          NOT NULL,
+            PRIMARY KEY (code, date)
+        )
+        """))
+        conn.execute(text(f"""
+        CREATE INDEX IF NOT EXISTS "{ADJUSTED_TABLE}_loader_idx" ON "{ADJUSTED_TABLE}" (code, date)
+        INCLUDE (open, high, low, close, volume, hfq, trade_status)
+        """))
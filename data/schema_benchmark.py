@@ -0,0 +1,153 @@
+"""
+比较 daily_price 两种表结构在加载查询上的耗时:
+
+    plain       : 原结构, 普通表 + (code, date) 主键
+    partitioned : schema.py 的结构, 按年份分区 + 覆盖索引 + date 上的 BRIN 索引
+
+两张表都从现有的 daily_price 复制 (可用 --start-year/--end-year 缩小范围), 复制后执行 VACUUM ANALYZE。
+复制的行序决定了堆中数据块的物理顺序, 进而决定 BRIN 索引的效果 (--order):
+    code  按 (code, date) 复制, 与实际入库 (iter_processed_chunks 按股票代码分批 -> postgres_upsert) 的写入顺序一致, 默认
+    date  按 (date, code) 复制, 相当于按日期顺序追加写入, 是 date 上 BRIN 索引的最好情形
+    both  两种顺序各建一组表, 分别报告
+查询与 data_loader 完全一致:
+    single        load_single_stock_data:  code = :code AND date BETWEEN ... AND trade_status = 1
+    bulk          load_stock_data_bulk:    code = ANY(:codes) AND date BETWEEN ... AND trade_status = 1
+    cross_section 宽表物化 / 交易日历:      全市场 date BETWEEN ... 的截面
+
+用法 (在项目根目录):
+    python -m data.schema_benchmark --codes 600519 000001 000002 --start 2020-01-01 --end 2022-12-31
+"""
+import time
+import json
+import argparse
+import statistics
+import pandas as pd
+from sqlalchemy import Engine, text
+from typing import List, Dict
+
+from .data_loader import get_db_engine, _price_query
+from .schema import PRICE_TABLE, DAILY_PRICE_COLUMNS, create_daily_price_table, vacuum_analyze
+
+PLAIN_TABLE = "bench_daily_price_plain"
+PARTITIONED_TABLE = "bench_daily_price_part"
+
+# 复制时的行序: code 与实际入库的写入顺序一致, date 为按日期追加写入
+COPY_ORDERS = {"code": "code, date", "date": "date, code"}
+
+
+def build_bench_tables(engine: Engine, start_year: int, end_year: int, source: str = PRICE_TABLE,
+                       order: str = "code") -> Dict[str, str]:
+    """从 source 按 order (COPY_ORDERS 的键) 的行序复制出两种结构的测试表, 返回 {布局名: 表名}。"""
+    params = {"start": f"{start_year}-01-01", "end": f"{end_year + 1}-01-01"}
+    plain, partitioned = f"{PLAIN_TABLE}_{order}", f"{PARTITIONED_TABLE}_{order}"
+
+    with engine.begin() as conn:
+        for table in [plain, partitioned]:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}" CASCADE'))
+        conn.execute(text(f'CREATE TABLE "{plain}" ({DAILY_PRICE_COLUMNS})'))
+
+    create_daily_price_table(engine, partitioned, partitioned=True, start_year=start_year, end_year=end_year)
+
+    for table in [plain, partitioned]:
+        print(f"-> 正在按 ({COPY_ORDERS[order]}) 的顺序复制 {source} 到 {table}...")
+        with engine.begin() as conn:
+            conn.execute(text(f"""
+            INSERT INTO "{table}" SELECT * FROM "{source}"
+            WHERE date >= :start AND date < :end
+            ORDER BY {COPY_ORDERS[order]}
+            """), params)
+        vacuum_analyze(engine, table)
+
+    return {"plain": plain, "partitioned": partitioned}
+
+
+def loader_queries(codes: List[str], start_date: str, end_date: str, fq: str = "hfq") -> Dict[str, tuple]:
+    """data_loader 的查询模式, {名称: (SQL, 参数)}。SQL 中的表名 daily_price 在执行时替换为测试表。"""
+    window = {"start_date": start_date, "end_date": end_date}
+    return {
+        "single": (str(_price_query(fq, "code = :code")), {"code": codes[0]} | window),
+        "bulk": (str(_price_query(fq, "code = ANY(:codes)")), {"codes": codes} | window),
+        "cross_section": ("""
+    SELECT code, date, open::float8, high::float8, low::float8, close::float8, volume, trade_status
+    FROM daily_price
+    WHERE date BETWEEN :start_date AND :end_date
+    ORDER BY date ASC;
+    """, window),
+    }
+
+
+def _plan_nodes(plan: dict) -> List[dict]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def run_benchmark(engine: Engine, tables: Dict[str, str], queries: Dict[str, tuple], repeat: int = 5) -> pd.DataFrame:
+    """每个 (布局, 查询) 先预热一次再执行 repeat 次, 记录中位耗时、返回行数、扫描节点与读取的数据块数。"""
+    records = []
+    for layout, table in tables.items():
+        for name, (sql, params) in queries.items():
+            sql = sql.replace("FROM daily_price", f'FROM "{table}"')
+            with engine.connect() as conn:
+                explain = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}"), params).scalar()
+                plan = (json.loads(explain) if isinstance(explain, str) else explain)[0]["Plan"]
+
+                elapsed = []
+                n_rows = 0
+                for _ in range(repeat):
+                    t0 = time.perf_counter()
+                    n_rows = len(conn.execute(text(sql), params).fetchall())
+                    elapsed.append((time.perf_counter() - t0) * 1000)
+
+            nodes = _plan_nodes(plan)
+            scans = sorted({node["Node Type"] for node in nodes if "Scan" in node["Node Type"]})
+            records.append({
+                "layout": layout,
+                "query": name,
+                "rows": n_rows,
+                "median_ms": round(statistics.median(elapsed), 2),
+                "min_ms": round(min(elapsed), 2),
+                "scans": ", ".join(scans),
+                "shared_blocks": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+                "heap_fetches": sum(node.get("Heap Fetches", 0) for node in nodes),
+            })
+            print(f"   {layout:<12} {name:<14} {records[-1]['median_ms']:>10.2f} ms  {records[-1]['scans']}")
+
+    result = pd.DataFrame(records)
+    speedup = result.pivot(index="query", columns="layout", values="median_ms")
+    if {"plain", "partitioned"} <= set(speedup.columns):
+        print("<- 相对原结构的加速比:")
+        print((speedup["plain"] / speedup["partitioned"]).round(2).to_string())
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="daily_price 表结构查询耗时对比")
+    parser.add_argument("--codes", nargs="+", default=["600519", "000001", "000002", "600000", "601318"])
+    parser.add_argument("--start", default="2020-01-01")
+    parser.add_argument("--end", default="2022-12-31")
+    parser.add_argument("--start-year", type=int, default=2016)
+    parser.add_argument("--end-year", type=int, default=pd.Timestamp.today().year)
+    parser.add_argument("--order", choices=["code", "date", "both"], default="code",
+                        help="复制测试表时的行序, code 与实际入库一致")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="保留测试表")
+    parser.add_argument("--output", default="schema_benchmark.csv")
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    results, all_tables = [], []
+    for order in (["code", "date"] if args.order == "both" else [args.order]):
+        print(f"== 行序: {COPY_ORDERS[order]} ==")
+        tables = build_bench_tables(engine, args.start_year, args.end_year, order=order)
+        all_tables.extend(tables.values())
+        result = run_benchmark(engine, tables, loader_queries(args.codes, args.start, args.end), repeat=args.repeat)
+        results.append(result.assign(order=order))
+    pd.concat(results, ignore_index=True).to_csv(args.output, index=False)
+    print(f"结果已保存到 {args.output}")
+
+    if not args.keep:
+        with engine.begin() as conn:
+            for table in all_tables:
+                conn.execute(text(f'DROP TABLE IF EXISTS "{table}" CASCADE'))
@@ -0,0 +1,176 @@
+"""
+交易日历与股票池成员位图。
+
+从 daily_price (或宽表存储) 一次性构建:
+    - 全市场交易日序列
+    - (交易日 × 股票代码) 的 listed 位图: 当日有记录 (已上市且未退市)
+    - (交易日 × 股票代码) 的 tradeable 位图: 当日正常交易 (trade_status = 1)
+
+位图按行 packbits 存储, 单点查询为 O(1) 的位运算; align_stock_data 将加载结果对齐到交易日历, 并附带停牌标记。
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import Engine, text
+from typing import List, Dict, Optional
+
+
+class TradingCalendar:
+
+    def __init__(self, dates: pd.DatetimeIndex, codes: List[str], listed: np.ndarray, tradeable: np.ndarray):
+        """listed / tradeable 为 (交易日 × 股票代码) 的布尔数组, 内部按行压缩为位图。"""
+        self.dates = pd.DatetimeIndex(dates)
+        self.codes = pd.Index(codes)
+        self.n_codes = len(self.codes)
+        self._listed = np.packbits(np.asarray(listed, dtype=bool), axis=1)
+        self._tradeable = np.packbits(np.asarray(tradeable, dtype=bool), axis=1)
+        self._date_pos = {d: i for i, d in enumerate(self.dates)}
+        self._code_pos = {c: i for i, c in enumerate(self.codes)}
+
+    # --- 构建 ---
+    @classmethod
+    def from_db(cls, engine: Engine, start_date: str, end_date: str, codes: Optional[List[str]] = None) -> "TradingCalendar":
+        """
+        从数据库构建。交易日取全市场的交易日; 位图只包含 codes 中的股票 (为 None 时为全市场)。
+        """
+        params = {"start_date": start_date, "end_date": end_date}
+        code_filter = ""
+        if codes is not None:
+            code_filter = "AND code = ANY(:codes)"
+            params["codes"] = list(codes)
+
+        with engine.connect() as conn:
+            dates = pd.read_sql(
+                text("SELECT DISTINCT date FROM daily_price WHERE date BETWEEN :start_date AND :end_date ORDER BY date"),
+                conn, params=params, parse_dates=["date"])["date"]
+            status = pd.read_sql(
+                text(f"SELECT date, code, trade_status FROM daily_price WHERE date BETWEEN :start_date AND :end_date {code_filter}"),
+                conn, params=params, parse_dates=["date"])
+
+        status["code"] = status["code"].str.strip()
+        return cls.from_status(dates, status, codes)
+
+    @classmethod
+    def from_status(cls, dates, status: pd.DataFrame, codes: Optional[List[str]] = None) -> "TradingCalendar":
+        """由交易日序列和长表 status (date, code, trade_status 三列) 构建。"""
+        codes = list(codes) if codes is not None else sorted(status["code"].unique())
+        dates = pd.DatetimeIndex(pd.to_datetime(dates))
+
+        rows = dates.get_indexer(pd.to_datetime(status["date"]))
+        cols = pd.Index(codes).get_indexer(status["code"])
+        keep = (rows >= 0) & (cols >= 0)
+        listed = np.zeros((len(dates), len(codes)), dtype=bool)
+        tradeable = np.zeros_like(listed)
+        listed[rows[keep], cols[keep]] = True
+        tradeable[rows[keep], cols[keep]] = status["trade_status"].to_numpy()[keep] == 1
+        return cls(dates, codes, listed, tradeable)
+
+    @classmethod
+    def from_panel(cls, store, start_date: Optional[str] = None, end_date: Optional[str] = None) -> "TradingCalendar":
+        """从 PanelStore 构建, 不需要访问数据库。"""
+        rows = store.date_slice(start_date, end_date)
+        trade_status = store.field("trade_status")[rows]
+        return cls(store.dates[rows], list(store.codes), trade_status >= 0, trade_status == 1)
+
+    def save(self, path: str) -> None:
+        np.savez_compressed(path, dates=self.dates.values.astype("datetime64[D]"), codes=np.asarray(self.codes, dtype=str),
+                            listed=self._listed, tradeable=self._tradeable, n_codes=self.n_codes)
+
+    @classmethod
+    def load(cls, path: str) -> "TradingCalendar":
+        npz = np.load(path)
+        n_codes = int(npz["n_codes"])
+        calendar = cls.__new__(cls)
+        calendar.dates = pd.DatetimeIndex(npz["dates"])
+        calendar.codes = pd.Index(npz["codes"].tolist())
+        calendar.n_codes = n_codes
+        calendar._listed = npz["listed"]
+        calendar._tradeable = npz["tradeable"]
+        calendar._date_pos = {d: i for i, d in enumerate(calendar.dates)}
+        calendar._code_pos = {c: i for i, c in enumerate(calendar.codes)}
+        return calendar
+
+    # --- 单点查询 (O(1)) ---
+    @staticmethod
+    def _bit(bitmap: np.ndarray, row: int, col: int) -> bool:
+        return bool((bitmap[row, col >> 3] >> (7 - (col & 7))) & 1)
+
+    def _pos(self, date, code):
+        row = self._date_pos.get(pd.Timestamp(date))
+        col = self._code_pos.get(code)
+        return row, col
+
+    def is_trading_day(self, date) -> bool:
+        return pd.Timestamp(date) in self._date_pos
+
+    def is_listed(self, date, code: str) -> bool:
+        row, col = self._pos(date, code)
+        return row is not None and col is not None and self._bit(self._listed, row, col)
+
+    def is_tradeable(self, date, code: str) -> bool:
+        row, col = self._pos(date, code)
+        return row is not None and col is not None and self._bit(self._tradeable, row, col)
+
+    # --- 截面与窗口查询 ---
+    def _unpack(self, bitmap: np.ndarray, rows: slice) -> np.ndarray:
+        return np.unpackbits(bitmap[rows], axis=1, count=self.n_codes).astype(bool)
+
+    def tradeable_codes(self, date) -> List[str]:
+        """某个交易日可交易的股票列表 (截面过滤)。"""
+        row = self._date_pos.get(pd.Timestamp(date))
+        if row is None:
+            return []
+        return list(self.codes[self._unpack(self._tradeable, slice(row, row + 1))[0]])
+
+    def window(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DatetimeIndex:
+        start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side="left")
+        end = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        return self.dates[start:end]
+
+    def mask(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+             codes: Optional[List[str]] = None, kind: str = "tradeable") -> pd.DataFrame:
+        """返回 (交易日 × 股票代码) 的布尔 DataFrame, kind 为 'tradeable' 或 'listed'。"""
+        start = 0 if start_date is None else self.dates.searchsorted(pd.Timestamp(start_date), side="left")
+        end = len(self.dates) if end_date is None else self.dates.searchsorted(pd.Timestamp(end_date), side="right")
+        bitmap = self._tradeable if kind == "tradeable" else self._listed
+        df = pd.DataFrame(self._unpack(bitmap, slice(start, end)), index=self.dates[start:end], columns=self.codes)
+        return df if codes is None else df[list(codes)]
+
+
+def align_stock_data(data_dict: Dict[str, pd.DataFrame], calendar: TradingCalendar,
+                     start_date: str, end_date: str) -> Dict[str, pd.DataFrame]:
+    """
+    将 {code: DataFrame} 对齐到交易日历。
+
+    每只股票从其首个交易日开始, 与日历逐日对齐到窗口内最后一个 listed 的交易日 (窗口结束或退市); 停牌日 (或当日无记录) 的 OHLC
+    取前一交易日收盘价、成交量为 0, 并在 tradeable 列中标记为 0。tradeable 取自日历的 tradeable 位图, 窗口末尾的停牌同样会被标记。
+    不在日历中的股票对齐到其最后一根 K 线, 按是否有数据标记。正常交易日的数据保持不变。
+    """
+    dates = calendar.window(start_date, end_date)
+    codes = [code for code in data_dict if code in calendar._code_pos]
+    listed = calendar.mask(start_date, end_date, codes=codes, kind="listed")
+    tradeable = calendar.mask(start_date, end_date, codes=codes, kind="tradeable")
+    aligned = {}
+
+    for code, df in data_dict.items():
+        if df.empty:
+            continue
+        end = df.index[-1]
+        if code in listed.columns:
+            rows = np.flatnonzero(listed[code].to_numpy())
+            if len(rows):
+                end = max(end, dates[rows[-1]])
+        index = dates[(dates >= df.index[0]) & (dates <= end)]
+        out = df.reindex(index)
+        can_trade = out["close"].notna()
+        if code in tradeable.columns:
+            can_trade &= tradeable[code].reindex(index, fill_value=False)
+
+        close = out["close"].ffill()
+        for col in ["open", "high", "low", "close"]:
+            out[col] = out[col].fillna(close)
+        out["volume"] = out["volume"].fillna(0).astype(np.int64)
+        out["tradeable"] = can_trade.astype(np.int8)
+        out.index.name = df.index.name
+        aligned[code] = out
+
+    return aligned
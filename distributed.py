@@ -0,0 +1,216 @@
+"""
+多台机器上的分布式参数优化。
+
+协调进程 (run_opt(..., queue=...)) 把待回测的参数组合按批发布到 utils.work_queue 的任务队列, 各节点上的工作进程
+(python distributed.py <队列地址>) 领取批次, 用本地数据 (默认启用本地 Parquet 缓存) 回测后写回结果, 协调进程按参数网格的顺序收集结果,
+df_results 与单机运行相同。工作进程按数据指纹核对本地数据, 与协调进程不一致时该批次报错, 优化中止。
+
+job 由参数网格的定义与批次大小确定: 协调进程中断后以 resume 重新启动时沿用同一个 job, 队列中已完成的批次直接收集, 不再回测。
+参数组合按批次从参数网格中逐段生成并分组发布, 协调进程不需要展开整个网格。
+策略类需要可以从模块导入 (不能定义在 __main__ 中), 参数与结果需要可以 JSON 序列化。
+"""
+import os
+import sys
+import time
+import signal
+import threading
+import socket
+import hashlib
+import logging
+import argparse
+import importlib
+import multiprocessing as mp
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from backtest import run_combo, load_pool_data
+from strategies import IndicatorCache
+from utils import *
+from utils.work_queue import DEFAULT_LEASE
+
+DEFAULT_BATCH = 16
+PUBLISH_GROUP = 1024  # 每次发布的批次数
+
+
+# --- A. 策略与 job ---
+def strategy_path(strategy) -> str:
+    """策略类的导入路径 "模块:类名"。"""
+    if strategy.__module__ == "__main__":
+        raise ValueError(f"分布式优化的策略类需要可以从模块导入, {strategy.__qualname__} 定义在 __main__ 中")
+    return f"{strategy.__module__}:{strategy.__qualname__}"
+
+
+def load_strategy(path: str):
+    module, _, name = path.partition(":")
+    obj = importlib.import_module(module)
+    for part in name.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def job_id_of(job_key: str, batch_size: int) -> str:
+    """job_key 为参数网格定义的键 (见 run_opt), 与批次大小一起确定 job。"""
+    return hashlib.sha256(f"{job_key}:{batch_size}".encode()).hexdigest()[:16]
+
+
+# --- B. 工作进程 ---
+def _prepare(spec: dict, preloaded: Optional[Dict[str, dict]]) -> tuple:
+    """按 spec 准备回测: 导入策略类、加载并核对本地数据、创建指标缓存。"""
+    strategy = load_strategy(spec["strategy"])
+    stock_data_dict = (preloaded or {}).get(spec["fingerprint"])
+    if stock_data_dict is None:
+        stock_data_dict = load_pool_data({"cache": True} | spec["global_options"])
+        if not stock_data_dict or data_fingerprint(stock_data_dict) != spec["fingerprint"]:
+            raise ValueError(f"本地数据与协调进程不一致 ({socket.gethostname()}), 请检查数据库或清理本地缓存")
+    cache = IndicatorCache() if spec["ind_cache"] and "ind_cache" in strategy.params._getkeys() else None
+    if spec["gen_report"]:
+        os.makedirs(spec["output_dir"], exist_ok=True)
+    combo_kwargs = dict(strategy=strategy, remains_params=spec["remains_params"], global_options=spec["global_options"],
+                        opt_analyzers=spec["opt_analyzers"], output_dir=spec["output_dir"], gen_report=spec["gen_report"],
+                        ind_cache=cache)
+    return stock_data_dict, combo_kwargs
+
+
+def run_worker(queue, worker_id: Optional[str] = None, lease: float = DEFAULT_LEASE, poll: float = 2.0,
+               idle_exit: Optional[float] = None, preloaded: Optional[Dict[str, dict]] = None) -> int:
+    """
+    工作进程: 循环领取批次并回测, 返回回测的批次数。
+    queue 为队列地址或 WorkQueue; lease 为租约时长 (秒), 需要长于回测一个参数组合的用时; idle_exit 为连续空闲多少秒后退出, None 时一直运行。
+    preloaded 为 {数据指纹: stock_data_dict}, 协调进程在本机启动的工作进程直接使用已加载的数据。
+    """
+    queue = open_queue(queue)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    if threading.current_thread() is threading.main_thread():
+        # 被 terminate (SIGTERM) 时同样放回正在回测的批次
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    jobs: Dict[str, tuple] = {}
+    n_batches, idle_since = 0, time.monotonic()
+    print(f"工作进程 {worker_id} 已启动, 队列: {queue.url}")
+    try:
+        while True:
+            claim = queue.claim(worker_id, lease)
+            if claim is None:
+                if idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+                    break
+                time.sleep(poll)
+                continue
+
+            job_id, batch_no, payload = claim
+            try:
+                if job_id not in jobs:
+                    for _, kwargs in jobs.values():
+                        if kwargs["ind_cache"] is not None:
+                            kwargs["ind_cache"].close()
+                    jobs = {job_id: _prepare(queue.job_spec(job_id), preloaded)}
+                stock_data_dict, combo_kwargs = jobs[job_id]
+                results = []
+                for combo in payload["combos"]:
+                    results.append(run_combo(combo, stock_data_dict, **combo_kwargs))
+                    queue.extend(job_id, batch_no, lease)
+                queue.complete(job_id, batch_no, {"worker": worker_id, "indices": payload["indices"],
+                                                  "combos": payload["combos"], "results": results})
+                print(f"[{worker_id}] 批次 {batch_no} 完成, {len(results)} 个参数组合")
+            except Exception as e:
+                queue.complete(job_id, batch_no, {"worker": worker_id, "error": f"{type(e).__name__}: {e}"})
+                print(f"[{worker_id}] 批次 {batch_no} 失败: {type(e).__name__}: {e}")
+            except BaseException:
+                # Ctrl+C / terminate: 放回批次, 由其他工作进程接手
+                queue.release(job_id, batch_no)
+                raise
+            n_batches += 1
+            idle_since = time.monotonic()
+    finally:
+        for _, kwargs in jobs.values():
+            if kwargs["ind_cache"] is not None:
+                kwargs["ind_cache"].close()
+    return n_batches
+
+
+# --- C. 协调进程 ---
+def run_distributed(queue, grid: ParamGrid, job_key: str, pending_mask: np.ndarray, on_result: Callable,
+                    spec: dict, batch_size: Optional[int] = None, local_workers: int = 0,
+                    stock_data_dict: Optional[dict] = None, lease: float = DEFAULT_LEASE, poll: float = 1.0) -> None:
+    """
+    发布参数网格中待回测 (pending_mask 为 True) 的参数组合并收集结果, 每收到一个结果调用 on_result(i, combo, result), i 为参数网格中的序号。
+    参数网格每 batch_size 个参数组合为一个批次 (只包含其中待回测的组合), 批次按 grid.chunks() 逐段生成, 每 PUBLISH_GROUP 个批次发布一次。
+    spec 为工作进程所需的设置 (见 run_opt)。
+    local_workers 为在本机启动的工作进程数, 直接使用已加载的 stock_data_dict; 为 0 时只发布与收集, 由其他节点回测。
+    """
+    queue = open_queue(queue)
+    batch_size = batch_size or DEFAULT_BATCH
+    job_id = job_id_of(job_key, batch_size)
+    todo = pending_mask.copy()
+    n_pending = int(todo.sum())
+
+    batch_nos, group = set(), {}
+    for b, chunk in enumerate(grid.chunks(batch_size)):
+        start = b * batch_size
+        indices = [start + j for j in range(len(chunk)) if todo[start + j]]
+        if not indices:
+            continue
+        group[b] = {"indices": indices, "combos": [chunk[i - start] for i in indices]}
+        batch_nos.add(b)
+        if len(group) >= PUBLISH_GROUP:
+            queue.publish(job_id, spec, group)
+            group = {}
+    if group or not batch_nos:
+        queue.publish(job_id, spec, group)
+    print_and_log(f"分布式回测 {n_pending} 个参数组合, 共 {len(batch_nos)} 个批次, 队列: {queue.url}, job: {job_id}")
+    if not local_workers:
+        print_and_log(f"等待工作进程: python distributed.py {queue.url}")
+
+    preloaded = {spec["fingerprint"]: stock_data_dict} if stock_data_dict is not None else None
+    procs = [mp.Process(target=run_worker, args=(queue.url,), kwargs={"lease": lease, "preloaded": preloaded}, daemon=True)
+             for _ in range(local_workers)]
+    for p in procs:
+        p.start()
+
+    collected, n_done = set(), 0
+    try:
+        while len(collected) < len(batch_nos):
+            new = [b for b in queue.finished(job_id) if b in batch_nos and b not in collected]
+            for b in new:
+                payload = queue.result(job_id, b)
+                if "error" in payload:
+                    queue.drop(job_id)
+                    raise RuntimeError(f"批次 {b} 在工作进程 {payload["worker"]} 上失败: {payload["error"]}")
+                for i, combo, result in zip(payload["indices"], payload["combos"], payload["results"]):
+                    # 续跑前发布的批次可能包含已经收集过的参数组合
+                    if todo[i]:
+                        todo[i] = False
+                        n_done += 1
+                        on_result(i, combo, result)
+                collected.add(b)
+                print_and_log(f"[{n_done}/{n_pending}] 批次 {b} 完成 (工作进程 {payload["worker"]})")
+            if len(collected) < len(batch_nos):
+                n_requeued = queue.requeue_expired(job_id)
+                if n_requeued:
+                    print_and_log(f"{n_requeued} 个批次租约过期, 已重新排队", level=logging.WARNING)
+                if not new:
+                    time.sleep(poll)
+        queue.drop(job_id)
+    finally:
+        for p in procs:
+            p.terminate()
+            p.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分布式参数优化的工作进程")
+    parser.add_argument("queue", help="队列地址: sqlite:///path/to/queue.db, redis://host:6379/0, file:///path/to/dir 或目录")
+    parser.add_argument("-n", "--processes", type=int, default=1, help="启动的工作进程数, 0 为全部 CPU 核心")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="租约时长 (秒)")
+    parser.add_argument("--idle-exit", type=float, default=None, help="连续空闲多少秒后退出, 默认一直运行")
+    args = parser.parse_args()
+
+    n_procs = resolve_workers(args.processes)
+    worker_kwargs = {"lease": args.lease, "idle_exit": args.idle_exit}
+    if n_procs == 1:
+        run_worker(args.queue, **worker_kwargs)
+    else:
+        procs = [mp.Process(target=run_worker, args=(args.queue,), kwargs=worker_kwargs) for _ in range(n_procs)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
@@ -31,12 +31,12 @@ class Bollinger_Strategy(Strategy_withlog):
         self.dataclose = self.datas[0].close
         self.datalow = self.datas[0].low
 
-        self.bbands = btind.BollingerBands(self.datas[0], period=self.p.period, devfactor=self.p.devfactor)
+        self.bbands = self.indicator(btind.BollingerBands, self.datas[0], period=self.p.period, devfactor=self.p.devfactor)
         self.upper_band = self.bbands.top
         self.lower_band = self.bbands.bot        
-        self.atr = btind.AverageTrueRange(self.datas[0], period=self.p.atr_period)
-        self.lma = btind.MovingAverageSimple(self.dataclose, period=self.p.lma_period)
-        self.lmama = btind.MovingAverageSimple(self.lma, period=10)
+        self.atr = self.indicator(btind.AverageTrueRange, self.datas[0], period=self.p.atr_period)
+        self.lma = self.indicator(btind.MovingAverageSimple, self.dataclose, period=self.p.lma_period)
+        self.lmama = self.indicator(btind.MovingAverageSimple, self.lma, period=10)
 
         self.stopprice = 0.0
 
@@ -32,9 +32,9 @@ class DMAStrategy(Strategy_withlog):
         self.dataclose = self.datas[0].close
         self.dataopen = self.datas[0].open
 
-        self.fast_ma = btind.MovingAverageSimple(self.datas[0].close, period=self.p.fast, plot=True)
-        self.slow_ma = btind.MovingAverageSimple(self.datas[0].close, period=self.p.slow, plot=True)
-        self.cross_over = btind.CrossOver(self.fast_ma, self.slow_ma)
+        self.fast_ma = self.indicator(btind.MovingAverageSimple, self.datas[0].close, period=self.p.fast, plot=True)
+        self.slow_ma = self.indicator(btind.MovingAverageSimple, self.datas[0].close, period=self.p.slow, plot=True)
+        self.cross_over = self.indicator(btind.CrossOver, self.fast_ma, self.slow_ma)
 
 
     # --- B.2 策略周期执行 ---
@@ -50,11 +50,11 @@ class RSI_Reversal_Strategy(Strategy_withlog):
     def __init__(self):
         super().__init__()
         self.dataclose = self.datas[0].close
-        self.rsi = btind.RelativeStrengthIndex(self.datas[0], period=self.p.period)
+        self.rsi = self.indicator(btind.RelativeStrengthIndex, self.datas[0], period=self.p.period)
 
-        self.lma = btind.MovingAverageSimple(self.datas[0].close, period=self.p.lma_period)
-        self.sma = btind.MovingAverageSimple(self.datas[0].close, period=self.p.sma_period)
-        self.atr = btind.AverageTrueRange(self.datas[0], period=self.p.atr_period)
+        self.lma = self.indicator(btind.MovingAverageSimple, self.datas[0].close, period=self.p.lma_period)
+        self.sma = self.indicator(btind.MovingAverageSimple, self.datas[0].close, period=self.p.sma_period)
+        self.atr = self.indicator(btind.AverageTrueRange, self.datas[0], period=self.p.atr_period)
         
         self.stopprice = 0.0
 
@@ -111,14 +111,14 @@ class RSI_Trend_Strategy(Strategy_withlog):
     def __init__(self):
         super().__init__()
         self.dataclose = self.datas[0].close
-        self.rsi = btind.RelativeStrengthIndex(self.datas[0], period=self.p.period)
-        self.lma = btind.MovingAverageSimple(self.dataclose, period=self.p.lma_period)
-        self.sma = btind.MovingAverageSimple(self.dataclose, period=self.p.sma_period)
-        self.rsi_ma = btind.MovingAverageSimple(self.rsi, period=self.p.rsima_period)
+        self.rsi = self.indicator(btind.RelativeStrengthIndex, self.datas[0], period=self.p.period)
+        self.lma = self.indicator(btind.MovingAverageSimple, self.dataclose, period=self.p.lma_period)
+        self.sma = self.indicator(btind.MovingAverageSimple, self.dataclose, period=self.p.sma_period)
+        self.rsi_ma = self.indicator(btind.MovingAverageSimple, self.rsi, period=self.p.rsima_period)
 
         
         
-        self.atr = btind.AverageTrueRange(self.datas[0], period=self.p.atr_period)
+        self.atr = self.indicator(btind.AverageTrueRange, self.datas[0], period=self.p.atr_period)
         self.stopprice = 0.0
 
     def notify_order(self, order):
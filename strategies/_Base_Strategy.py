@@ -8,7 +8,9 @@ class Strategy_withlog(bt.Strategy):
     """
     params = (
         ('log_dir', None),
-        ('is_opt', False)
+        ('is_opt', False),
+        ('ind_cache', None),
+        ('snapshot', None),
     )
 
     def __init__(self):
@@ -18,7 +20,10 @@ class Strategy_withlog(bt.Strategy):
         self.buycomm = 0.0
         self.order = None
         self.bar_executed = len(self)
-
+        self._ind_keys = {}
+        self._ind_pending = []
+        if self.p.snapshot is not None:
+            self.p.snapshot.bind(self)
 
         # --- 判断是否为优化模式
         if self.p.is_opt:
@@ -39,12 +44,24 @@ class Strategy_withlog(bt.Strategy):
 
         # --- 初始化日志记录 ---
         strategy_name = self.__class__.__name__
-        params_str = ", ".join([f"{k}={v}" for k, v in self.p._getkwargs().items() if k not in ['log_dir'] and not k.startswith("_")])
+        params_str = ", ".join([f"{k}={v}" for k, v in self.p._getkwargs().items() if k not in ['log_dir', 'ind_cache', 'snapshot'] and not k.startswith("_")])
         self.log(f"策略({strategy_name})初始化完成。数据源: {self.data._name}")
         self.log(f"策略参数: {params_str}")
 
 
 
+    def indicator(self, ind_cls, *datas, **kwargs):
+        """
+        创建指标, 用法与直接调用 ind_cls(*datas, **kwargs) 相同。
+        设置了 ind_cache (参数优化) 时, 数据与参数都相同的指标从缓存中回放, 不再重复计算。
+        设置了 snapshot (回测快照) 时, 指标的状态随快照保存, 续跑时只计算新 K 线。
+        """
+        if self.p.snapshot is not None:
+            return self.p.snapshot.indicator(self, ind_cls, datas, kwargs)
+        if self.p.ind_cache is None:
+            return ind_cls(*datas, **kwargs)
+        return self.p.ind_cache.indicator(self, ind_cls, datas, kwargs)
+
     def log(self, txt, level=logging.INFO):
 
         if self.p.is_opt:
@@ -94,8 +111,28 @@ class Strategy_withlog(bt.Strategy):
         self.log(f'交易关闭 - 记录盈亏: 毛利润 {trade.pnl:.2f}, 净利润 {trade.pnlcomm:.2f}')
         self.log("---------------------------------------------------------")
         
+    def _getminperstatus(self):
+        minperstatus = super()._getminperstatus()
+        if self.p.snapshot is not None and self.p.snapshot.resuming:
+            # 从快照续跑时, 预热段 (快照中已经处理过的 K 线) 上只调用 prenext
+            self._minperstatus = minperstatus = max(minperstatus, 1)
+        return minperstatus
+
+    def _next_analyzers(self, minperstatus, once=False):
+        super()._next_analyzers(minperstatus, once)
+        snapshot = self.p.snapshot
+        if snapshot is not None and snapshot.resuming and self.datetime[0] >= snapshot.end_dt:
+            snapshot.restore(self)
+
     def stop(self):
 
+        # 在清仓指令之前记录快照
+        if self.p.snapshot is not None:
+            self.p.snapshot.capture(self)
+
+        if self.p.ind_cache is not None:
+            self.p.ind_cache.collect(self)
+
         # 记录回测结束的日期，取数据源的当前时间
         current_date = bt.num2date(self.datas[0].datetime[0]).strftime('%Y-%m-%d')
         final_value = self.broker.getvalue()
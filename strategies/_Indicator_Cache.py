@@ -0,0 +1,157 @@
+"""
+参数优化期间的指标缓存。
+
+同一次优化中各参数组合使用相同的行情数据, 参数相同的指标 (例如不同 fast 组合下的同一条慢均线) 只需计算一次。
+策略通过 Strategy_withlog.indicator() 创建指标: 缓存中没有时按原指标类计算, 回测结束 (stop) 时保存各条线的数组;
+之后的参数组合直接用 ReplayIndicator 回放数组, 最小周期与原指标相同, 因此策略 next() 的调用时点和结果都不变。
+
+缓存键为 (数据标识, 指标类, 参数), 数据标识由数据源名称、长度和首末日期组成, 输入为其他指标时使用该指标的缓存键。
+只在 runonce + preload 模式 (Cerebro 默认) 下启用。IndicatorCache 被 pickle 到工作进程后, 每个进程按 token 各持有一份缓存。
+"""
+import uuid
+import array
+import backtrader as bt
+from typing import Dict, Optional, Tuple
+
+# 按 token 登记的缓存, 工作进程中反序列化时据此复用同一个缓存对象
+_CACHES: Dict[str, "IndicatorCache"] = {}
+_REPLAY_CLASSES: Dict[type, type] = {}
+
+
+class ReplayIndicator(bt.Indicator):
+    """按预先计算好的数组输出各条线, values 与 lines 一一对应。"""
+    lines = ()
+    params = (
+        ('values', None),
+        ('minperiod', 1),
+    )
+
+    def __init__(self):
+        self.addminperiod(self.p.minperiod)
+
+    def _copy(self, start, end):
+        for line, values in zip(self.lines, self.p.values):
+            line.array[start:end] = values[start:end]
+
+    def preonce(self, start, end):
+        self._copy(start, end)
+
+    def oncestart(self, start, end):
+        self._copy(start, end)
+
+    def once(self, start, end):
+        self._copy(start, end)
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        i = len(self) - 1
+        for line, values in zip(self.lines, self.p.values):
+            line[0] = values[i]
+
+
+def _replay_class(ind_cls: type) -> type:
+    """为指标类生成线名相同的回放类, 使 self.bbands.top 等属性照常可用。"""
+    if ind_cls not in _REPLAY_CLASSES:
+        _REPLAY_CLASSES[ind_cls] = type(f"Cached{ind_cls.__name__}", (ReplayIndicator,),
+                                        {"lines": ind_cls.lines._getlines(), "__module__": __name__})
+    return _REPLAY_CLASSES[ind_cls]
+
+
+def _restore(token: str) -> "IndicatorCache":
+    if token not in _CACHES:
+        _CACHES[token] = IndicatorCache(token)
+    return _CACHES[token]
+
+
+class IndicatorCache:
+    """一次参数优化范围内的指标缓存。"""
+
+    def __init__(self, token: Optional[str] = None):
+        self.token = token or uuid.uuid4().hex
+        self._entries: Dict[tuple, Tuple[list, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        _CACHES[self.token] = self
+
+    def __reduce__(self):
+        return _restore, (self.token,)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self) -> None:
+        """优化结束后释放缓存。"""
+        self._entries.clear()
+        _CACHES.pop(self.token, None)
+
+    # --- A. 缓存键 ---
+    @staticmethod
+    def _data_key(data) -> tuple:
+        dt = data.lines.datetime.array
+        return ("data", data._name, data.buflen(), dt[0], dt[-1])
+
+    def input_key(self, strategy, obj) -> Optional[tuple]:
+        """指标输入的标识: 数据源、数据源的某条线或已登记的指标, 其他输入返回 None (不缓存)。"""
+        if id(obj) in strategy._ind_keys:
+            return strategy._ind_keys[id(obj)]
+        for data in strategy.datas:
+            if obj is data:
+                return self._data_key(data)
+            for i, line in enumerate(data.lines):
+                if obj is line:
+                    return self._data_key(data) + (data._getlinealias(i),)
+        return None
+
+    def make_key(self, strategy, ind_cls: type, datas: tuple, kwargs: dict) -> Optional[tuple]:
+        env = strategy.env
+        if not (env.p.runonce and env.p.preload):
+            return None
+
+        inputs = tuple(self.input_key(strategy, obj) for obj in (datas or (strategy.datas[0],)))
+        if None in inputs:
+            return None
+
+        params = dict(ind_cls.params._getpairs())
+        params.update((k, v) for k, v in kwargs.items() if k in params)
+        key = (inputs, ind_cls, tuple(sorted(params.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    @staticmethod
+    def _clock(strategy, key: tuple):
+        """缓存键对应的源数据, 作为回放指标的时钟。"""
+        while key[0] != "data":
+            key = key[0][0]
+        return next(data for data in strategy.datas if data._name == key[1])
+
+    # --- B. 读写 ---
+    def indicator(self, strategy, ind_cls: type, datas: tuple, kwargs: dict) -> bt.Indicator:
+        """命中缓存时返回回放指标, 否则按 ind_cls 计算, 并登记在回测结束时保存。kwargs 中的绘图设置 (plot 等) 原样传入回放指标。"""
+        key = self.make_key(strategy, ind_cls, datas, kwargs)
+        if key is None:
+            return ind_cls(*datas, **kwargs)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            ind = ind_cls(*datas, **kwargs)
+            strategy._ind_pending.append((key, ind))
+        else:
+            self.hits += 1
+            values, minperiod = entry
+            plot_kwargs = {k: v for k, v in kwargs.items() if k not in ind_cls.params._getkeys()}
+            ind = _replay_class(ind_cls)(self._clock(strategy, key), values=values, minperiod=minperiod, **plot_kwargs)
+        strategy._ind_keys[id(ind)] = key
+        return ind
+
+    def collect(self, strategy) -> None:
+        """回测结束时保存本次计算的指标数组。"""
+        for key, ind in strategy._ind_pending:
+            if key not in self._entries:
+                self._entries[key] = ([array.array('d', line.array) for line in ind.lines], ind._minperiod)
+        strategy._ind_pending.clear()
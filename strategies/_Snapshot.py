@@ -0,0 +1,362 @@
+"""
+回测快照: 保存一次回测结束时的状态, 之后的回测从快照继续, 只处理快照日期之后的新 K 线, 结果与从 start_date 完整回测相同。
+
+快照包含:
+    - 经纪商的现金、资产价值与各数据源的持仓, 以及最后一根 K 线上提交、尚未执行的订单 (续跑时重新提交, 在下一根 K 线开盘执行)
+    - 策略中数值等简单类型的公有属性 (buyprice / stopprice 等)、引用挂单的属性 (order) 与未平仓的交易
+    - 各分析器 (含子分析器) 的累计状态
+    - 通过 Strategy_withlog.indicator() 创建的指标: 以 vectorized.streaming 的增量指标保存状态, 续跑时逐根计算新 K 线的值
+      (与 backtrader 逐位相同), 另外保存每条线在预热段上的值
+
+续跑时从快照最后 lookback 根 K 线开始加载数据 (预热段), 并核对与快照中保存的 K 线相同; 预热段上策略只调用 prenext,
+到快照的最后一根 K 线时还原上述状态, 之后照常运行。K 线序号 (交易的 baropen、bar_executed、指标的最小周期) 按续跑的数据长度换算。
+只支持 runonce + preload 模式 (Cerebro 默认)、增量指标已覆盖的指标类与不带关联订单的市价 / 限价 / 止损单; 观察器、交易记录与绘图只包含续跑的 K 线。
+"""
+import os
+import array
+import bisect
+import pickle
+import numbers
+import datetime
+import backtrader as bt
+import backtrader.indicators as btind
+from typing import Dict, List, Optional
+
+from ._Indicator_Cache import _replay_class
+
+SNAPSHOT_FILE = "snapshot.pkl"
+
+# 指标类 -> (增量指标类名, 传给增量指标的参数, 输入方式: "line" 为各输入的第一条线, "hlc" 为数据源的最高 / 最低 / 收盘价)
+# 其余参数只能使用默认值, _PLOT_PARAMS 只影响绘图
+_TWINS = {
+    btind.MovingAverageSimple: ("SMA", ("period",), "line"),
+    btind.RelativeStrengthIndex: ("RSI", ("period",), "line"),
+    btind.AverageTrueRange: ("ATR", ("period",), "hlc"),
+    btind.BollingerBands: ("Bollinger", ("period", "devfactor"), "line"),
+    btind.CrossOver: ("CrossOver", (), "line"),
+}
+_PLOT_PARAMS = ("upperband", "lowerband")
+
+_BAR_LINES = ("open", "high", "low", "close", "volume")
+_BROKER_ATTRS = ("cash", "_value", "_valuemkt", "_valuelever", "_valuemktlever", "_leverage", "_unrealized",
+                 "_fundval", "_fundshares")
+_ORDER_TYPES = (bt.Order.Market, bt.Order.Close, bt.Order.Limit, bt.Order.Stop, bt.Order.StopLimit)
+_ANALYZER_SKIP = ("params", "p", "_children", "_parent", "strategy", "datas", "data")
+_BT_OBJECTS = (bt.LineRoot, bt.Analyzer, bt.BrokerBase, bt.Cerebro)
+
+
+def _plain(value) -> bool:
+    """可以原样保存的简单值: 数值、字符串、日期及由它们组成的 list / tuple / dict。"""
+    if value is None or isinstance(value, (numbers.Number, str, datetime.date)):
+        return True
+    if type(value) in (list, tuple):
+        return all(_plain(v) for v in value)
+    if type(value) is dict:
+        return all(_plain(k) and _plain(v) for k, v in value.items())
+    return False
+
+
+def _same(a, b) -> bool:
+    """逐个比较两组浮点数, NaN 视为相同。"""
+    return len(a) == len(b) and all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+
+def _analyzer_state(analyzer) -> dict:
+    state = {k: v for k, v in vars(analyzer).items() if k not in _ANALYZER_SKIP and not isinstance(v, _BT_OBJECTS)}
+    return {"type": type(analyzer).__name__, "state": state,
+            "children": [_analyzer_state(child) for child in analyzer._children]}
+
+
+def _restore_analyzer(analyzer, saved: dict) -> None:
+    if type(analyzer).__name__ != saved["type"] or len(analyzer._children) != len(saved["children"]):
+        raise ValueError(f"分析器 {type(analyzer).__name__} 与快照中的 {saved["type"]} 不一致")
+    vars(analyzer).update(saved["state"])
+    for child, child_saved in zip(analyzer._children, saved["children"]):
+        _restore_analyzer(child, child_saved)
+
+
+class BacktestSnapshot:
+    """
+    作为 Strategy_withlog 的 snapshot 参数传入。state 为 None 时记录本次回测的结束状态, 否则从 state 续跑 (并同样记录结束状态)。
+    lookback 为每个数据源预热段的 K 线数, 需要不少于策略 next() 中向前引用的根数 (例如 rsi[-1] 需要 2 根)。
+    meta 为调用方用于核对的信息 (策略、参数、资金等), 原样保存在快照中。
+    """
+
+    def __init__(self, state: Optional[dict] = None, lookback: int = 5, meta: Optional[dict] = None):
+        self.state = state
+        self.lookback = state["lookback"] if state else lookback
+        self.meta = state["meta"] if state else (meta or {})
+        self.resuming = state is not None
+        self._payload: Optional[bytes] = None
+        # 通过 indicator() 创建的指标, 按创建顺序
+        self._specs: List[dict] = []
+        self._inds: list = []
+        self._twins: list = []
+        self._outputs: List[list] = []
+        self._sources: Dict[int, tuple] = {}
+        # 续跑时各数据源的预热段长度, 以及快照与本次回测之间的 K 线序号之差
+        self._warm: List[int] = []
+        self._offsets: List[int] = []
+
+    # --- A. 读写 ---
+    @classmethod
+    def load(cls, path: str) -> "BacktestSnapshot":
+        """读取快照, path 为快照文件或保存快照的输出目录。"""
+        if os.path.isdir(path):
+            path = os.path.join(path, SNAPSHOT_FILE)
+        with open(path, "rb") as f:
+            return cls(pickle.load(f))
+
+    def save(self, path: str) -> None:
+        if self._payload is None:
+            raise RuntimeError("回测尚未结束, 没有可以保存的快照")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self._payload)
+        os.replace(tmp_path, path)
+
+    @property
+    def end_dt(self) -> float:
+        return self.state["end_dt"]
+
+    @property
+    def end_date(self) -> str:
+        return bt.num2date(self.state["end_dt"]).strftime("%Y-%m-%d")
+
+    @property
+    def warm_start(self) -> str:
+        """续跑时数据的开始日期 (预热段的第一根 K 线)。"""
+        return bt.num2date(self.state["warm_dt"]).strftime("%Y-%m-%d")
+
+    def check(self, meta: dict) -> None:
+        """核对续跑的设置与快照一致。"""
+        diff = [k for k in self.meta.keys() | meta.keys() if self.meta.get(k) != meta.get(k)]
+        if diff:
+            raise ValueError(f"回测设置与快照不一致: {", ".join(f"{k} ({self.meta.get(k)} -> {meta.get(k)})" for k in sorted(diff))}")
+
+    # --- B. 指标 ---
+    def bind(self, strategy) -> None:
+        """策略初始化时调用。续跑时核对预热段的 K 线与快照相同。"""
+        env = strategy.env
+        if not (env.p.runonce and env.p.preload):
+            raise ValueError("回测快照只支持 runonce + preload 模式")
+        if not self.resuming:
+            return
+
+        saved_datas = self.state["datas"]
+        names = [d._name for d in strategy.datas]
+        if names != [s["name"] for s in saved_datas]:
+            raise ValueError(f"数据源 {names} 与快照中的 {[s["name"] for s in saved_datas]} 不一致")
+        for data, saved in zip(strategy.datas, saved_datas):
+            dts = data.lines.datetime.array
+            k = bisect.bisect_right(dts, self.end_dt)
+            same = k == len(saved["datetime"]) and _same(dts[:k], saved["datetime"])
+            same = same and all(_same(getattr(data.lines, name).array[:k], saved["bars"][name]) for name in _BAR_LINES)
+            if not same:
+                raise ValueError(f"{data._name} 在 {self.warm_start} ~ {self.end_date} 的行情与快照不一致 (数据库更新或复权方式变化), 需要完整回测")
+            self._warm.append(k)
+            self._offsets.append(saved["len"] - k)
+
+    def _source(self, strategy, obj) -> tuple:
+        """指标输入的标识: ("ind", 指标序号, 线序号) 或 ("data", 数据源序号, 线序号), 输入为数据源本身时线序号为 None。"""
+        if id(obj) in self._sources:
+            return self._sources[id(obj)]
+        for di, data in enumerate(strategy.datas):
+            if obj is data:
+                return ("data", di, None)
+            for li, line in enumerate(data.lines):
+                if obj is line:
+                    return ("data", di, li)
+        raise ValueError(f"回测快照不支持以 {type(obj).__name__} 作为指标输入, 输入需要是数据源或通过 self.indicator() 创建的指标")
+
+    def _root(self, source: tuple) -> int:
+        return source[1] if source[0] == "data" else self._specs[source[1]]["root"]
+
+    def _values(self, strategy, source: tuple, start: int, end: int) -> list:
+        kind, idx, li = source
+        if kind == "ind":
+            return self._outputs[idx][li]
+        return strategy.datas[idx].lines[li].array[start:end]
+
+    def _feed(self, strategy, twin, spec: dict, start: int) -> List[list]:
+        """把根数据源从 start 开始的 K 线依次输入增量指标, 返回每条线的输出。"""
+        data = strategy.datas[spec["root"]]
+        end = data.buflen()
+        if spec["mode"] == "hlc":
+            high, low, close = (getattr(data.lines, name).array for name in ("high", "low", "close"))
+            out = [twin.update(high[i], low[i], close[i]) for i in range(start, end)]
+        else:
+            cols = [self._values(strategy, source, start, end) for source in spec["inputs"]]
+            out = [twin.update(*xs) for xs in zip(*cols)]
+        if spec["n_lines"] == 1:
+            return [out]
+        return [list(col) for col in zip(*out)] if out else [[] for _ in range(spec["n_lines"])]
+
+    def indicator(self, strategy, ind_cls: type, datas: tuple, kwargs: dict) -> bt.Indicator:
+        """记录时按 ind_cls 计算; 续跑时用增量指标计算新 K 线, 与预热段上保存的值一起由回放指标输出。"""
+        if ind_cls not in _TWINS:
+            raise ValueError(f"回测快照不支持指标 {ind_cls.__name__}, 可用: {[c.__name__ for c in _TWINS]}")
+        twin_name, twin_params, mode = _TWINS[ind_cls]
+        defaults = dict(ind_cls.params._getpairs())
+        fixed = [k for k, v in kwargs.items()
+                 if k in defaults and k not in twin_params and k not in _PLOT_PARAMS and v != defaults[k]]
+        if fixed:
+            raise ValueError(f"回测快照不支持修改 {ind_cls.__name__} 的参数 {fixed}")
+
+        inputs = [self._source(strategy, obj) for obj in (datas or (strategy.datas[0],))]
+        if mode == "hlc":
+            if len(inputs) != 1 or inputs[0][0] != "data" or inputs[0][2] is not None:
+                raise ValueError(f"回测快照中 {ind_cls.__name__} 的输入需要是数据源")
+        else:
+            inputs = [(kind, idx, 0 if li is None else li) for kind, idx, li in inputs]
+        roots = {self._root(source) for source in inputs}
+        if len(roots) != 1:
+            raise ValueError(f"回测快照不支持输入来自多个数据源的指标 {ind_cls.__name__}")
+        spec = {"indicator": ind_cls.__name__, "twin": twin_name, "mode": mode, "inputs": inputs, "root": roots.pop(),
+                "params": {k: kwargs.get(k, defaults[k]) for k in twin_params}, "n_lines": len(ind_cls.lines._getlines())}
+
+        j = len(self._specs)
+        if self.resuming:
+            from vectorized.streaming import StreamIndicator
+            saved = self.state["indicators"]
+            if j >= len(saved) or saved[j]["spec"] != spec:
+                raise ValueError(f"策略的第 {j + 1} 个指标 {ind_cls.__name__} 与快照不一致")
+            twin = StreamIndicator.from_state(saved[j]["twin"])
+            root = spec["root"]
+            self._specs.append(spec)
+            outputs = self._feed(strategy, twin, spec, self._warm[root])
+            values = [array.array("d", tail + out) for tail, out in zip(saved[j]["tail"], outputs)]
+            plot_kwargs = {k: v for k, v in kwargs.items() if k not in defaults}
+            ind = _replay_class(ind_cls)(strategy.datas[root], values=values,
+                                         minperiod=max(1, saved[j]["minperiod"] - self._offsets[root]), **plot_kwargs)
+        else:
+            twin, outputs = None, None
+            self._specs.append(spec)
+            ind = ind_cls(*datas, **kwargs)
+
+        self._inds.append(ind)
+        self._twins.append(twin)
+        self._outputs.append(outputs)
+        self._sources[id(ind)] = ("ind", j, 0)
+        for li, line in enumerate(ind.lines):
+            self._sources[id(line)] = ("ind", j, li)
+        return ind
+
+    def _check_indicators(self, strategy) -> None:
+        registered = {id(ind) for ind in self._inds}
+        others = [type(ind).__name__ for ind in strategy._lineiterators[bt.LineIterator.IndType] if id(ind) not in registered]
+        if others:
+            raise ValueError(f"指标 {others} 没有通过 self.indicator() 创建, 不支持回测快照")
+
+    # --- C. 保存与还原 ---
+    def capture(self, strategy) -> None:
+        """回测结束时 (策略 stop, 分析器 stop 之前) 记录状态。"""
+        from vectorized.streaming import SMA, RSI, ATR, Bollinger, CrossOver
+        twin_classes = {cls.__name__: cls for cls in (SMA, RSI, ATR, Bollinger, CrossOver)}
+        self._check_indicators(strategy)
+
+        # 预热段: 各数据源最后 lookback 根 K 线中最早的日期之后的全部 K 线
+        lens = [len(data) for data in strategy.datas]
+        warm_dt = min(data.lines.datetime.array[max(n - self.lookback, 0)] for data, n in zip(strategy.datas, lens) if n)
+        warm = [n - bisect.bisect_left(data.lines.datetime.array, warm_dt, 0, n) for data, n in zip(strategy.datas, lens)]
+        datas = [{"name": data._name, "len": n,
+                  "datetime": list(data.lines.datetime.array[n - k:n]),
+                  "bars": {name: list(getattr(data.lines, name).array[n - k:n]) for name in _BAR_LINES}}
+                 for data, n, k in zip(strategy.datas, lens, warm)]
+
+        indicators = []
+        for j, (spec, ind) in enumerate(zip(self._specs, self._inds)):
+            n, k = lens[spec["root"]], warm[spec["root"]]
+            tail = [list(line.array[n - k:n]) for line in ind.lines]
+            if self._twins[j] is None:
+                self._twins[j] = twin_classes[spec["twin"]](**spec["params"])
+                self._outputs[j] = self._feed(strategy, self._twins[j], spec, 0)
+                if not all(_same(out[n - k:n], t) for out, t in zip(self._outputs[j], tail)):
+                    raise ValueError(f"{spec["indicator"]} 的增量计算结果与 backtrader 不一致, 无法保存快照")
+            indicators.append({"spec": spec, "twin": self._twins[j].state(), "tail": tail, "minperiod": ind._minperiod})
+
+        broker = strategy.broker
+        if any(order.alive() for order in broker.pending):
+            raise ValueError("回测快照不支持已被接受、尚未成交的订单 (限价单等)")
+        orders = [order for order in broker.submitted if order.alive()]
+        saved_orders = []
+        for order in orders:
+            if order.exectype not in _ORDER_TYPES or order.parent is not None:
+                raise ValueError(f"回测快照不支持 {order.getordername()} 订单或关联订单")
+            saved_orders.append({
+                "data": next(i for i, data in enumerate(strategy.datas) if data is order.data), "buy": order.isbuy(), "size": abs(order.created.size),
+                "price": None if order.exectype in (bt.Order.Market, bt.Order.Close) else order.created.price,
+                "plimit": order.created.pricelimit, "exectype": order.exectype, "valid": order.valid,
+                "tradeid": order.tradeid, "info": dict(order.info)})
+
+        attrs, order_attrs = {}, {}
+        for k, v in vars(strategy).items():
+            if k.startswith("_"):
+                continue
+            if isinstance(v, bt.Order):
+                if not any(v is order for order in orders):
+                    raise ValueError(f"策略属性 {k} 引用了已结束的订单, 不支持回测快照")
+                order_attrs[k] = next(i for i, order in enumerate(orders) if v is order)
+            elif _plain(v):
+                attrs[k] = v
+
+        trades = []
+        for di, data in enumerate(strategy.datas):
+            for tradeid, data_trades in strategy._trades.get(data, {}).items():
+                if data_trades and not data_trades[-1].isclosed:
+                    trades.append({"data": di, "tradeid": tradeid,
+                                   "state": {k: v for k, v in vars(data_trades[-1]).items() if k != "data"}})
+
+        state = {
+            "meta": self.meta, "lookback": self.lookback,
+            "end_dt": strategy.datetime[0], "warm_dt": warm_dt, "strategy_len": len(strategy),
+            "datas": datas, "indicators": indicators,
+            "broker": {k: getattr(broker, k) for k in _BROKER_ATTRS},
+            "positions": [dict(vars(broker.getposition(data))) for data in strategy.datas],
+            "orders": saved_orders, "attrs": attrs, "order_attrs": order_attrs, "trades": trades,
+            "analyzers": [_analyzer_state(analyzer) for analyzer in strategy.analyzers],
+        }
+        # 立即序列化: 之后分析器的 stop 会修改 rets 等对象
+        self._payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def restore(self, strategy) -> None:
+        """续跑到快照的最后一根 K 线 (分析器处理之后) 时还原状态, 之后的 K 线照常运行。"""
+        self._check_indicators(strategy)
+        state = self.state
+        broker = strategy.broker
+        for k, v in state["broker"].items():
+            setattr(broker, k, v)
+        for data, position in zip(strategy.datas, state["positions"]):
+            vars(broker.getposition(data)).update(position)
+
+        for saved in state["trades"]:
+            data = strategy.datas[saved["data"]]
+            trade = bt.Trade.__new__(bt.Trade)
+            vars(trade).update(saved["state"])
+            trade.data = data
+            trade.baropen -= self._offsets[saved["data"]]
+            strategy._trades[data][saved["tradeid"]] = [trade]
+
+        analyzers = list(strategy.analyzers)
+        if len(analyzers) != len(state["analyzers"]):
+            raise ValueError(f"分析器数量 ({len(analyzers)}) 与快照 ({len(state["analyzers"])}) 不一致")
+        for analyzer, saved in zip(analyzers, state["analyzers"]):
+            _restore_analyzer(analyzer, saved)
+
+        for k, v in state["attrs"].items():
+            setattr(strategy, k, v)
+        if "bar_executed" in state["attrs"]:
+            # Strategy_withlog.bar_executed 为策略的 K 线序号
+            strategy.bar_executed -= state["strategy_len"] - len(strategy)
+
+        orders = []
+        for saved in state["orders"]:
+            submit = strategy.buy if saved["buy"] else strategy.sell
+            orders.append(submit(data=strategy.datas[saved["data"]], size=saved["size"], price=saved["price"],
+                                 plimit=saved["plimit"], exectype=saved["exectype"], valid=saved["valid"],
+                                 tradeid=saved["tradeid"], **saved["info"]))
+        for k, i in state["order_attrs"].items():
+            setattr(strategy, k, orders[i])
+
+        self.resuming = False
+        strategy.log(f"已从快照恢复: 现金 {broker.cash:.2f}, 持仓 {strategy.position.size}, 挂单 {len(orders)} 个")
@@ -1,4 +1,6 @@
 from ._Base_Strategy import Strategy_withlog
+from ._Indicator_Cache import IndicatorCache
+from ._Snapshot import BacktestSnapshot, SNAPSHOT_FILE
 from ._Test_Strategy import TestStrategy, BuyOnceStrategy
 from .DMA_strategy import DMAStrategy
 from .RSI_strategy import RSI_Reversal_Strategy, RSI_Trend_Strategy
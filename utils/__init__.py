@@ -1,3 +1,9 @@
 from .main import *
 from .analysis import generate_analysis, configure_analyzers, generate_quantstats_report
-from .visualization import plot_heatmap
\ No newline at end of file
+from .visualization import plot_heatmap
+from .parallel import run_combos_parallel, resolve_workers
+from .checkpoint import ResultsLog, data_fingerprint, combo_key
+from .search import RandomSearch, SuccessiveHalving, TPESearch, SEARCHES, make_search, window_data, best_of
+from .grid import ParamGrid
+from .work_queue import FileQueue, SQLiteQueue, RedisQueue, open_queue
+from .telemetry import RunTelemetry, current_rss_mb, peak_rss_mb
\ No newline at end of file
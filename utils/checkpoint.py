@@ -0,0 +1,78 @@
+"""
+参数优化的断点记录。
+
+每个完成的参数组合以一行 JSON 追加到优化输出目录下的 results.jsonl, 写入后立即 fsync, 进程崩溃或中断时已完成的结果不会丢失。
+每行记录一个键 (策略类 + 完整参数 + global_options + 分析器 + 数据指纹的哈希) 和对应的回测结果, 续跑时据此跳过已完成的参数组合;
+参数、设置或数据有任何变化时键随之改变, 旧结果不会被误用。
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, Optional
+
+RESULTS_LOG = "results.jsonl"
+
+
+def _to_builtin(obj):
+    """json 无法直接序列化的值: numpy 标量转为 Python 数值, 其余 (range 等) 使用 repr。"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return repr(obj)
+
+
+def data_fingerprint(stock_data_dict: Dict[str, pd.DataFrame]) -> str:
+    """行情数据的指纹, 由股票代码、日期索引与各列数值计算。"""
+    h = hashlib.sha256()
+    for code, df in stock_data_dict.items():
+        h.update(str(code).encode())
+        h.update(",".join(map(str, df.columns)).encode())
+        h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def combo_key(strategy, params: dict, global_options: dict, fingerprint: str, analyzers: Iterable[str] = ()) -> str:
+    """
+    参数组合的唯一键。params 为传给策略的全部参数 (待优化参数与其余固定参数);
+    analyzers 为 opt_analyzers, 结果中的指标由分析器决定, 分析器不同时不复用旧结果 (分析器按名称选择, 与顺序无关)。
+    """
+    payload = {
+        "strategy": f"{strategy.__module__}.{strategy.__qualname__}",
+        "params": params,
+        "options": global_options,
+        "analyzers": sorted(set(analyzers)),
+        "data": fingerprint,
+    }
+    text = json.dumps(payload, sort_keys=True, default=_to_builtin, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultsLog:
+    """追加写入的结果记录 (JSON Lines)。"""
+
+    def __init__(self, output_dir: str, filename: str = RESULTS_LOG):
+        self.path = os.path.join(output_dir, filename)
+
+    def load(self) -> Dict[str, dict]:
+        """读取已完成的结果 {键: 结果}。中断时写了一半的最后一行会被忽略。"""
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[record["key"]] = record["result"]
+        return done
+
+    def append(self, key: str, result: Optional[dict]) -> None:
+        if result is None:
+            return
+        line = json.dumps({"key": key, "result": result}, default=_to_builtin, ensure_ascii=False)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
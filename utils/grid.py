@@ -0,0 +1,164 @@
+"""
+惰性参数网格。
+
+网格按 itertools.product 的顺序 (最后一个参数变化最快) 以扁平序号表示, 每次只展开一段序号 (chunk_size 个点) 为各参数的 NumPy 数组。
+约束表达式 (如 'fast < slow') 只编译一次, 直接作用于整段数组得到布尔掩码; 无法向量化计算的表达式 (and / or / min 等)
+自动退回逐点计算。只有由参数名、常量、算术与比较运算组成的表达式才整列计算, 含函数调用 (str / len / isinstance 等)、
+下标、属性、in 或 is 的表达式一律逐点计算; 整列计算时出现除零、溢出等浮点错误的表达式也退回逐点计算
+(逐点计算时 Python 会抛出 ZeroDivisionError, 而 NumPy 只得到 inf / nan)。
+计数、划分与按批输出都不需要为每个参数组合创建 dict, 只有迭代参数组合时才逐个生成。
+"""
+import ast
+import math
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_CHUNK = 1 << 18
+
+# 可以直接作用于整列数组的语法节点: 参数名、常量、算术与比较运算; 其余 (函数调用、下标、属性、in 等) 逐点计算
+_VECTOR_NODES = (ast.Expression, ast.Name, ast.Load, ast.Constant, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+                 ast.operator, ast.unaryop, ast.boolop, ast.cmpop)
+
+
+def _vectorizable(expr: str) -> bool:
+    """表达式能否直接作用于整列数组: 只含 _VECTOR_NODES 中的节点, 且比较运算不含 in / not in / is / is not。"""
+    for node in ast.walk(ast.parse(expr, mode="eval")):
+        if not isinstance(node, _VECTOR_NODES) or isinstance(node, (ast.In, ast.NotIn, ast.Is, ast.IsNot)):
+            return False
+    return True
+
+
+class ParamGrid:
+    """参数网格: opt_dict 为 {参数名: 取值列表}, constraints 为约束表达式列表 (与 opt_param_combination 相同)。"""
+
+    def __init__(self, opt_dict: dict, constraints: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK):
+        self.keys = list(opt_dict.keys())
+        self.values = [list(v) for v in opt_dict.values()]
+        self.shape = tuple(len(v) for v in self.values)
+        self.size = math.prod(self.shape)
+        self.constraints = list(constraints or [])
+        self.chunk_size = chunk_size
+
+        # 原始取值 (输出参数组合时使用) 与用于向量化计算约束的数值数组
+        self._objects = [np.array(v + [None], dtype=object)[:-1] for v in self.values]
+        self._arrays = []
+        for v, objects in zip(self.values, self._objects):
+            arr = np.asarray(v) if v else objects
+            self._arrays.append(arr if arr.dtype.kind in "biuf" else objects)
+
+        self._compile()
+        self._count = None
+
+    def _compile(self) -> None:
+        self._compiled = [(compile(expr, "<constraint>", "eval"), _vectorizable(expr)) for expr in self.constraints]
+
+    # 编译后的代码对象不能 pickle, 传给工作进程时只传表达式, 在工作进程中重新编译
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["_compiled"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._compile()
+
+    # --- A. 分段计算 ---
+    def _chunk(self, start: int, stop: int) -> Tuple[Tuple[np.ndarray, ...], np.ndarray]:
+        """返回扁平序号 [start, stop) 对应的各参数取值序号, 以及满足全部约束的掩码。"""
+        idx = np.unravel_index(np.arange(start, stop), self.shape) if self.keys else ()
+        n = stop - start
+        mask = np.ones(n, dtype=bool)
+        if not self._compiled:
+            return idx, mask
+
+        columns = {k: arr[i] for k, arr, i in zip(self.keys, self._arrays, idx)}
+        for code, vectorizable in self._compiled:
+            result = None
+            if vectorizable:
+                try:
+                    # 浮点错误 (除零、溢出、无效运算) 时退回逐点计算, 与逐点计算的结果 (或异常) 保持一致
+                    with np.errstate(all="raise"):
+                        result = np.broadcast_to(np.asarray(eval(code, {}, columns), dtype=bool), (n,))
+                except Exception:
+                    result = None
+            if result is None:
+                # 逐点计算, 只计算尚未被前面约束排除的点 (与逐个 all(...) 的短路顺序一致)
+                result = np.zeros(n, dtype=bool)
+                for j in np.flatnonzero(mask):
+                    combo = {k: objects[i[j]] for k, objects, i in zip(self.keys, self._objects, idx)}
+                    result[j] = bool(eval(code, {}, combo))
+            mask &= result
+        return idx, mask
+
+    def _ranges(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        stop = self.size if stop is None else stop
+        for s in range(start, stop, self.chunk_size):
+            yield s, min(s + self.chunk_size, stop)
+
+    # --- B. 计数与划分 ---
+    def count(self) -> int:
+        """满足约束的参数组合数。"""
+        if self._count is None:
+            self._count = sum(int(self._chunk(s, e)[1].sum()) for s, e in self._ranges())
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def partitions(self, n_parts: int) -> List[Tuple[int, int]]:
+        """把网格划分为 n_parts 段扁平序号区间 [start, stop), 各段满足约束的参数组合数相差不超过 1。"""
+        total = self.count()
+        targets = [total * k // n_parts for k in range(1, n_parts)]
+        bounds, seen = [0], 0
+        for s, e in self._ranges():
+            valid = np.flatnonzero(self._chunk(s, e)[1]) + s
+            while targets and targets[0] < seen + len(valid):
+                bounds.append(int(valid[targets.pop(0) - seen]))
+            seen += len(valid)
+        bounds += [self.size] * (n_parts + 1 - len(bounds))
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    # --- C. 输出 ---
+    def iter_batches(self, batch_size: int = DEFAULT_CHUNK, start: int = 0, stop: Optional[int] = None) -> Iterator[Dict[str, np.ndarray]]:
+        """按批输出满足约束的参数组合, 每批为 {参数名: 取值数组} (按列存放, 取值为原始对象)。"""
+        pending, n_pending = [], 0
+        for s, e in self._ranges(start, stop):
+            idx, mask = self._chunk(s, e)
+            if not mask.any():
+                continue
+            pending.append({k: objects[i[mask]] for k, objects, i in zip(self.keys, self._objects, idx)})
+            n_pending += int(mask.sum())
+            while n_pending >= batch_size:
+                batch = {k: np.concatenate([p[k] for p in pending]) for k in self.keys}
+                yield {k: v[:batch_size] for k, v in batch.items()}
+                pending = [{k: v[batch_size:] for k, v in batch.items()}]
+                n_pending -= batch_size
+        if n_pending:
+            yield {k: np.concatenate([p[k] for p in pending]) for k in self.keys}
+
+    def iter_combos(self, start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+        """逐个生成满足约束的参数组合 dict, 顺序与 itertools.product 相同。"""
+        if not self.keys:
+            # 没有待优化参数时网格只有一个空组合
+            if start <= 0 < (self.size if stop is None else stop) and self._chunk(0, 1)[1][0]:
+                yield {}
+            return
+        for s, e in self._ranges(start, stop):
+            idx, mask = self._chunk(s, e)
+            columns = [objects[i[mask]].tolist() for objects, i in zip(self._objects, idx)]
+            for values in zip(*columns):
+                yield dict(zip(self.keys, values))
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.iter_combos()
+
+    def chunks(self, chunk_size: int, start: int = 0, stop: Optional[int] = None) -> Iterator[List[dict]]:
+        """按 chunk_size 个参数组合一组输出 dict 列表, 供执行器分批提交。"""
+        chunk = []
+        for combo in self.iter_combos(start, stop):
+            chunk.append(combo)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
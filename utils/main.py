@@ -2,9 +2,10 @@ import os
 import time
 import logging
 from typing import Tuple, Optional, Iterable
-from itertools import product
 import pandas as pd
 
+from .grid import ParamGrid
+
 def make_filename(file_dir: str, *args: str, file_type: Optional[str] = None) -> str:
     """
     给定输出文件目录(file_dir)和希望文件名字里有的元素(*args),返回形如 "file_dir/AA_BB_CC_DD.filetype" 的文件路径。
@@ -32,22 +33,12 @@ def format_float_output(dict: dict):
             dict[key] = '%.2f' % value
     return dict
 
-def opt_param_combination(opt_dict: Iterable, constraints: list[str] = None) -> list[dict]:
-
-    keys = list(opt_dict.keys())
-    value_lists = list(opt_dict.values())
-    value_combinations = list(product(*value_lists))
-    all_combinations = [dict(zip(keys, combo)) for combo in value_combinations]
-
-    if not constraints:
-        return all_combinations
-
-    filtered = []
-    for combo in all_combinations:
-        if all(eval(expr, {}, combo) for expr in constraints):
-            filtered.append(combo)
-
-    return filtered
+def opt_param_combination(opt_dict: Iterable, constraints: list[str] = None) -> ParamGrid:
+    """
+    返回满足全部约束的参数组合 (惰性的 ParamGrid), 迭代顺序与 itertools.product 相同。
+    len() 为满足约束的组合数; 参数组合在迭代时才逐个生成, 需要列表时用 list() 展开。
+    """
+    return ParamGrid(opt_dict, constraints)
 
 def opt_output_result(results_df: pd.DataFrame, output_dir: str, filetype: str= "csv"):
     filepath = ".".join([os.path.join(output_dir, "opt_results"), filetype])
@@ -96,12 +87,17 @@ def setup_logger(
 def setup_logger_opt(
         strategy_name: str, 
         start_date: str, 
-        end_date: str
+        end_date: str,
+        output_dir: Optional[str] = None
         ) -> Tuple[str, logging.Logger]:
+    """
+    output_dir 为 None 时新建结果文件夹; 指定已有的文件夹时 (续跑优化) 沿用该文件夹, 日志追加写入。
+    """
 
     # 在 results 文件夹下创建 output_dir 文件夹 作为存放回测结果的文件夹
-    timestamp = time.strftime(r'%H%M%S')
-    output_dir = make_filename("results", "Optimization", strategy_name, start_date, end_date, timestamp)
+    if output_dir is None:
+        timestamp = time.strftime(r'%H%M%S')
+        output_dir = make_filename("results", "Optimization", strategy_name, start_date, end_date, timestamp)
     os.makedirs(output_dir, exist_ok=True)
 
     # 建立logger对象，并配置handler
@@ -0,0 +1,155 @@
+"""
+参数优化的多进程执行。
+
+预加载的 stock_data_dict 只在主进程中写入一块共享内存 (multiprocessing.shared_memory), 各工作进程启动时挂载一次并重建 DataFrame,
+之后每个任务只传递参数组合, 不再为每个任务序列化行情数据。结果按完成顺序收集, 最后按参数组合的原始顺序排列, 与串行执行的结果一致。
+"""
+import os
+import math
+import time
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_ALIGN = 8
+
+# 工作进程内的共享数据, 由 _init_worker 设置
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_data: Optional[Dict[str, pd.DataFrame]] = None
+
+
+class SharedDataDict:
+    """
+    将 {code: DataFrame} 按列写入一块共享内存。layout 记录每只股票的日期索引和各列在共享内存中的偏移、长度与类型,
+    连同共享内存的名字 (spec) 一起传给工作进程即可重建数据。
+    """
+
+    def __init__(self, data_dict: Dict[str, pd.DataFrame]):
+        # --- A. 计算布局 ---
+        layout, offset = [], 0
+        for code, df in data_dict.items():
+            arrays = [("__index__", df.index.to_numpy())]
+            arrays += [(col, df[col].to_numpy()) for col in df.columns]
+            columns = []
+            for col, arr in arrays:
+                columns.append((col, arr.dtype.str, offset))
+                offset += math.ceil(arr.nbytes / _ALIGN) * _ALIGN
+            layout.append((code, len(df), df.index.name, columns))
+
+        # --- B. 写入共享内存 ---
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, _ALIGN))
+        for (code, n_rows, _, columns) in layout:
+            df = data_dict[code]
+            for col, dtype, col_offset in columns:
+                values = df.index.to_numpy() if col == "__index__" else df[col].to_numpy()
+                np.ndarray(n_rows, dtype=dtype, buffer=self.shm.buf, offset=col_offset)[:] = values
+
+        self.layout = layout
+
+    @property
+    def spec(self) -> Tuple[str, list]:
+        return self.shm.name, self.layout
+
+    @staticmethod
+    def attach(spec: Tuple[str, list]) -> Tuple[shared_memory.SharedMemory, Dict[str, pd.DataFrame]]:
+        """挂载共享内存并重建 {code: DataFrame}。返回的共享内存对象需要在数据使用期间保持引用。"""
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name, track=False)
+        data_dict = {}
+        for code, n_rows, index_name, columns in layout:
+            arrays = {col: np.ndarray(n_rows, dtype=dtype, buffer=shm.buf, offset=col_offset)
+                      for col, dtype, col_offset in columns}
+            index = pd.DatetimeIndex(arrays.pop("__index__"), name=index_name)
+            data_dict[code] = pd.DataFrame(arrays, index=index)
+        return shm, data_dict
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _init_worker(spec: Tuple[str, list]) -> None:
+    global _worker_shm, _worker_data
+    _worker_shm, _worker_data = SharedDataDict.attach(spec)
+
+
+def _run_chunk(func: Callable, chunk: List[Tuple[int, dict]], kwargs: dict) -> List[Tuple[int, dict, Optional[dict], tuple]]:
+    """返回 [(序号, 参数组合, 结果, (进程号, 开始时间, 耗时))]。"""
+    results = []
+    for i, combo in chunk:
+        started, t0 = time.time(), time.perf_counter()
+        result = func(combo, stock_data_dict=_worker_data, **kwargs)
+        results.append((i, combo, result, (os.getpid(), started, time.perf_counter() - t0)))
+    return results
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """workers 为 None 或不大于 0 时使用全部 CPU 核心。"""
+    if workers is None or workers <= 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+def _indexed_chunks(combos: Iterable[dict], chunksize: int) -> Iterator[List[Tuple[int, dict]]]:
+    it = enumerate(combos)
+    while True:
+        chunk = list(islice(it, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_combos_parallel(
+        func: Callable,
+        combos: Iterable[dict],
+        stock_data_dict: Dict[str, pd.DataFrame],
+        workers: Optional[int] = None,
+        chunksize: Optional[int] = None,
+        on_result: Optional[Callable] = None,
+        timings: Optional[list] = None,
+        n_combos: Optional[int] = None,
+        collect: bool = True,
+        **kwargs
+        ) -> Optional[List[Optional[dict]]]:
+    """
+    在进程池中对每个参数组合执行 func(combo, stock_data_dict=..., **kwargs)。
+
+    func 与 kwargs 需要可以被 pickle (模块级函数、策略类等)。chunksize 为每个任务包含的参数组合数, 为 None 时按每个进程约 4 个任务划分。
+    on_result(i, combo, result) 在主进程中按完成顺序回调, i 为 combo 在 combos 中的位置。
+    timings 不为 None 时, 每完成一个任务 (在调用 on_result 之前) 追加一条 (工作进程号, 开始时间 time.time(), 耗时)。
+
+    combos 可以是列表, 也可以是参数组合的迭代器 (如 ParamGrid.iter_combos()), 此时需要给出 n_combos (参数组合数);
+    任务按需从 combos 中取出, 同时提交的任务不超过每个进程 4 个, 主进程中只保留这些任务的参数组合。
+    collect 为 True 时返回与 combos 一一对应的结果列表 (顺序与执行顺序无关); 为 False 时不保留结果 (由 on_result 处理), 返回 None。
+    """
+    if n_combos is None:
+        combos = combos if hasattr(combos, "__len__") else list(combos)
+        n_combos = len(combos)
+    workers = min(resolve_workers(workers), max(n_combos, 1))
+    chunksize = chunksize or max(1, math.ceil(n_combos / (workers * 4)))
+    max_in_flight = workers * 4
+
+    results: Optional[List[Optional[dict]]] = [None] * n_combos if collect else None
+    shared = SharedDataDict(stock_data_dict)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared.spec,)) as executor:
+            chunks = _indexed_chunks(combos, chunksize)
+            futures = {executor.submit(_run_chunk, func, chunk, kwargs) for chunk in islice(chunks, max_in_flight)}
+            while futures:
+                finished, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for i, combo, result, timing in future.result():
+                        if collect:
+                            results[i] = result
+                        if timings is not None:
+                            timings.append(timing)
+                        if on_result is not None:
+                            on_result(i, combo, result)
+                    futures |= {executor.submit(_run_chunk, func, chunk, kwargs) for chunk in islice(chunks, 1)}
+    finally:
+        shared.close()
+
+    return results
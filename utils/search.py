@@ -0,0 +1,245 @@
+"""
+参数优化的搜索策略, 作为 run_opt 全网格回测的替代。
+
+    - RandomSearch: 随机抽取参数组合
+    - SuccessiveHalving: 先在较短的日期窗口上回测较多的参数组合, 每一轮保留排名前 1/eta 的组合, 并把窗口扩大 eta 倍, 最后一轮使用完整区间
+    - TPESearch: 基于已回测结果的序贯模型优化 (Tree-structured Parzen Estimator), 在参数网格上按 l(x) / g(x) 选择下一个参数组合
+
+每种搜索都可以设置预算: max_evals (回测次数) 与 max_seconds (用时), 任一用尽即停止。run 返回完整的搜索记录 (每次回测一行),
+按 metric (默认 sharpe) 越大越好排序选择参数组合。候选参数组合来自 run_opt 的参数网格 (含约束条件), 搜索只在网格内进行。
+"""
+import math
+import time
+import random
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List, Optional
+
+# evaluate(参数组合列表, 日期窗口比例) -> 与参数组合一一对应的回测结果 (失败为 None)
+Evaluate = Callable[[List[dict], float], List[Optional[dict]]]
+
+
+def window_data(stock_data_dict: Dict[str, pd.DataFrame], fraction: float) -> Dict[str, pd.DataFrame]:
+    """截取每只股票从起始日期开始、占全部交易日 fraction 的数据。"""
+    if fraction >= 1.0:
+        return stock_data_dict
+    return {code: df.iloc[:max(1, math.ceil(len(df) * fraction))] for code, df in stock_data_dict.items()}
+
+
+class Search:
+    """搜索策略的基类。子类实现 _search, 通过 self._evaluate 回测参数组合, 预算用尽后 _evaluate 不再回测。"""
+
+    def __init__(self, max_evals: Optional[int] = None, max_seconds: Optional[float] = None, metric: str = "sharpe",
+                 seed: int = 0):
+        self.max_evals = max_evals
+        self.max_seconds = max_seconds
+        self.metric = metric
+        self.seed = seed
+        self.batch_size = 1
+        self.trace: List[dict] = []
+
+    def run(self, combos: List[dict], evaluate: Evaluate, batch_size: int = 1) -> pd.DataFrame:
+        """在 combos 中搜索, batch_size 为每次交给 evaluate 的参数组合数 (并行回测时为进程数)。返回搜索记录。"""
+        self._evaluate_fn = evaluate
+        self.batch_size = max(1, batch_size)
+        self.trace = []
+        self._rng = random.Random(self.seed)
+        self._np_rng = np.random.default_rng(self.seed)
+        self._start = time.perf_counter()
+        if combos:
+            self._search(list(combos))
+        return pd.DataFrame(self.trace)
+
+    def _search(self, combos: List[dict]) -> None:
+        raise NotImplementedError
+
+    # --- A. 预算 ---
+    def remaining(self) -> float:
+        return math.inf if self.max_evals is None else self.max_evals - len(self.trace)
+
+    def exhausted(self) -> bool:
+        if self.remaining() <= 0:
+            return True
+        return self.max_seconds is not None and time.perf_counter() - self._start >= self.max_seconds
+
+    # --- B. 回测与评分 ---
+    def _evaluate(self, combos: List[dict], fraction: float = 1.0) -> List[Optional[dict]]:
+        """按 batch_size 分批回测, 预算用尽时提前返回 (返回的结果可能少于 combos)。"""
+        results = []
+        for i in range(0, len(combos), self.batch_size):
+            if self.exhausted():
+                break
+            batch = combos[i:i + int(min(self.batch_size, self.remaining()))]
+            for combo, result in zip(batch, self._evaluate_fn(batch, fraction)):
+                row = {"step": len(self.trace) + 1, "fraction": fraction,
+                       "elapsed": round(time.perf_counter() - self._start, 3)}
+                self.trace.append(row | (result if result is not None else combo | {"combo": combo}))
+                results.append(result)
+        return results
+
+    def score(self, result: Optional[dict], metric: Optional[str] = None) -> float:
+        """result 中 metric (默认 self.metric) 的值, 失败或无法计算 (None / "N/A" / NaN) 时为 -inf。"""
+        value = None if result is None else result.get(metric or self.metric)
+        if not isinstance(value, (int, float)) or value != value:
+            return -math.inf
+        return float(value)
+
+
+class RandomSearch(Search):
+    """不放回地随机抽取参数组合, 直到预算用尽或全部回测完。"""
+
+    def _search(self, combos: List[dict]) -> None:
+        self._rng.shuffle(combos)
+        self._evaluate(combos)
+
+
+class SuccessiveHalving(Search):
+    """
+    逐轮减半: 第 r 轮的日期窗口为全部区间的 min_fraction * eta^r (最后一轮为 1.0), 每轮保留得分排名前 1/eta 的参数组合。
+    设置 max_evals 时, 首轮的参数组合数取满足各轮回测次数之和不超过 max_evals 的最大值; 否则首轮使用全部参数组合。
+    最短窗口需要长于策略指标的最小周期, 否则该轮的得分没有意义。
+
+    中间各轮 (窗口短于全部区间) 按 rung_metric (默认 rtot, 区间总收益) 排名: 默认的 sharpe 来自按年计算的 SharpeRatio 分析器,
+    窗口不超过一个自然年时为 None, 各组合的得分都是 -inf, 无法排名。最后一轮使用完整区间, 按 metric 排名与选择。
+    rung_metric 需要在 opt_analyzers 中 (rtot 来自 Returns)。
+    """
+
+    def __init__(self, eta: int = 3, min_fraction: float = 1 / 9, rung_metric: str = "rtot", **kwargs):
+        super().__init__(**kwargs)
+        self.eta = eta
+        self.min_fraction = min_fraction
+        self.rung_metric = rung_metric
+
+    def fractions(self) -> List[float]:
+        fractions, f = [], self.min_fraction
+        while f < 1.0 - 1e-9:
+            fractions.append(f)
+            f *= self.eta
+        return fractions + [1.0]
+
+    def _n_first(self, n_combos: int, n_rungs: int) -> int:
+        def cost(n):
+            total = 0
+            for _ in range(n_rungs):
+                total += n
+                n = max(1, math.ceil(n / self.eta))
+            return total
+
+        if self.max_evals is None:
+            return n_combos
+        # cost(n) >= n * sum(eta^-r), 由此得到 n 的上界; 向上取整使每轮最多多出 1 次回测, 上界之下最多再减 n_rungs 次
+        share = sum(self.eta ** -r for r in range(n_rungs))
+        n = max(1, min(n_combos, int(self.max_evals / share)))
+        while n > 1 and cost(n) > self.max_evals:
+            n -= 1
+        return n
+
+    def _search(self, combos: List[dict]) -> None:
+        fractions = self.fractions()
+        candidates = self._rng.sample(combos, self._n_first(len(combos), len(fractions)))
+        for rung, fraction in enumerate(fractions):
+            results = self._evaluate(candidates, fraction)
+            if len(results) < len(candidates) or rung == len(fractions) - 1:
+                return
+            order = sorted(range(len(candidates)), key=lambda i: self.score(results[i], self.rung_metric), reverse=True)
+            candidates = [candidates[i] for i in order[:max(1, math.ceil(len(candidates) / self.eta))]]
+
+
+class TPESearch(Search):
+    """
+    在参数网格上的 TPE: 先随机回测 n_startup 个参数组合, 之后按得分把已回测的组合分为前 gamma 的 "好" 组与其余的 "差" 组,
+    对每个参数分别估计两组的取值分布 l(x) 与 g(x) (相邻取值之间做核平滑), 选择未回测的参数组合中 l(x) / g(x) 最大的一个。
+    """
+
+    def __init__(self, n_startup: int = 10, gamma: float = 0.25, **kwargs):
+        super().__init__(**kwargs)
+        self.n_startup = n_startup
+        self.gamma = gamma
+
+    @staticmethod
+    def _parzen(idx: np.ndarray, n_values: int) -> np.ndarray:
+        counts = np.bincount(idx, minlength=n_values).astype(float)
+        kernel = counts + 0.5 * (np.r_[counts[1:], 0.0] + np.r_[0.0, counts[:-1]])
+        return (kernel + 1.0) / (kernel.sum() + n_values)
+
+    def _search(self, combos: List[dict]) -> None:
+        # --- a. 参数组合编码为各参数取值的序号 ---
+        keys = list(combos[0])
+        columns = []
+        for k in keys:
+            values = list(dict.fromkeys(combo[k] for combo in combos))
+            try:
+                values.sort()
+            except TypeError:
+                pass
+            position = {v: i for i, v in enumerate(values)}
+            columns.append((np.array([position[combo[k]] for combo in combos]), len(values)))
+
+        remaining = np.ones(len(combos), dtype=bool)
+        observed: List[int] = []
+        scores: List[float] = []
+
+        def evaluate(indices):
+            results = self._evaluate([combos[i] for i in indices])
+            for i, result in zip(indices, results):
+                remaining[i] = False
+                observed.append(i)
+                scores.append(self.score(result))
+            return len(results) == len(indices)
+
+        # --- b. 随机初始化 ---
+        startup = self._rng.sample(range(len(combos)), min(self.n_startup, len(combos)))
+        if not evaluate(startup):
+            return
+
+        # --- c. 按 l(x) / g(x) 逐个选择 ---
+        while remaining.any() and not self.exhausted():
+            order = np.argsort(-np.array(scores), kind="stable")
+            n_good = max(1, math.ceil(self.gamma * len(observed)))
+            good = np.array(observed)[order[:n_good]]
+            bad = np.array(observed)[order[n_good:]]
+
+            log_ratio = np.zeros(len(combos))
+            for idx, n_values in columns:
+                log_ratio += np.log(self._parzen(idx[good], n_values)[idx])
+                log_ratio -= np.log(self._parzen(idx[bad], n_values)[idx])
+            log_ratio[~remaining] = -np.inf
+
+            n_pick = int(min(self.batch_size, remaining.sum()))
+            noise = self._np_rng.random(len(combos)) * 1e-12
+            picks = np.argsort(-(log_ratio + noise), kind="stable")[:n_pick].tolist()
+            if not evaluate(picks):
+                return
+
+
+SEARCHES = {
+    "random": RandomSearch,
+    "halving": SuccessiveHalving,
+    "tpe": TPESearch,
+}
+
+
+def make_search(search, search_kwargs: Optional[dict] = None) -> Search:
+    """
+    search 为 Search 实例时直接返回; 为 "random" / "halving" / "tpe" 时按 search_kwargs 创建。
+    按名称创建时必须在 search_kwargs 中设置 max_evals 或 max_seconds, 否则搜索会回测整个网格 (TPE 每一步的开销还随已回测的次数增长)。
+    """
+    if not isinstance(search, str):
+        return search
+    if search not in SEARCHES:
+        raise ValueError(f"未知的搜索策略: {search}, 可用: {list(SEARCHES)}")
+    search_kwargs = search_kwargs or {}
+    if search_kwargs.get("max_evals") is None and search_kwargs.get("max_seconds") is None:
+        raise ValueError(f"搜索策略 \"{search}\" 需要预算, 请在 search_kwargs 中设置 max_evals 或 max_seconds")
+    return SEARCHES[search](**search_kwargs)
+
+
+def best_of(trace: pd.DataFrame, metric: str) -> Optional[pd.Series]:
+    """完整日期窗口 (fraction 为 1.0) 的回测中 metric 最大的一行。"""
+    if trace.empty or metric not in trace:
+        return None
+    full = trace[trace["fraction"] >= 1.0]
+    values = pd.to_numeric(full[metric], errors="coerce")
+    if values.notna().sum() == 0:
+        return None
+    return full.loc[values.idxmax()]
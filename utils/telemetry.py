@@ -0,0 +1,235 @@
+"""
+回测与参数优化的运行指标。
+
+RunTelemetry 按代码中的阶段 (A / B / C ...) 依次计时: 调用 phase() 时结束上一个阶段并开始下一个, 不需要改动各阶段的代码结构。
+参数优化时每个完成的参数组合调用 combo_done(), 按间隔输出进度 (参数组合/秒、预计剩余时间), 并记录各参数组合在哪个进程上回测及其耗时,
+据此计算每个工作进程的利用率 (回测用时 / 回测阶段的总用时)。
+
+save() 在输出目录中写入:
+    telemetry.json         汇总: 各阶段耗时、K 线/秒、参数组合/秒、工作进程利用率、峰值内存
+    telemetry_phases.csv   每个阶段一行: 耗时、占比、阶段结束时的常驻内存与峰值内存
+    telemetry_combos.csv   参数优化时每个参数组合一行: 工作进程、开始时间 (相对运行开始)、耗时
+每个阶段只读取一次计时器和 /proc, 每个参数组合只追加一条记录, 开销可以忽略, 默认开启。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from .main import print_and_log
+
+TELEMETRY_FILE = "telemetry.json"
+PHASES_FILE = "telemetry_phases.csv"
+COMBOS_FILE = "telemetry_combos.csv"
+
+PROGRESS_STEPS = 10
+PROGRESS_SECONDS = 30.0
+
+
+# --- A. 内存 ---
+def _proc_status(field: str) -> Optional[float]:
+    """/proc/self/status 中的内存字段 (VmRSS / VmHWM), 单位 MB; 非 Linux 返回 None。"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 2 ** 10, 1)
+    except OSError:
+        return None
+    return None
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存 (MB)。Linux 读取 /proc, 其余平台需要 psutil, 都不可用时返回 None。"""
+    rss = _proc_status("VmRSS")
+    if rss is None:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        rss = round(psutil.Process().memory_info().rss / 2 ** 20, 1)
+    return rss
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """
+    当前进程 (children 为 True 时为已结束的子进程中最大的一个) 的峰值常驻内存, 单位 MB。
+    Linux 上当前进程读取 /proc/self/status 的 VmHWM (getrusage 的峰值会跨 exec 继承父进程的值);
+    其余情况使用 resource, Windows 需要 psutil (只支持当前进程), 都不可用时返回 None。
+    """
+    if not children:
+        peak = _proc_status("VmHWM")
+        if peak is not None:
+            return peak
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return None if children else round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # macOS 的单位为字节, Linux 为 KB
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} 秒"
+    if seconds < 3600:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+
+
+# --- B. 运行指标 ---
+class RunTelemetry:
+    """
+    一次 run_backtest / run_opt 的运行指标。kind 为 "backtest" 或 "opt"; output_dir 为输出目录, save() 时写入指标文件。
+    bars 为回测的 K 线数 (各股票之和, 参数优化时为每个参数组合的 K 线数), 由 count(bars=...) 设置。
+    """
+
+    def __init__(self, kind: str, name: str, output_dir: str):
+        self.kind = kind
+        self.name = name
+        self.output_dir = output_dir
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.phases: List[dict] = []
+        self._current: Optional[dict] = None
+        self.counters: Dict[str, float] = {}
+
+        # 参数优化: (工作进程, 开始时间, 耗时) 与进度
+        self.combo_timings: List[Tuple[int, float, float]] = []
+        self.combos_total = 0
+        self.combos_done = 0
+        self._progress_t0: Optional[float] = None
+        self._last_report = (0, 0.0)
+
+    # --- 阶段 ---
+    def phase(self, phase: str, name: str) -> None:
+        """结束当前阶段, 开始阶段 phase (如 "B")。"""
+        self.end_phase()
+        self._current = {"phase": phase, "name": name, "start": time.perf_counter()}
+
+    def end_phase(self) -> None:
+        if self._current is None:
+            return
+        now = time.perf_counter()
+        record = self._current
+        self._current = None
+        self.phases.append({"phase": record["phase"], "name": record["name"], "start_s": round(record["start"] - self._t0, 4),
+                            "seconds": round(now - record["start"], 4),
+                            "rss_mb": current_rss_mb(), "peak_rss_mb": peak_rss_mb()})
+
+    def phase_seconds(self, phase: str) -> float:
+        """阶段 phase 及其子阶段 (如 "C.2") 的总耗时, 当前阶段计入到此刻为止的用时。"""
+        total = sum(p["seconds"] for p in self.phases if p["phase"].split(".")[0] == phase)
+        if self._current is not None and self._current["phase"].split(".")[0] == phase:
+            total += time.perf_counter() - self._current["start"]
+        return total
+
+    def count(self, **counters) -> None:
+        self.counters.update(counters)
+
+    # --- 参数优化进度 ---
+    def start_combos(self, total: int) -> None:
+        """开始回测 total 个参数组合, 之后每完成一个调用 combo_done()。"""
+        self.combos_total = total
+        self.combos_done = 0
+        self._progress_t0 = time.perf_counter()
+        self._last_report = (0, self._progress_t0)
+
+    def combo_done(self, timing: Optional[Tuple[int, float, float]] = None) -> None:
+        """
+        完成一个参数组合。timing 为 (工作进程, 开始时间 time.time(), 耗时), 并行时由 run_combos_parallel 写入 combo_timings, 不需要传入。
+        每完成约 1/PROGRESS_STEPS (最多每秒一次) 或每隔 PROGRESS_SECONDS 秒输出一次进度。
+        """
+        if timing is not None:
+            self.combo_timings.append(timing)
+        self.combos_done += 1
+        now = time.perf_counter()
+        last_done, last_time = self._last_report
+        step = max(1, self.combos_total // PROGRESS_STEPS)
+        due = self.combos_done - last_done >= step and now - last_time >= 1.0
+        if self.combos_done == self.combos_total or due or now - last_time >= PROGRESS_SECONDS:
+            self._last_report = (self.combos_done, now)
+            elapsed = now - self._progress_t0
+            rate = self.combos_done / max(elapsed, 1e-9)
+            eta = (self.combos_total - self.combos_done) / max(rate, 1e-9)
+            print_and_log(f"进度 {self.combos_done}/{self.combos_total}: {rate:.2f} 参数组合/秒, "
+                          f"已用时 {_format_seconds(elapsed)}, 预计剩余 {_format_seconds(eta)}")
+
+    def worker_stats(self, wall: float) -> List[dict]:
+        """按工作进程汇总参数组合数、回测用时与利用率 (回测用时 / wall)。"""
+        stats: Dict[int, dict] = {}
+        for worker, _, seconds in self.combo_timings:
+            entry = stats.setdefault(worker, {"worker": worker, "combos": 0, "busy_s": 0.0})
+            entry["combos"] += 1
+            entry["busy_s"] += seconds
+        for entry in stats.values():
+            entry["busy_s"] = round(entry["busy_s"], 4)
+            entry["utilization"] = round(entry["busy_s"] / max(wall, 1e-9), 4)
+        return list(stats.values())
+
+    # --- 汇总与保存 ---
+    def summary(self, status: str = "ok") -> dict:
+        wall = time.perf_counter() - self._t0
+        run_s = self.phase_seconds("D")
+        result = {
+            "kind": self.kind,
+            "name": self.name,
+            "status": status,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "wall_s": round(wall, 4),
+            "phases": {p["phase"]: p["seconds"] for p in self.phases},
+            "peak_rss_mb": peak_rss_mb(),
+            "children_peak_rss_mb": peak_rss_mb(children=True),
+            "pid": os.getpid(),
+        } | self.counters
+
+        bars = self.counters.get("bars")
+        if self.kind == "opt":
+            result["combos"] = self.combos_done
+            result["combos_per_s"] = round(self.combos_done / max(run_s, 1e-9), 4) if self.combos_done else None
+            if bars:
+                result["bars_per_s"] = round(bars * self.combos_done / max(run_s, 1e-9), 1) if self.combos_done else None
+            workers = self.worker_stats(run_s)
+            result["workers"] = workers
+            if workers:
+                result["mean_utilization"] = round(sum(w["utilization"] for w in workers) / len(workers), 4)
+        elif bars:
+            result["bars_per_s"] = round(bars / max(run_s, 1e-9), 1)
+        return result
+
+    def save(self, status: str = "ok") -> dict:
+        """结束当前阶段, 写入指标文件并输出各阶段耗时, 返回汇总。写入失败只记录警告, 不影响回测结果。"""
+        self.end_phase()
+        result = self.summary(status)
+        try:
+            with open(os.path.join(self.output_dir, TELEMETRY_FILE), "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            phases = pd.DataFrame(self.phases)
+            if not phases.empty:
+                phases["share"] = (phases["seconds"] / max(result["wall_s"], 1e-9)).round(4)
+            phases.to_csv(os.path.join(self.output_dir, PHASES_FILE), index=False)
+            if self.combo_timings:
+                combos = pd.DataFrame(self.combo_timings, columns=["worker", "start_s", "seconds"])
+                combos["start_s"] = (combos["start_s"] - self.started).round(4)
+                combos["seconds"] = combos["seconds"].round(4)
+                combos.to_csv(os.path.join(self.output_dir, COMBOS_FILE), index=False)
+        except OSError as e:
+            print_and_log(f"运行指标保存失败: {e}", level=logging.WARNING)
+
+        phases_log = ", ".join(f"{p['phase']} {p['seconds']:.2f}" for p in self.phases)
+        print_and_log(f"各阶段耗时 (秒): {phases_log}; 总用时 {result['wall_s']:.2f} 秒, 峰值内存 {result['peak_rss_mb']} MB")
+        if result.get("bars_per_s"):
+            print_and_log(f"回测速度: {result['bars_per_s']:,.0f} 根K线/秒")
+        if result.get("combos_per_s"):
+            utilization = f", 工作进程平均利用率 {result['mean_utilization']:.0%}" if "mean_utilization" in result else ""
+            print_and_log(f"优化速度: {result['combos_per_s']:.2f} 参数组合/秒{utilization}")
+        return result
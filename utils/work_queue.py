@@ -0,0 +1,444 @@
+"""
+分布式参数优化的任务队列。
+
+协调进程把待回测的参数组合按批发布到队列 (一次优化为一个 job, 每批一个 batch), 各节点的工作进程领取批次、回测后写回结果。
+领取时为批次设置租约 (lease), 工作进程每回测完一个参数组合续租一次; 租约过期 (工作进程崩溃、节点掉线) 的批次由协调进程重新放回待领取队列。
+同一批次可能因此被回测两次, 先写回的结果生效, 回测结果与执行者无关, 不影响最终结果。
+
+后端:
+    - FileQueue: 共享目录 (NFS / SMB 等), 通过原子 rename 领取批次, 租约记录在文件的修改时间上
+    - SQLiteQueue: 单个 SQLite 文件, 适合同一台机器上的多个工作进程或支持文件锁的共享存储
+    - RedisQueue: 可选, 需要 redis 包; 也可以传入接口相同的其他客户端 (如 fakeredis)
+open_queue 按地址创建后端: "sqlite:///path/to/queue.db"、"redis://host:6379/0"、"file:///path/to/dir" 或直接给出目录。
+"""
+import os
+import json
+import time
+import shutil
+import sqlite3
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from .checkpoint import _to_builtin
+
+DEFAULT_LEASE = 300.0
+
+# claim 的返回值: (job_id, 批次序号, 批次内容)
+Claim = Tuple[str, int, dict]
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=_to_builtin, ensure_ascii=False)
+
+
+class WorkQueue(ABC):
+    """任务队列的接口。批次内容与结果均为可以 JSON 序列化的 dict。"""
+
+    url: str
+
+    # --- A. 协调进程 ---
+    @abstractmethod
+    def publish(self, job_id: str, spec: dict, batches: Dict[int, dict]) -> None:
+        """发布一个 job: spec 为工作进程回测所需的设置, batches 为 {批次序号: 批次内容}。job 已存在时只补充缺少的批次。"""
+
+    @abstractmethod
+    def requeue_expired(self, job_id: str) -> int:
+        """把租约已过期且没有结果的批次放回待领取队列, 返回放回的批次数。"""
+
+    @abstractmethod
+    def finished(self, job_id: str) -> List[int]:
+        """已写回结果的批次序号。"""
+
+    @abstractmethod
+    def result(self, job_id: str, batch_no: int) -> dict:
+        """批次的结果 (complete 写回的 dict)。"""
+
+    @abstractmethod
+    def progress(self, job_id: str) -> Dict[str, int]:
+        """各状态的批次数 {"pending": ..., "running": ..., "done": ...}。"""
+
+    @abstractmethod
+    def drop(self, job_id: str) -> None:
+        """删除 job 及其全部批次与结果。"""
+
+    # --- B. 工作进程 ---
+    @abstractmethod
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> Optional[Claim]:
+        """领取一个待回测的批次, 没有时返回 None。"""
+
+    @abstractmethod
+    def extend(self, job_id: str, batch_no: int, lease: float = DEFAULT_LEASE) -> None:
+        """续租: 把批次的租约延长到 lease 秒之后。"""
+
+    @abstractmethod
+    def complete(self, job_id: str, batch_no: int, result: dict) -> None:
+        """写回批次结果, 已有结果时忽略。"""
+
+    @abstractmethod
+    def release(self, job_id: str, batch_no: int) -> None:
+        """工作进程退出时放回未完成的批次, 不必等待租约过期。"""
+
+    @abstractmethod
+    def job_spec(self, job_id: str) -> Optional[dict]:
+        """job 的 spec, job 不存在时返回 None。"""
+
+
+class FileQueue(WorkQueue):
+    """
+    共享目录队列, 每个 job 一个子目录:
+        <root>/<job_id>/spec.json, pending/<序号>.json, running/<序号>.json, done/<序号>.json
+    领取时先把 pending 中文件的修改时间设为租约到期时间, 再 rename 到 running (同一文件系统内 rename 是原子的, 只有一个工作进程能成功);
+    结果先写入临时文件再 rename 到 done。
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.url = f"file://{self.root}"
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, job_id: str, state: str, batch_no: Optional[int] = None) -> str:
+        if batch_no is None:
+            return os.path.join(self.root, job_id, state)
+        return os.path.join(self.root, job_id, state, f"{batch_no:08d}.json")
+
+    @staticmethod
+    def _write(path: str, obj: dict) -> None:
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_dumps(obj))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _read(path: str) -> dict:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _batch_nos(self, job_id: str, state: str) -> List[int]:
+        try:
+            names = os.listdir(self._path(job_id, state))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith(".json"))
+
+    # --- A. 协调进程 ---
+    def publish(self, job_id: str, spec: dict, batches: Dict[int, dict]) -> None:
+        for state in ("pending", "running", "done"):
+            os.makedirs(self._path(job_id, state), exist_ok=True)
+        known = set()
+        for state in ("pending", "running", "done"):
+            known.update(self._batch_nos(job_id, state))
+        for batch_no, payload in batches.items():
+            if batch_no not in known:
+                self._write(self._path(job_id, "pending", batch_no), payload)
+        # spec 最后写入: 工作进程只领取 spec 已存在的 job
+        self._write(os.path.join(self.root, job_id, "spec.json"), spec)
+
+    def requeue_expired(self, job_id: str) -> int:
+        now, n = time.time(), 0
+        done = set(self._batch_nos(job_id, "done"))
+        for batch_no in self._batch_nos(job_id, "running"):
+            path = self._path(job_id, "running", batch_no)
+            try:
+                if os.path.getmtime(path) >= now:
+                    continue
+                if batch_no in done:
+                    os.remove(path)
+                else:
+                    os.rename(path, self._path(job_id, "pending", batch_no))
+                    n += 1
+            except FileNotFoundError:
+                continue
+        return n
+
+    def finished(self, job_id: str) -> List[int]:
+        return self._batch_nos(job_id, "done")
+
+    def result(self, job_id: str, batch_no: int) -> dict:
+        return self._read(self._path(job_id, "done", batch_no))
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        return {state: len(self._batch_nos(job_id, state)) for state in ("pending", "running", "done")}
+
+    def drop(self, job_id: str) -> None:
+        shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+
+    # --- B. 工作进程 ---
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> Optional[Claim]:
+        for job_id in sorted(os.listdir(self.root)):
+            if not os.path.exists(os.path.join(self.root, job_id, "spec.json")):
+                continue
+            for batch_no in self._batch_nos(job_id, "pending"):
+                pending, running = self._path(job_id, "pending", batch_no), self._path(job_id, "running", batch_no)
+                try:
+                    # 先设置租约再 rename: rename 保留修改时间, 文件出现在 running 时即带有租约, 不会被 requeue_expired 立即放回
+                    deadline = time.time() + lease
+                    os.utime(pending, (deadline, deadline))
+                    os.rename(pending, running)
+                    if os.path.exists(self._path(job_id, "done", batch_no)):
+                        # 超时放回后原工作进程又写回了结果
+                        os.remove(running)
+                        continue
+                    return job_id, batch_no, self._read(running)
+                except FileNotFoundError:
+                    # 被其他工作进程领取, 或 job 已被删除
+                    continue
+        return None
+
+    def extend(self, job_id: str, batch_no: int, lease: float = DEFAULT_LEASE) -> None:
+        deadline = time.time() + lease
+        try:
+            os.utime(self._path(job_id, "running", batch_no), (deadline, deadline))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, job_id: str, batch_no: int, result: dict) -> None:
+        done = self._path(job_id, "done", batch_no)
+        if not os.path.isdir(os.path.dirname(done)) or os.path.exists(done):
+            return
+        self._write(done, result)
+        try:
+            os.remove(self._path(job_id, "running", batch_no))
+        except FileNotFoundError:
+            pass
+
+    def release(self, job_id: str, batch_no: int) -> None:
+        try:
+            os.rename(self._path(job_id, "running", batch_no), self._path(job_id, "pending", batch_no))
+        except FileNotFoundError:
+            pass
+
+    def job_spec(self, job_id: str) -> Optional[dict]:
+        path = os.path.join(self.root, job_id, "spec.json")
+        return self._read(path) if os.path.exists(path) else None
+
+
+class SQLiteQueue(WorkQueue):
+    """
+    SQLite 队列: jobs 表保存 spec, batches 表每个批次一行 (状态、租约到期时间、内容与结果)。
+    领取在 BEGIN IMMEDIATE 事务中完成, 多个进程同时领取时由 SQLite 的写锁保证每个批次只被领取一次。
+    网络文件系统上的文件锁未必可靠, 跨机器时优先使用 FileQueue 或 RedisQueue。
+    """
+
+    def __init__(self, path: str, timeout: float = 60.0):
+        self.path = os.path.abspath(path)
+        self.url = f"sqlite:///{self.path}"
+        self.timeout = timeout
+        self._conn = None
+        self._pid = None
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, spec TEXT NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    job_id TEXT NOT NULL,
+                    batch_no INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_until REAL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    PRIMARY KEY (job_id, batch_no)
+                )""")
+
+    def _connect(self) -> sqlite3.Connection:
+        # 连接不能跨进程使用, fork 出的子进程重新连接
+        if self._conn is None or self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self._connect().execute(sql, params)
+
+    # --- A. 协调进程 ---
+    def publish(self, job_id: str, spec: dict, batches: Dict[int, dict]) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO batches (job_id, batch_no, payload) VALUES (?, ?, ?)",
+                             [(job_id, batch_no, _dumps(payload)) for batch_no, payload in batches.items()])
+            conn.execute("INSERT OR REPLACE INTO jobs (job_id, spec) VALUES (?, ?)", (job_id, _dumps(spec)))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def requeue_expired(self, job_id: str) -> int:
+        cur = self._execute("UPDATE batches SET status = 'pending', lease_until = NULL "
+                            "WHERE job_id = ? AND status = 'running' AND lease_until < ?", (job_id, time.time()))
+        return cur.rowcount
+
+    def finished(self, job_id: str) -> List[int]:
+        rows = self._execute("SELECT batch_no FROM batches WHERE job_id = ? AND status = 'done' ORDER BY batch_no", (job_id,))
+        return [row[0] for row in rows]
+
+    def result(self, job_id: str, batch_no: int) -> dict:
+        row = self._execute("SELECT result FROM batches WHERE job_id = ? AND batch_no = ?", (job_id, batch_no)).fetchone()
+        return json.loads(row[0])
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        counts = {"pending": 0, "running": 0, "done": 0}
+        for status, n in self._execute("SELECT status, COUNT(*) FROM batches WHERE job_id = ? GROUP BY status", (job_id,)):
+            counts[status] = n
+        return counts
+
+    def drop(self, job_id: str) -> None:
+        self._execute("DELETE FROM batches WHERE job_id = ?", (job_id,))
+        self._execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    # --- B. 工作进程 ---
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> Optional[Claim]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT b.job_id, b.batch_no, b.payload FROM batches b JOIN jobs j ON b.job_id = j.job_id "
+                               "WHERE b.status = 'pending' ORDER BY b.job_id, b.batch_no LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE batches SET status = 'running', lease_until = ? WHERE job_id = ? AND batch_no = ?",
+                             (time.time() + lease, row[0], row[1]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def extend(self, job_id: str, batch_no: int, lease: float = DEFAULT_LEASE) -> None:
+        self._execute("UPDATE batches SET lease_until = ? WHERE job_id = ? AND batch_no = ? AND status = 'running'",
+                      (time.time() + lease, job_id, batch_no))
+
+    def complete(self, job_id: str, batch_no: int, result: dict) -> None:
+        self._execute("UPDATE batches SET status = 'done', lease_until = NULL, result = ? "
+                      "WHERE job_id = ? AND batch_no = ? AND status != 'done'", (_dumps(result), job_id, batch_no))
+
+    def release(self, job_id: str, batch_no: int) -> None:
+        self._execute("UPDATE batches SET status = 'pending', lease_until = NULL "
+                      "WHERE job_id = ? AND batch_no = ? AND status = 'running'", (job_id, batch_no))
+
+    def job_spec(self, job_id: str) -> Optional[dict]:
+        row = self._execute("SELECT spec FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+
+class RedisQueue(WorkQueue):
+    """
+    Redis 队列。每个 job 使用以下键 (prefix 默认 "btq"):
+        <prefix>:jobs                 集合, 全部 job_id
+        <prefix>:<job_id>:spec        字符串
+        <prefix>:<job_id>:payload     哈希, 批次序号 -> 批次内容
+        <prefix>:<job_id>:pending     列表, 待领取的批次序号
+        <prefix>:<job_id>:running     有序集合, 批次序号 -> 租约到期时间
+        <prefix>:<job_id>:done        哈希, 批次序号 -> 结果
+    client 为 None 时按 url 创建 redis.Redis; 也可以传入接口相同的客户端。
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None, prefix: str = "btq"):
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        self._pid = os.getpid() if client is not None else None
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("RedisQueue 需要安装 redis (pip install redis), 也可以改用 SQLiteQueue 或 FileQueue") from e
+            self._client = redis.Redis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    def _key(self, job_id: str, name: str) -> str:
+        return f"{self.prefix}:{job_id}:{name}"
+
+    @staticmethod
+    def _str(value) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    # --- A. 协调进程 ---
+    def publish(self, job_id: str, spec: dict, batches: Dict[int, dict]) -> None:
+        r = self.client
+        known = {int(self._str(b)) for b in r.hkeys(self._key(job_id, "payload"))}
+        new = [batch_no for batch_no in batches if batch_no not in known]
+        if new:
+            r.hset(self._key(job_id, "payload"), mapping={batch_no: _dumps(batches[batch_no]) for batch_no in new})
+            r.rpush(self._key(job_id, "pending"), *new)
+        r.set(self._key(job_id, "spec"), _dumps(spec))
+        r.sadd(f"{self.prefix}:jobs", job_id)
+
+    def requeue_expired(self, job_id: str) -> int:
+        r, n = self.client, 0
+        running_key, done_key, pending_key = self._key(job_id, "running"), self._key(job_id, "done"), self._key(job_id, "pending")
+        for b in r.zrangebyscore(running_key, 0, time.time()):
+            if r.zrem(running_key, b) and not r.hexists(done_key, b):
+                r.rpush(pending_key, b)
+                n += 1
+        # 领取 (lpop 与 zadd 之间) 时崩溃的工作进程留下的批次不在任何状态中, 同样放回
+        seen = {int(self._str(b)) for b in r.lrange(pending_key, 0, -1)}
+        seen.update(int(self._str(b)) for b in r.zrange(running_key, 0, -1))
+        seen.update(self.finished(job_id))
+        lost = [int(self._str(b)) for b in r.hkeys(self._key(job_id, "payload")) if int(self._str(b)) not in seen]
+        if lost:
+            r.rpush(pending_key, *lost)
+        return n + len(lost)
+
+    def finished(self, job_id: str) -> List[int]:
+        return sorted(int(self._str(b)) for b in self.client.hkeys(self._key(job_id, "done")))
+
+    def result(self, job_id: str, batch_no: int) -> dict:
+        return json.loads(self._str(self.client.hget(self._key(job_id, "done"), batch_no)))
+
+    def progress(self, job_id: str) -> Dict[str, int]:
+        r = self.client
+        return {"pending": r.llen(self._key(job_id, "pending")), "running": r.zcard(self._key(job_id, "running")),
+                "done": r.hlen(self._key(job_id, "done"))}
+
+    def drop(self, job_id: str) -> None:
+        r = self.client
+        r.delete(*[self._key(job_id, name) for name in ("spec", "payload", "pending", "running", "done")])
+        r.srem(f"{self.prefix}:jobs", job_id)
+
+    # --- B. 工作进程 ---
+    def claim(self, worker: str, lease: float = DEFAULT_LEASE) -> Optional[Claim]:
+        r = self.client
+        for job_id in sorted(self._str(j) for j in r.smembers(f"{self.prefix}:jobs")):
+            b = r.lpop(self._key(job_id, "pending"))
+            if b is None:
+                continue
+            r.zadd(self._key(job_id, "running"), {b: time.time() + lease})
+            batch_no = int(self._str(b))
+            return job_id, batch_no, json.loads(self._str(r.hget(self._key(job_id, "payload"), batch_no)))
+        return None
+
+    def extend(self, job_id: str, batch_no: int, lease: float = DEFAULT_LEASE) -> None:
+        self.client.zadd(self._key(job_id, "running"), {batch_no: time.time() + lease}, xx=True)
+
+    def complete(self, job_id: str, batch_no: int, result: dict) -> None:
+        r = self.client
+        r.hsetnx(self._key(job_id, "done"), batch_no, _dumps(result))
+        r.zrem(self._key(job_id, "running"), batch_no)
+
+    def release(self, job_id: str, batch_no: int) -> None:
+        r = self.client
+        if r.zrem(self._key(job_id, "running"), batch_no) and not r.hexists(self._key(job_id, "done"), batch_no):
+            r.rpush(self._key(job_id, "pending"), batch_no)
+
+    def job_spec(self, job_id: str) -> Optional[dict]:
+        spec = self.client.get(self._key(job_id, "spec"))
+        return None if spec is None else json.loads(self._str(spec))
+
+
+def open_queue(url) -> WorkQueue:
+    """按地址创建队列; url 已经是 WorkQueue 时原样返回。"""
+    if isinstance(url, WorkQueue):
+        return url
+    if url.startswith("sqlite:///"):
+        # 与 SQLAlchemy 相同: sqlite:///相对路径, sqlite:////绝对路径
+        return SQLiteQueue(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQueue(url)
+    if url.startswith("file://"):
+        return FileQueue(url[len("file://"):])
+    if url.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteQueue(url)
+    return FileQueue(url)
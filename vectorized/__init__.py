@@ -0,0 +1,4 @@
+from .backtest import run_vectorized, supports, VECTOR_ANALYZERS
+from .strategies import VECTOR_STRATEGIES
+from .portfolio import build_panel, run_portfolio, signal_weights, limit_locks
+from .streaming import STREAM_SIGNALS, StreamIndicator, scan, save_states, load_states
@@ -0,0 +1,49 @@
+"""
+向量化回测入口: 对一批参数组合计算与 run_opt 相同格式的结果。
+"""
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+from .engine import simulate, metrics_frame
+from .strategies import VECTOR_STRATEGIES, IndicatorCache
+
+VECTOR_ANALYZERS = ["Returns", "DrawDown", "SharpeRatio", "TradeAnalyzer"]
+
+
+def supports(strategy) -> bool:
+    return strategy in VECTOR_STRATEGIES
+
+
+def run_vectorized(
+        strategy,
+        combos: List[dict],
+        df: pd.DataFrame,
+        cash: float,
+        commission: float,
+        analyzers_list: Optional[List[str]] = None,
+        batch_size: int = 512
+        ) -> List[dict]:
+    """
+    对单只股票的数据 df 回测所有参数组合, 返回与 combos 一一对应的指标字典 (键名与 generate_analysis 相同)。
+
+    combos 中的每个字典为策略参数 (可以只包含部分参数, 其余使用策略类的默认值)。参数组合按 batch_size 分批模拟以控制内存。
+    """
+    if strategy not in VECTOR_STRATEGIES:
+        raise ValueError(f"向量化引擎不支持策略 {strategy.__name__}, 可用: {[s.__name__ for s in VECTOR_STRATEGIES]}")
+    analyzers_list = analyzers_list or VECTOR_ANALYZERS
+
+    build = VECTOR_STRATEGIES[strategy]
+    defaults = dict(strategy.params._getpairs())
+    bars = {col: df[col].to_numpy(dtype=np.float64) for col in ["open", "high", "low", "close"]}
+    cache = IndicatorCache(bars)
+
+    records = []
+    for i in range(0, len(combos), batch_size):
+        batch = [defaults | combo for combo in combos[i:i + batch_size]]
+        signals = build(cache, batch)
+        result = simulate(bars, df.index, signals["start"], signals["entry"], signals["exit_sig"],
+                          np.array([p["target_pos"] for p in batch], dtype=float), cash, commission,
+                          signals["stop"], exit_gate=signals.get("exit_gate"))
+        records.extend(metrics_frame(result, analyzers_list))
+    return records
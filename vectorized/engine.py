@@ -0,0 +1,199 @@
+"""
+单只股票、只做多/空仓的向量化回测引擎, 一次模拟一批参数组合 (每个参数组合一列)。
+
+时间轴上逐日推进, 每一步对所有参数组合做数组运算, 撮合规则与 backtrader 默认的 BackBroker 一致:
+    - 第 t 日收盘产生的市价单在 t+1 日以开盘价成交
+    - order_target_percent 的股数为 int(target * 总资产 // 收盘价), 提交或成交时现金不足 (含佣金) 则拒单
+    - 佣金为成交额的百分比, 平仓现金与盈亏的计算顺序与 backtrader 相同
+指标统计与 utils.analysis.generate_analysis 的输出一致 (Returns / DrawDown / SharpeRatio / TradeAnalyzer)。
+"""
+import math
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+SHARPE_RISKFREE = 0.01
+
+
+def simulate(
+        bars: Dict[str, np.ndarray],
+        dates: pd.DatetimeIndex,
+        start: np.ndarray,
+        entry: np.ndarray,
+        exit_sig: np.ndarray,
+        target: np.ndarray,
+        cash: float,
+        commission: float,
+        stop: dict,
+        exit_gate: Optional[np.ndarray] = None,
+        keep_equity: bool = False
+        ) -> dict:
+    """
+    bars: open/high/low/close 一维数组; start: 每个组合首次调用策略 next 的位置 (K,);
+    entry / exit_sig / exit_gate: (n, K) 布尔矩阵, 与持仓状态无关的信号部分;
+    stop: 止损规则
+        {"kind": "pct", "loss_stop": (K,)}                         止损价 = 买入价 * (1 - loss_stop)
+        {"kind": "atr", "atr": (n, K), "mult": (K,), "ratchet": (n,) 或 None}
+                                                                     止损价 = 买入价 - mult * 成交日 ATR; ratchet 为 True 的交易日
+                                                                     止损价上移到 max(收盘价 - ATR * mult, 止损价)
+    平仓条件为 exit_gate & (exit_sig | 触及止损)。返回每个组合的统计量 (K,) 数组, keep_equity 为 True 时附带资产曲线 (n, K)。
+    """
+    o, h, l, c = (np.asarray(bars[k], dtype=np.float64) for k in ("open", "high", "low", "close"))
+    n, k = entry.shape
+
+    # --- A. 账户与订单状态 ---
+    cash_arr = np.full(k, float(cash))
+    pos = np.zeros(k)
+    entry_price = np.zeros(k)
+    stop_price = np.zeros(k)
+    buy_comm = np.zeros(k)
+    pend_buy = np.zeros(k, dtype=bool)
+    pend_sell = np.zeros(k, dtype=bool)
+    pend_size = np.zeros(k)
+    pend_price = 0.0
+
+    # --- B. 统计量状态 ---
+    peak = np.full(k, -np.inf)
+    max_dd = np.zeros(k)
+    dd_len = np.zeros(k)
+    max_len = np.zeros(k)
+    n_closed = np.zeros(k, dtype=np.int64)
+    n_won = np.zeros(k, dtype=np.int64)
+    year_start = np.full(k, float(cash))
+    year_returns: List[np.ndarray] = []
+    value = cash_arr.copy()
+    equity = np.empty((n, k)) if keep_equity else None
+
+    years = dates.year.to_numpy()
+    pct_stop = stop["kind"] == "pct"
+    ratchet = stop.get("ratchet")
+
+    for t in range(n):
+        # --- a. 撮合上一交易日的订单 (开盘价) ---
+        if pend_buy.any():
+            # 提交时以下单价 (下单日收盘价) 预演成交, 现金不足则拒单
+            size = pend_size
+            pend_buy &= ((cash_arr - size * pend_price) - size * commission * pend_price) >= 0.0
+            cost = size * o[t]
+            comm = size * commission * o[t]
+            after = (cash_arr - cost) - comm
+            filled = pend_buy & (after >= 0.0)
+            cash_arr = np.where(filled, after, cash_arr)
+            pos = np.where(filled, size, pos)
+            entry_price = np.where(filled, o[t], entry_price)
+            buy_comm = np.where(filled, comm, buy_comm)
+            if pct_stop:
+                new_stop = o[t] * (1.0 - stop["loss_stop"])
+            else:
+                new_stop = o[t] - (stop["mult"] * stop["atr"][t])
+            stop_price = np.where(filled, new_stop, stop_price)
+
+        if pend_sell.any():
+            pnl = pos * (o[t] - entry_price)
+            closed_cash = (cash_arr + (pos * entry_price + pnl)) - pos * commission * o[t]
+            sell_comm = pos * commission * o[t]
+            cash_arr = np.where(pend_sell, closed_cash, cash_arr)
+            n_closed += pend_sell
+            n_won += pend_sell & ((pnl - (buy_comm + sell_comm)) >= 0.0)
+            pos = np.where(pend_sell, 0.0, pos)
+
+        pend_buy[:] = False
+        pend_sell[:] = False
+
+        # --- b. 收盘后的资产与统计量 ---
+        dvalue = pos * c[t]
+        unrealized = pos * (c[t] - entry_price)
+        value = cash_arr + np.where(dvalue > 0, (dvalue - unrealized) + unrealized, 0.0)
+        if keep_equity:
+            equity[t] = value
+
+        if t > 0 and years[t] != years[t - 1]:
+            year_returns.append(prev_value / year_start - 1.0)
+            year_start = prev_value
+        prev_value = value
+
+        peak = np.maximum(peak, value)
+        drawdown = 100.0 * (peak - value) / peak
+        max_dd = np.maximum(max_dd, drawdown)
+        dd_len = np.where(drawdown != 0, dd_len + 1, 0)
+        max_len = np.maximum(max_len, dd_len)
+
+        # --- c. 策略 next: 依据收盘数据下单 ---
+        active = t >= start
+        if not active.any():
+            continue
+
+        holding = pos != 0
+        risk = l[t] <= stop_price
+        if ratchet is not None:
+            new_stop = c[t] - (stop["atr"][t] * stop["mult"])
+            stop_price = np.where(active & ratchet[t], np.where(stop_price > new_stop, stop_price, new_stop), stop_price)
+
+        buy = active & ~holding & entry[t]
+        exit_now = exit_sig[t] | risk
+        if exit_gate is not None:
+            exit_now &= exit_gate[t]
+        pend_sell = active & holding & exit_now
+
+        if buy.any():
+            with np.errstate(invalid="ignore"):
+                size = np.floor_divide(target * value, c[t])
+            pend_buy = buy & (size > 0)
+            pend_size = np.where(pend_buy, size, pend_size)
+            pend_price = c[t]
+
+    year_returns.append(value / year_start - 1.0)
+
+    result = {
+        "value_end": value,
+        "max_dd": max_dd,
+        "max_len": max_len,
+        "closed": n_closed,
+        "won": n_won,
+        "year_returns": np.vstack(year_returns),
+        "n_bars": n,
+        "cash": float(cash),
+    }
+    if keep_equity:
+        result["equity"] = equity
+    return result
+
+
+def _sharpe(year_returns: List[float]) -> Optional[float]:
+    """SharpeRatio 分析器的默认设置: 年度收益, 无风险利率 1%, 总体标准差。"""
+    rate = pow(1.0 + SHARPE_RISKFREE, 1.0 / 1) - 1.0
+    ret_free = [r - rate for r in year_returns]
+    avg = math.fsum(ret_free) / len(ret_free)
+    dev = math.sqrt(math.fsum([pow(y - avg, 2.0) for y in ret_free]) / len(ret_free))
+    try:
+        return avg / dev
+    except ZeroDivisionError:
+        return None
+
+
+def metrics_frame(result: dict, analyzers_list: List[str]) -> List[dict]:
+    """将 simulate 的结果转换为与 generate_analysis 相同键名的指标字典, 每个参数组合一个。"""
+    k = len(result["value_end"])
+    records = [{} for _ in range(k)]
+    for i, metrics in enumerate(records):
+        if "Returns" in analyzers_list:
+            ratio = result["value_end"][i] / result["cash"]
+            rtot = math.log(ratio) if ratio > 0.0 else float("-inf")
+            ravg = rtot / result["n_bars"]
+            rnorm = math.expm1(ravg * 252.0) if ravg > float("-inf") else ravg
+            metrics["rtot"] = math.exp(rtot) - 1
+            metrics["rnorm"] = math.exp(rnorm) - 1
+
+        if "DrawDown" in analyzers_list:
+            metrics["max_dd"] = abs(float(result["max_dd"][i]))
+            metrics["max_len"] = int(result["max_len"][i])
+
+        if "SharpeRatio" in analyzers_list:
+            sharpe = _sharpe(result["year_returns"][:, i].tolist())
+            metrics["sharpe"] = sharpe
+
+        if "TradeAnalyzer" in analyzers_list:
+            total = int(result["closed"][i])
+            metrics["total"] = total
+            metrics["winrate"] = int(result["won"][i]) / total if total > 0 else "N/A"
+    return records
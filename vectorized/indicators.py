@@ -0,0 +1,101 @@
+"""
+与 backtrader 逐位一致的指标计算 (一维数组, 最小周期之前为 NaN)。
+
+backtrader 在 runonce 模式下逐元素计算指标, 这里沿用相同的运算顺序:
+    - 简单均线用 math.fsum 求窗口和再除以周期
+    - 平滑均线 (SMMA) 以首个窗口的简单均线为种子, 之后 prev * (1 - alpha) + x * alpha
+    - 乘方使用 Python 的 pow, 与 backtrader 的 pow(line, n) 相同
+"""
+import math
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def sma(x: np.ndarray, period: int) -> np.ndarray:
+    """btind.MovingAverageSimple: 窗口内 math.fsum / period。"""
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1:] = [math.fsum(window) / period for window in sliding_window_view(x, period).tolist()]
+    return out
+
+
+def smma(x: np.ndarray, period: int) -> np.ndarray:
+    """btind.SmoothedMovingAverage (Wilder 平滑), alpha = 1 / period。x 开头的 NaN 视为尚未达到最小周期。"""
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) == 0:
+        return out
+
+    seed = valid[0] + period - 1
+    if seed >= len(x):
+        return out
+
+    alpha = 1.0 / period
+    alpha1 = 1.0 - alpha
+    values = x.tolist()
+    prev = math.fsum(values[valid[0]:seed + 1]) / period
+    out[seed] = prev
+    for i in range(seed + 1, len(x)):
+        prev = prev * alpha1 + values[i] * alpha
+        out[i] = prev
+    return out
+
+
+def rsi(close: np.ndarray, period: int) -> np.ndarray:
+    """btind.RelativeStrengthIndex: UpDay / DownDay 的 SMMA 之比, 最小周期 period + 1。"""
+    diff = np.full(len(close), np.nan)
+    diff[1:] = close[1:] - close[:-1]
+    up = np.where(np.isnan(diff), np.nan, np.maximum(diff, 0.0))
+    down = np.where(np.isnan(diff), np.nan, np.maximum(-diff, 0.0))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = smma(up, period) / smma(down, period)
+        return 100.0 - 100.0 / (1.0 + rs)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int) -> np.ndarray:
+    """btind.AverageTrueRange: TrueRange 的 SMMA, 最小周期 period + 1。"""
+    tr = np.full(len(close), np.nan)
+    prev_close = close[:-1]
+    tr[1:] = np.maximum(high[1:], prev_close) - np.minimum(low[1:], prev_close)
+    return smma(tr, period)
+
+
+def _pypow(x: np.ndarray, exponent: float) -> np.ndarray:
+    """逐元素 Python pow, 负数开方 (浮点误差导致) 记为 NaN。"""
+    return np.array([math.nan if v != v or (v < 0 and exponent % 1) else pow(v, exponent) for v in x.tolist()])
+
+
+def bollinger(close: np.ndarray, period: int, devfactor: float):
+    """btind.BollingerBands, 返回 (mid, top, bot)。"""
+    mid = sma(close, period)
+    meansq = sma(_pypow(close, 2), period)
+    stddev = devfactor * _pypow(meansq - _pypow(mid, 2), 0.5)
+    return mid, mid + stddev, mid - stddev
+
+
+def crossover(fast: np.ndarray, slow: np.ndarray) -> np.ndarray:
+    """
+    btind.CrossOver: 上穿为 1, 下穿为 -1。前一期的差值使用 NonZeroDifference (差值为 0 时沿用上一个非零差值)。
+    """
+    d = fast - slow
+    out = np.full(len(d), np.nan)
+    valid = np.flatnonzero(~np.isnan(d))
+    if len(valid) < 2:
+        return out
+
+    # NonZeroDifference: 从第一个有效值开始, 差值为 0 时向前填充
+    first = valid[0]
+    keep = np.zeros(len(d), dtype=bool)
+    keep[first:] = d[first:] != 0
+    keep[first] = True
+    idx = np.where(keep, np.arange(len(d)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    nzd = np.where(np.arange(len(d)) >= first, d[idx], np.nan)
+
+    prev = nzd[first:-1]
+    cur_fast, cur_slow = fast[first + 1:], slow[first + 1:]
+    up = (prev < 0.0) & (cur_fast > cur_slow)
+    down = (prev > 0.0) & (cur_fast < cur_slow)
+    out[first + 1:] = up.astype(float) - down.astype(float)
+    return out
@@ -0,0 +1,156 @@
+"""
+向量化引擎与 backtrader 的一致性检查。
+
+对同一份数据和同一批参数组合分别用 backtrader (backtest.run_combo) 和向量化引擎回测, 逐项比较指标;
+并检查 streaming.py 的增量指标与 indicators.py 逐位相同, 以及组合引擎在停牌、跌停时延后卖出。直接运行时使用随机游走生成的行情, 对四个内置策略各抽取一批参数组合检查:
+    python -m vectorized.parity
+"""
+import math
+import random
+import numpy as np
+import pandas as pd
+from typing import List
+
+from .backtest import run_vectorized, VECTOR_ANALYZERS
+from . import indicators as ind
+from . import streaming
+
+
+def _close(a, b, rtol: float) -> bool:
+    if isinstance(a, str) or isinstance(b, str) or a is None or b is None:
+        return a == b
+    if math.isnan(a) and math.isnan(b):
+        return True
+    return math.isclose(a, b, rel_tol=rtol, abs_tol=rtol)
+
+
+def parity_check(strategy, combos: List[dict], df: pd.DataFrame, cash: float = 1000000.0, commission: float = 0.001,
+                 analyzers_list: List[str] = VECTOR_ANALYZERS, rtol: float = 1e-9) -> pd.DataFrame:
+    """返回每个参数组合、每个指标的两种结果及是否一致 (match 列)。"""
+    from backtest import run_combo
+
+    global_options = {"strategy_name": strategy.__name__, "cash": cash, "commission": commission}
+    vector_results = run_vectorized(strategy, combos, df, cash, commission, analyzers_list)
+
+    rows = []
+    for combo, vec in zip(combos, vector_results):
+        bt_result = run_combo(combo, {"parity": df}, strategy, {}, global_options, analyzers_list, output_dir=".")
+        for metric, vec_value in vec.items():
+            bt_value = bt_result.get(metric)
+            rows.append({"combo": combo, "metric": metric, "backtrader": bt_value, "vectorized": vec_value,
+                         "match": _close(bt_value, vec_value, rtol)})
+    return pd.DataFrame(rows)
+
+
+def random_walk(n_bars: int = 1500, seed: int = 0, start: str = "2016-01-01") -> pd.DataFrame:
+    """随机游走行情, 价格保留两位小数, 包含跳空与收盘价等于前一日最高价的情形。"""
+    rng = np.random.default_rng(seed)
+    close = np.round(50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n_bars))), 2)
+    open_ = np.round(close * np.exp(rng.normal(0, 0.01, n_bars)), 2)
+    high = np.maximum(open_, close) + np.round(np.abs(rng.normal(0, 0.01, n_bars)) * close, 2)
+    low = np.minimum(open_, close) - np.round(np.abs(rng.normal(0, 0.01, n_bars)) * close, 2)
+    high[1:] = np.where(rng.random(n_bars - 1) < 0.03, np.maximum(high[1:], close[:-1]), high[1:])
+    close[1:] = np.where(rng.random(n_bars - 1) < 0.03, np.minimum(high[:-1], high[1:]), close[1:])
+    low = np.minimum(low, close)
+    return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close,
+                         "volume": rng.integers(1_000, 100_000, n_bars)},
+                        index=pd.bdate_range(start, periods=n_bars, name="date"))
+
+def _same_bits(a: np.ndarray, b: np.ndarray) -> bool:
+    nan_a, nan_b = np.isnan(a), np.isnan(b)
+    return bool((nan_a == nan_b).all() and (a[~nan_a].view(np.int64) == b[~nan_b].view(np.int64)).all())
+
+
+def stream_check(df: pd.DataFrame, period: int = 14, slow: int = 30, devfactor: float = 2.0) -> List[str]:
+    """逐日更新 streaming 中的指标 (中途经 state / from_state 还原一次), 返回与 indicators.py 不一致的指标名。"""
+    high, low, close = (df[k].to_numpy(dtype=float) for k in ("high", "low", "close"))
+    expected = {
+        "sma": ind.sma(close, slow), "rsi": ind.rsi(close, period), "atr": ind.atr(high, low, close, period),
+        "bollinger": np.column_stack(ind.bollinger(close, slow, devfactor)),
+        "crossover": ind.crossover(ind.sma(close, period), ind.sma(close, slow)),
+    }
+    items = {"sma": streaming.SMA(slow), "rsi": streaming.RSI(period), "atr": streaming.ATR(period),
+             "bollinger": streaming.Bollinger(slow, devfactor), "fast": streaming.SMA(period), "slow": streaming.SMA(slow),
+             "crossover": streaming.CrossOver()}
+    values = {name: [] for name in expected}
+    for i, (h, l, c) in enumerate(zip(high.tolist(), low.tolist(), close.tolist())):
+        if i == len(close) // 2:
+            items = {name: streaming.StreamIndicator.from_state(item.state()) for name, item in items.items()}
+        values["sma"].append(items["sma"].update(c))
+        values["rsi"].append(items["rsi"].update(c))
+        values["atr"].append(items["atr"].update(h, l, c))
+        values["bollinger"].append(items["bollinger"].update(c))
+        values["crossover"].append(items["crossover"].update(items["fast"].update(c), items["slow"].update(c)))
+    return [name for name in expected if not _same_bits(expected[name], np.array(values[name], dtype=float))]
+
+
+def portfolio_check() -> List[str]:
+    """
+    组合引擎的停牌与跌停卖出: 持有的股票在卖出信号的下一交易日停牌 (或开盘跌停), 之后恢复交易,
+    应在恢复后的第一个交易日卖出。返回未按预期清仓的情形。
+    """
+    from .portfolio import build_panel, run_portfolio
+
+    dates = pd.bdate_range("2020-01-01", periods=12, name="date")
+    weights = pd.DataFrame(np.nan, index=dates, columns=["A"])
+    weights.iloc[0] = 0.95
+    weights.iloc[3] = 0.0
+
+    def bars(open_, high, low, close, tradeable):
+        return pd.DataFrame({"open": open_, "high": high, "low": low, "close": close, "volume": 1000,
+                             "tradeable": tradeable}, index=dates)
+
+    flat = np.full(len(dates), 10.0)
+    # 第 4 ~ 6 日停牌, 第 7 日恢复交易
+    suspended = bars(flat, flat + 0.2, flat - 0.2, flat, np.r_[[1] * 4, [0] * 3, [1] * 5])
+    # 第 4、5 日一字跌停 (10 -> 9.0 -> 8.1), 第 6 日恢复正常交易
+    price = np.r_[[10.0] * 4, 9.0, 8.1, [8.5] * 6]
+    spread = np.r_[[0.2] * 4, 0.0, 0.0, [0.2] * 6]
+    limit_down = bars(price, price + spread, price - spread, price, 1)
+
+    failed = []
+    for name, df, sold_at in (("停牌", suspended, 7), ("跌停", limit_down, 6)):
+        result = run_portfolio(build_panel({"A": df}), weights, cash=1000000.0, commission=0.001, keep_positions=True)
+        held = result["positions"]["A"].to_numpy()
+        if not (held[1:sold_at] > 0).all() or (held[sold_at:] != 0).any():
+            failed.append(name)
+    return failed
+
+
+PARITY_GRIDS = {
+    "DMAStrategy": {"fast": [5, 10, 15, 20], "slow": [30, 50, 120], "loss_stop": [0.03, 0.05], "target_pos": [0.95, 1.0]},
+    "RSI_Reversal_Strategy": {"period": [9, 14], "low_level": [30, 40], "sma_period": [20, 30], "lma_period": [60, 120],
+                              "atr_multiplier": [1.5, 3.0]},
+    "RSI_Trend_Strategy": {"period": [7, 14], "low_level": [40, 50], "high_level": [55, 65], "lma_period": [50, 100],
+                           "atr_multiplier": [1.5, 2.5]},
+    "Bollinger_Strategy": {"period": [10, 20], "devfactor": [1.5, 2.0], "lma_period": [30, 100], "atr_multiplier": [1.0, 2.0]},
+}
+
+
+if __name__ == "__main__":
+    from itertools import product
+    from .strategies import VECTOR_STRATEGIES
+
+    random.seed(0)
+    failed = 0
+    for seed in range(3):
+        df = random_walk(seed=seed)
+        for strategy in VECTOR_STRATEGIES:
+            grid = PARITY_GRIDS[strategy.__name__]
+            combos = [dict(zip(grid, values)) for values in product(*grid.values())]
+            combos = random.sample(combos, min(12, len(combos)))
+            result = parity_check(strategy, combos, df)
+            mismatch = result[~result["match"]]
+            failed += len(mismatch)
+            print(f"-> 数据 {seed} | {strategy.__name__:<22} {len(combos)} 个参数组合, 不一致 {len(mismatch)} 项")
+            if not mismatch.empty:
+                print(mismatch.to_string())
+        stream_mismatch = stream_check(df)
+        failed += len(stream_mismatch)
+        print(f"-> 数据 {seed} | 增量指标 不一致: {", ".join(stream_mismatch) or "无"}")
+
+    portfolio_failed = portfolio_check()
+    failed += len(portfolio_failed)
+    print(f"-> 组合引擎 停牌 / 跌停卖出 未清仓: {", ".join(portfolio_failed) or "无"}")
+
+    print("<- 一致性检查通过" if failed == 0 else f"<- 一致性检查失败: {failed} 项不一致")
@@ -0,0 +1,195 @@
+"""
+多股票组合的向量化回测: 一个现金账户, 在 (交易日 × 股票代码) 的宽表上按目标权重调仓。
+
+撮合规则与单股票引擎一致: 第 t 日收盘根据目标权重和当日总资产计算目标股数, 第 t+1 日以开盘价成交, 佣金为成交额的百分比。此外:
+    - 股数按 lot_size (A 股 100 股一手) 向下取整
+    - 停牌 (tradeable 为 False 或没有开盘价) 的股票当日不成交, 维持原持仓
+    - 开盘即涨停 (一字板或以涨停价开盘) 的股票不能买入, 开盘即跌停的股票不能卖出
+    - 因停牌或涨跌停未成交的股票保留其目标股数, 之后每个交易日继续尝试, 直到成交或被新的调仓目标取代
+    - 先卖后买, 买入所需现金 (含佣金) 超过可用现金时按比例缩减买单
+每日在所有股票上做数组运算, 只在交易日维度上循环。指标与 utils.analysis.generate_analysis 的输出一致
+(Returns / DrawDown / SharpeRatio / TradeAnalyzer, 一笔交易为某只股票从建仓到清仓)。
+"""
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Union
+
+from .engine import metrics_frame
+
+PANEL_FIELDS = ("open", "high", "low", "close")
+
+
+def build_panel(data_dict: Dict[str, pd.DataFrame], fields=PANEL_FIELDS) -> Dict[str, pd.DataFrame]:
+    """
+    把 load_stock_data 的结果 {code: DataFrame} 转换为宽表 {字段: DataFrame(交易日 × 股票代码)}。
+    附带 tradeable 宽表: 当日有行情, 且数据对齐到交易日历时 tradeable 列为 1。
+    """
+    panel = {field: pd.concat({code: df[field] for code, df in data_dict.items()}, axis=1).sort_index()
+             for field in fields}
+    tradeable = panel["close"].notna()
+    if any("tradeable" in df.columns for df in data_dict.values()):
+        flags = pd.concat({code: df["tradeable"] for code, df in data_dict.items() if "tradeable" in df.columns}, axis=1)
+        flags = flags.reindex(index=tradeable.index, columns=tradeable.columns)
+        tradeable &= flags.fillna(1).astype(bool)
+    panel["tradeable"] = tradeable
+    return panel
+
+
+def limit_locks(panel: Dict[str, pd.DataFrame], limit_pct: Union[float, pd.Series] = 0.1, tol: float = 0.005):
+    """
+    根据开盘价相对前收盘价的涨跌幅推断开盘时的涨跌停 (宽表中没有涨跌停价时使用), 返回 (涨停不可买, 跌停不可卖) 两个布尔宽表。
+    limit_pct 为涨跌幅限制, 可以按股票代码给出 (如创业板 0.2); tol 为价格取整造成的误差。复权价格不影响涨跌幅。
+    """
+    prev_close = panel["close"].shift(1)
+    change = panel["open"] / prev_close - 1.0
+    limit = limit_pct if np.isscalar(limit_pct) else pd.Series(limit_pct).reindex(panel["close"].columns).fillna(0.1)
+    up = change.ge(limit - tol) & (panel["open"] >= panel["high"])
+    down = change.le(-(limit - tol)) & (panel["open"] <= panel["low"])
+    return up, down
+
+
+def signal_weights(entry: pd.DataFrame, exit_sig: pd.DataFrame, target_pos: float = 0.95,
+                   max_positions: Optional[int] = None, score: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    买卖信号 -> 目标权重: entry 为 True 时持有、exit_sig 为 True 时不再持有 (同时出现以卖出为准), 其余日期沿用前一日的状态。
+    持有的股票等权分配 target_pos 的仓位; 设置 max_positions 时按 score 从高到低只保留前 max_positions 只。
+    只在持仓集合变化的日期给出权重, 其余日期为 NaN (不调仓)。
+    """
+    state = pd.DataFrame(np.nan, index=entry.index, columns=entry.columns)
+    state = state.mask(entry.astype(bool), 1.0).mask(exit_sig.reindex_like(entry).fillna(False).astype(bool), 0.0)
+    held = state.ffill().fillna(0.0) > 0
+    if max_positions is not None:
+        rank = (score if score is not None else pd.DataFrame(0.0, index=entry.index, columns=entry.columns))
+        rank = rank.where(held).rank(axis=1, ascending=False, method="first")
+        held &= rank.le(max_positions)
+
+    weights = held.astype(float).div(held.sum(axis=1).replace(0, np.nan), axis=0).fillna(0.0) * target_pos
+    changed = held.ne(held.shift()).any(axis=1)
+    changed.iloc[0] = True
+    return weights.where(changed, np.nan)
+
+
+def run_portfolio(
+        panel: Dict[str, pd.DataFrame],
+        weights: pd.DataFrame,
+        cash: float,
+        commission: float,
+        lot_size: int = 100,
+        limit_up: Optional[pd.DataFrame] = None,
+        limit_down: Optional[pd.DataFrame] = None,
+        limit_pct: Union[float, pd.Series] = 0.1,
+        analyzers_list: Optional[List[str]] = None,
+        keep_positions: bool = False
+        ) -> dict:
+    """
+    panel: build_panel 的结果; weights: 目标权重宽表 (交易日 × 股票代码), 某一行全为 NaN 表示当日不调仓, 调仓日缺失的股票权重为 0。
+    limit_up / limit_down 为开盘涨停 / 跌停的布尔宽表, 不提供时由 limit_locks 按 limit_pct 推断。
+
+    返回 {"equity": 每日总资产, "returns": 日收益率, "turnover": 每日成交额 / 前一日总资产, "cash": 每日现金,
+          "metrics": 与 generate_analysis 相同键名的指标, "positions": 每日持股数 (keep_positions 为 True 时)}。
+    """
+    analyzers_list = analyzers_list or ["Returns", "DrawDown", "SharpeRatio", "TradeAnalyzer"]
+    close_df = panel["close"]
+    dates, codes = close_df.index, close_df.columns
+
+    # --- A. 对齐输入 ---
+    w = weights.reindex(index=dates, columns=codes)
+    rebalance = w.notna().any(axis=1).to_numpy()
+    w = w.fillna(0.0).to_numpy(dtype=np.float64)
+
+    o = panel["open"].reindex(index=dates, columns=codes).to_numpy(dtype=np.float64)
+    c = close_df.ffill().fillna(0.0).to_numpy(dtype=np.float64)
+    tradeable = panel["tradeable"].reindex(index=dates, columns=codes).fillna(False).to_numpy(dtype=bool) & ~np.isnan(o)
+    if limit_up is None or limit_down is None:
+        up, down = limit_locks(panel, limit_pct)
+        limit_up = up if limit_up is None else limit_up
+        limit_down = down if limit_down is None else limit_down
+    can_buy = tradeable & ~limit_up.reindex(index=dates, columns=codes).fillna(False).to_numpy(dtype=bool)
+    can_sell = tradeable & ~limit_down.reindex(index=dates, columns=codes).fillna(False).to_numpy(dtype=bool)
+    o = np.nan_to_num(o)
+
+    # --- B. 账户状态 ---
+    n, k = c.shape
+    pos = np.zeros(k)
+    cash_now = float(cash)
+    target = None
+    equity = np.empty(n)
+    cash_arr = np.empty(n)
+    turnover = np.zeros(n)
+    positions = np.empty((n, k)) if keep_positions else None
+    trade_flow = np.zeros(k)
+    n_closed = n_won = 0
+
+    for t in range(n):
+        # --- a. 以开盘价执行上一交易日的调仓 ---
+        if target is not None:
+            # target 中为 NaN 的股票没有待执行的调仓
+            delta = np.where(np.isnan(target), 0.0, target - pos)
+            sell = np.where((delta < 0) & can_sell[t], -delta, 0.0)
+            buy = np.where((delta > 0) & can_buy[t], delta, 0.0)
+            blocked = ((delta < 0) & ~can_sell[t]) | ((delta > 0) & ~can_buy[t])
+
+            sell_value = sell * o[t]
+            sell_comm = sell_value * commission
+            cash_now += sell_value.sum() - sell_comm.sum()
+
+            need = (buy * o[t]).sum() * (1.0 + commission)
+            if need > cash_now:
+                buy = np.floor(buy * (max(cash_now, 0.0) / need) / lot_size) * lot_size
+            buy_value = buy * o[t]
+            buy_comm = buy_value * commission
+            cash_now -= buy_value.sum() + buy_comm.sum()
+
+            pos = pos - sell + buy
+            trade_flow += (sell_value - sell_comm) - (buy_value + buy_comm)
+            turnover[t] = (sell_value.sum() + buy_value.sum()) / equity[t - 1]
+
+            closed = (sell > 0) & (pos == 0)
+            n_closed += int(closed.sum())
+            n_won += int((closed & (trade_flow >= 0.0)).sum())
+            trade_flow[closed] = 0.0
+            # 停牌或涨跌停而未成交的部分留到下一交易日; 因现金不足缩减的买单不再补足
+            target = np.where(blocked, target, np.nan) if blocked.any() else None
+
+        # --- b. 收盘后的资产 ---
+        equity[t] = cash_now + (pos * c[t]).sum()
+        cash_arr[t] = cash_now
+        if keep_positions:
+            positions[t] = pos
+
+        # --- c. 按目标权重计算下一交易日的目标股数 ---
+        if rebalance[t] and t < n - 1:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                shares = np.where(c[t] > 0, w[t] * equity[t] / c[t], 0.0)
+            target = np.floor(shares / lot_size) * lot_size
+
+    # --- C. 指标 ---
+    equity_s = pd.Series(equity, index=dates, name="equity")
+    years = dates.year.to_numpy()
+    year_end = np.r_[years[1:] != years[:-1], True]
+    year_values = np.r_[float(cash), equity[year_end]]
+    peak = np.maximum.accumulate(equity)
+    drawdown = 100.0 * (peak - equity) / peak
+    idx = np.arange(n)
+    last_flat = np.maximum.accumulate(np.where(drawdown == 0, idx, -1))
+    result = {
+        "value_end": equity[-1:],
+        "max_dd": np.array([drawdown.max()]),
+        "max_len": np.array([np.where(drawdown != 0, idx - last_flat, 0).max()]),
+        "closed": np.array([n_closed]),
+        "won": np.array([n_won]),
+        "year_returns": (year_values[1:] / year_values[:-1] - 1.0).reshape(-1, 1),
+        "n_bars": n,
+        "cash": float(cash),
+    }
+
+    out = {
+        "equity": equity_s,
+        "returns": equity_s / np.r_[float(cash), equity[:-1]] - 1.0,
+        "turnover": pd.Series(turnover, index=dates, name="turnover"),
+        "cash": pd.Series(cash_arr, index=dates, name="cash"),
+        "metrics": metrics_frame(result, analyzers_list)[0],
+    }
+    if keep_positions:
+        out["positions"] = pd.DataFrame(positions, index=dates, columns=codes)
+    return out
@@ -0,0 +1,141 @@
+"""
+内置策略的向量化信号。每个构建函数把一批参数组合转换为 engine.simulate 的输入 (每个组合一列),
+信号条件逐条对应 strategies/ 中各策略 next() 的写法; 指标按参数值缓存, 同一批次及不同批次之间共享。
+"""
+import numpy as np
+from typing import Callable, Dict, List
+
+from strategies import DMAStrategy, RSI_Reversal_Strategy, RSI_Trend_Strategy, Bollinger_Strategy
+from . import indicators as ind
+
+
+class IndicatorCache:
+    """按 (指标名, 参数) 缓存一维指标数组。"""
+
+    def __init__(self, bars: Dict[str, np.ndarray]):
+        self.bars = bars
+        self._values: Dict[tuple, np.ndarray] = {}
+
+    def get(self, key: tuple, func: Callable) -> np.ndarray:
+        if key not in self._values:
+            self._values[key] = func()
+        return self._values[key]
+
+    def sma(self, period: int) -> np.ndarray:
+        return self.get(("sma", period), lambda: ind.sma(self.bars["close"], period))
+
+    def rsi(self, period: int) -> np.ndarray:
+        return self.get(("rsi", period), lambda: ind.rsi(self.bars["close"], period))
+
+    def atr(self, period: int) -> np.ndarray:
+        b = self.bars
+        return self.get(("atr", period), lambda: ind.atr(b["high"], b["low"], b["close"], period))
+
+
+def _prev(x: np.ndarray) -> np.ndarray:
+    """line[-1]: 前一期的值, 第一期为 NaN。"""
+    out = np.empty_like(x)
+    out[0] = np.nan
+    out[1:] = x[:-1]
+    return out
+
+
+def _stack(columns: List[np.ndarray]) -> np.ndarray:
+    return np.column_stack(columns)
+
+
+# --- A. 双均线 ---
+def build_dma(cache: IndicatorCache, combos: List[dict]) -> dict:
+    entry, exit_sig = [], []
+    for p in combos:
+        cross = cache.get(("crossover", p["fast"], p["slow"]),
+                          lambda: ind.crossover(cache.sma(p["fast"]), cache.sma(p["slow"])))
+        entry.append(cross > 0)
+        exit_sig.append(cross < 0)
+
+    return {
+        "start": np.array([max(p["fast"], p["slow"]) for p in combos]),
+        "entry": _stack(entry),
+        "exit_sig": _stack(exit_sig),
+        "stop": {"kind": "pct", "loss_stop": np.array([p["loss_stop"] for p in combos], dtype=float)},
+    }
+
+
+# --- B. RSI 反转 ---
+def build_rsi_reversal(cache: IndicatorCache, combos: List[dict]) -> dict:
+    close = cache.bars["close"]
+    entry, exit_sig, atr = [], [], []
+    for p in combos:
+        rsi = cache.rsi(p["period"])
+        rsi_prev = cache.get(("rsi_prev", p["period"]), lambda: _prev(rsi))
+        buy_sig = (rsi > p["low_level"]) & (rsi_prev <= p["low_level"])
+        sell_sig = (rsi < p["high_level"]) & (rsi_prev >= p["high_level"])
+        entry.append(buy_sig & (close > cache.sma(p["lma_period"])))
+        exit_sig.append(sell_sig & (close < cache.sma(p["sma_period"])))
+        atr.append(cache.atr(p["atr_period"]))
+
+    return {
+        "start": np.array([max(p["period"] + 1, p["lma_period"], p["sma_period"], p["atr_period"] + 1) - 1 for p in combos]),
+        "entry": _stack(entry),
+        "exit_sig": _stack(exit_sig),
+        "stop": {"kind": "atr", "atr": _stack(atr), "mult": np.array([p["atr_multiplier"] for p in combos], dtype=float)},
+    }
+
+
+# --- C. RSI 趋势 ---
+def build_rsi_trend(cache: IndicatorCache, combos: List[dict]) -> dict:
+    bars = cache.bars
+    close = bars["close"]
+    entry, exit_sig, atr = [], [], []
+    for p in combos:
+        rsi = cache.rsi(p["period"])
+        rsi_prev = cache.get(("rsi_prev", p["period"]), lambda: _prev(rsi))
+        rsi_ma = cache.get(("rsi_ma", p["period"], p["rsima_period"]), lambda: ind.sma(rsi, p["rsima_period"]))
+        buy_sig = (rsi > p["high_level"]) & (rsi_prev <= p["high_level"]) & (rsi > rsi_ma)
+        sell_sig = (rsi < p["low_level"]) & (rsi_prev >= p["low_level"]) & (rsi < rsi_ma)
+        entry.append(buy_sig & (close > cache.sma(p["lma_period"])))
+        exit_sig.append(sell_sig)
+        atr.append(cache.atr(p["atr_period"]))
+
+    # 收盘价等于前一日最高价时上移止损价, 与是否持仓无关
+    ratchet = close == _prev(bars["high"])
+
+    return {
+        "start": np.array([max(p["period"] + 1, p["lma_period"], p["sma_period"], p["period"] + p["rsima_period"],
+                               p["atr_period"] + 1) - 1 for p in combos]),
+        "entry": _stack(entry),
+        "exit_sig": _stack(exit_sig),
+        "stop": {"kind": "atr", "atr": _stack(atr), "mult": np.array([p["atr_multiplier"] for p in combos], dtype=float),
+                 "ratchet": ratchet},
+    }
+
+
+# --- D. 布林带 ---
+def build_bollinger(cache: IndicatorCache, combos: List[dict]) -> dict:
+    close = cache.bars["close"]
+    entry, exit_sig, gate, atr = [], [], [], []
+    for p in combos:
+        mid, top, bot = cache.get(("bollinger", p["period"], p["devfactor"]),
+                                  lambda: ind.bollinger(close, p["period"], p["devfactor"]))
+        lma = cache.sma(p["lma_period"])
+        lmama = cache.get(("lmama", p["lma_period"]), lambda: ind.sma(lma, 10))
+        entry.append(close < bot)
+        exit_sig.append(close > top)
+        gate.append(~(lma > lmama))
+        atr.append(cache.atr(p["atr_period"]))
+
+    return {
+        "start": np.array([max(p["period"], p["atr_period"] + 1, p["lma_period"] + 9) - 1 for p in combos]),
+        "entry": _stack(entry),
+        "exit_sig": _stack(exit_sig),
+        "exit_gate": _stack(gate),
+        "stop": {"kind": "atr", "atr": _stack(atr), "mult": np.array([p["atr_multiplier"] for p in combos], dtype=float)},
+    }
+
+
+VECTOR_STRATEGIES = {
+    DMAStrategy: build_dma,
+    RSI_Reversal_Strategy: build_rsi_reversal,
+    RSI_Trend_Strategy: build_rsi_trend,
+    Bollinger_Strategy: build_bollinger,
+}
@@ -0,0 +1,405 @@
+"""
+逐日增量计算的指标与内置策略信号, 用于收盘后判断当天的 K 线是否触发买卖信号, 不必重跑完整回测。
+
+每个指标只保存计算下一个值所需的状态 (均线为窗口内的数值, 平滑均线为上一个值), 每根新 K 线的计算量与历史长度无关;
+state() 返回可以 JSON 序列化的状态, from_state 还原后继续更新。计算顺序与 indicators.py (与 backtrader 逐位一致) 相同:
+    - 简单均线的窗口和以 2^-1074 为单位的整数精确累加 (加入新值、减去移出的值), 再以整数除法正确舍入,
+      结果与 math.fsum(window) 相同, 即与 backtrader 相同
+    - 平滑均线 (SMMA)、RSI、ATR、布林带、交叉信号逐项沿用 indicators.py 的公式
+
+    python -m vectorized.parity 同时检查增量计算与 indicators.py 的结果逐位相同。
+"""
+import math
+import json
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict
+
+import pandas as pd
+
+from strategies import DMAStrategy, RSI_Reversal_Strategy, RSI_Trend_Strategy, Bollinger_Strategy
+
+_SCALE_BITS = 1074  # 最小的次正规数为 2^-1074, 任意有限浮点数乘以 2^1074 都是整数
+_SCALE = 1 << _SCALE_BITS
+NAN = math.nan
+
+# Strategy_withlog 的参数, 与信号无关
+_BASE_PARAMS = ("log_dir", "is_opt", "ind_cache", "snapshot")
+
+
+def _scaled(x: float) -> int:
+    n, d = x.as_integer_ratio()
+    return n << (_SCALE_BITS - d.bit_length() + 1)
+
+
+def _pypow(v: float, exponent: float) -> float:
+    """与 indicators._pypow 相同: Python pow, 负数开方记为 NaN。"""
+    return NAN if v != v or (v < 0 and exponent % 1) else pow(v, exponent)
+
+
+# --- A. 指标 ---
+class StreamIndicator:
+    """增量指标的基类。update 输入一根 K 线的数值并返回当期值, 未达到最小周期时为 NaN。"""
+
+    _fields: tuple = ()
+    _registry: Dict[str, type] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        StreamIndicator._registry[cls.__name__] = cls
+
+    def state(self) -> dict:
+        out = {"type": type(self).__name__}
+        for name in self._fields:
+            value = getattr(self, name)
+            if isinstance(value, StreamIndicator):
+                value = value.state()
+            elif isinstance(value, deque):
+                value = list(value)
+            out[name] = value
+        return out
+
+    @classmethod
+    def from_state(cls, state: dict) -> "StreamIndicator":
+        klass = StreamIndicator._registry[state["type"]]
+        if klass is not cls:
+            return klass.from_state(state)
+        obj = cls.__new__(cls)
+        for name in cls._fields:
+            value = state[name]
+            if isinstance(value, dict) and "type" in value:
+                value = StreamIndicator.from_state(value)
+            setattr(obj, name, value)
+        return obj
+
+
+class WindowSum(StreamIndicator):
+    """最近 period 个值的和, 与 math.fsum(window) 逐位相同。窗口中有 NaN / inf 时退回 math.fsum。"""
+
+    _fields = ("period", "window", "total", "n_special")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = deque()
+        self.total = 0
+        self.n_special = 0
+
+    def _add(self, x: float, sign: int) -> None:
+        if math.isfinite(x):
+            self.total += sign * _scaled(x)
+        else:
+            self.n_special += sign
+
+    def update(self, x: float) -> float:
+        self.window.append(x)
+        self._add(x, 1)
+        if len(self.window) > self.period:
+            self._add(self.window.popleft(), -1)
+        if len(self.window) < self.period:
+            return NAN
+        if self.n_special or self.total == 0:
+            # 非有限值与 0 的符号交给 math.fsum 处理
+            return math.fsum(self.window)
+        return self.total / _SCALE
+
+    @classmethod
+    def from_state(cls, state: dict) -> "WindowSum":
+        obj = super().from_state(state)
+        obj.window = deque(obj.window)
+        return obj
+
+
+class SMA(StreamIndicator):
+    """btind.MovingAverageSimple。"""
+
+    _fields = ("period", "sum", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.sum = WindowSum(period)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        total = self.sum.update(x)
+        self.value = total / self.period if total == total else NAN
+        return self.value
+
+
+class SMMA(StreamIndicator):
+    """btind.SmoothedMovingAverage: 从第一个非 NaN 值开始, 以首个窗口的简单均线为种子, 之后 prev * (1 - alpha) + x * alpha。"""
+
+    _fields = ("period", "seed", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.seed = []
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if self.seed is None:
+            self.value = self.value * (1.0 - 1.0 / self.period) + x * (1.0 / self.period)
+        elif self.seed or x == x:
+            self.seed.append(x)
+            if len(self.seed) == self.period:
+                self.value = math.fsum(self.seed) / self.period
+                self.seed = None
+        return self.value
+
+
+class RSI(StreamIndicator):
+    """btind.RelativeStrengthIndex: UpDay / DownDay 的 SMMA 之比, 最小周期 period + 1。"""
+
+    _fields = ("period", "prev_close", "up", "down", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close = NAN
+        self.up = SMMA(period)
+        self.down = SMMA(period)
+        self.value = NAN
+
+    def update(self, close: float) -> float:
+        diff = close - self.prev_close
+        self.prev_close = close
+        up = self.up.update(NAN if diff != diff else max(diff, 0.0))
+        down = self.down.update(NAN if diff != diff else max(-diff, 0.0))
+        if up != up or down != down:
+            self.value = NAN
+        elif down == 0.0:
+            # 与 NumPy 的除法相同: x / 0 为 inf (RSI = 100), 0 / 0 为 NaN
+            self.value = 100.0 if up > 0 else NAN
+        else:
+            self.value = 100.0 - 100.0 / (1.0 + up / down)
+        return self.value
+
+
+class ATR(StreamIndicator):
+    """btind.AverageTrueRange: TrueRange 的 SMMA, 最小周期 period + 1。"""
+
+    _fields = ("period", "prev_close", "smma", "value")
+
+    def __init__(self, period: int):
+        self.period = period
+        self.prev_close = NAN
+        self.smma = SMMA(period)
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        pc = self.prev_close
+        tr = NAN if pc != pc else max(high, pc) - min(low, pc)
+        self.prev_close = close
+        self.value = self.smma.update(tr)
+        return self.value
+
+
+class Bollinger(StreamIndicator):
+    """btind.BollingerBands, update 返回 (mid, top, bot)。"""
+
+    _fields = ("period", "devfactor", "mid", "meansq", "value")
+
+    def __init__(self, period: int, devfactor: float):
+        self.period = period
+        self.devfactor = devfactor
+        self.mid = SMA(period)
+        self.meansq = SMA(period)
+        self.value = (NAN, NAN, NAN)
+
+    def update(self, close: float) -> tuple:
+        mid = self.mid.update(close)
+        meansq = self.meansq.update(_pypow(close, 2))
+        stddev = self.devfactor * _pypow(meansq - _pypow(mid, 2), 0.5)
+        self.value = (mid, mid + stddev, mid - stddev)
+        return self.value
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Bollinger":
+        obj = super().from_state(state)
+        obj.value = tuple(obj.value)
+        return obj
+
+
+class CrossOver(StreamIndicator):
+    """btind.CrossOver: 上穿为 1, 下穿为 -1; 前一期的差值为 NonZeroDifference (差值为 0 时沿用上一个非零差值)。"""
+
+    _fields = ("nzd", "started", "value")
+
+    def __init__(self):
+        self.nzd = NAN
+        self.started = False
+        self.value = NAN
+
+    def update(self, fast: float, slow: float) -> float:
+        d = fast - slow
+        if not self.started:
+            if d == d:
+                self.nzd, self.started = d, True
+            return self.value
+        prev = self.nzd
+        up = prev < 0.0 and fast > slow
+        down = prev > 0.0 and fast < slow
+        self.value = float(up) - float(down)
+        if d != 0:
+            self.nzd = d
+        return self.value
+
+
+# --- B. 内置策略的信号 ---
+class StreamSignal(StreamIndicator, ABC):
+    """
+    单只股票、一组参数的策略信号。update(bar) 输入当天的 K 线 (含 high / low / close 的 dict 或 Series),
+    返回 {"ready": 是否已达到策略的最小周期, "buy": 开仓信号, "sell": 平仓信号, ...各策略的止损所需数值}。
+    信号条件与 strategies/ 中各策略 next() 的写法一致; 持仓、挂单与止损价由调用方根据自己的持仓判断。
+    """
+
+    strategy = None
+    _fields = ("params", "n_bars", "last")
+
+    def __init__(self, **params):
+        defaults = {k: v for k, v in self.strategy.params._getpairs().items() if k not in _BASE_PARAMS}
+        self.params = defaults | params
+        self.n_bars = 0
+        self.last = {}
+        self._build()
+
+    @abstractmethod
+    def _build(self) -> None:
+        """按 self.params 创建所用的增量指标。"""
+
+    @abstractmethod
+    def minperiod(self) -> int:
+        """产生有效信号所需的最少 K 线数。"""
+
+    @abstractmethod
+    def _signals(self, bar) -> dict:
+        """用一根 K 线更新指标, 返回包含 buy / sell 的信号与指标值。"""
+
+    def update(self, bar) -> dict:
+        self.n_bars += 1
+        signals = self._signals(bar)
+        ready = self.n_bars >= self.minperiod()
+        self.last = {"ready": ready, "buy": ready and bool(signals.pop("buy")),
+                     "sell": ready and bool(signals.pop("sell"))} | signals
+        return self.last
+
+    def warmup(self, df: pd.DataFrame) -> dict:
+        """用历史行情逐日更新, 返回最后一天的信号。"""
+        last = self.last
+        for high, low, close in zip(df["high"].tolist(), df["low"].tolist(), df["close"].tolist()):
+            last = self.update({"high": high, "low": low, "close": close})
+        return last
+
+
+class DMASignal(StreamSignal):
+    strategy = DMAStrategy
+    _fields = StreamSignal._fields + ("fast", "slow", "cross")
+
+    def _build(self):
+        p = self.params
+        self.fast, self.slow, self.cross = SMA(p["fast"]), SMA(p["slow"]), CrossOver()
+
+    def minperiod(self):
+        return max(self.params["fast"], self.params["slow"]) + 1
+
+    def _signals(self, bar):
+        cross = self.cross.update(self.fast.update(bar["close"]), self.slow.update(bar["close"]))
+        return {"buy": cross > 0, "sell": cross < 0, "fast_ma": self.fast.value, "slow_ma": self.slow.value}
+
+
+class RSIReversalSignal(StreamSignal):
+    strategy = RSI_Reversal_Strategy
+    _fields = StreamSignal._fields + ("rsi", "rsi_prev", "lma", "sma", "atr")
+
+    def _build(self):
+        p = self.params
+        self.rsi, self.rsi_prev = RSI(p["period"]), NAN
+        self.lma, self.sma, self.atr = SMA(p["lma_period"]), SMA(p["sma_period"]), ATR(p["atr_period"])
+
+    def minperiod(self):
+        p = self.params
+        return max(p["period"] + 1, p["lma_period"], p["sma_period"], p["atr_period"] + 1)
+
+    def _signals(self, bar):
+        p, close = self.params, bar["close"]
+        rsi_prev, rsi = self.rsi_prev, self.rsi.update(close)
+        self.rsi_prev = rsi
+        lma, sma, atr = self.lma.update(close), self.sma.update(close), self.atr.update(bar["high"], bar["low"], close)
+        buy = rsi > p["low_level"] and rsi_prev <= p["low_level"] and close > lma
+        sell = rsi < p["high_level"] and rsi_prev >= p["high_level"] and close < sma
+        return {"buy": buy, "sell": sell, "rsi": rsi, "atr": atr}
+
+
+class RSITrendSignal(StreamSignal):
+    strategy = RSI_Trend_Strategy
+    _fields = StreamSignal._fields + ("rsi", "rsi_prev", "rsi_ma", "lma", "sma", "atr", "prev_high")
+
+    def _build(self):
+        p = self.params
+        self.rsi, self.rsi_prev, self.rsi_ma = RSI(p["period"]), NAN, SMA(p["rsima_period"])
+        self.lma, self.sma, self.atr = SMA(p["lma_period"]), SMA(p["sma_period"]), ATR(p["atr_period"])
+        self.prev_high = NAN
+
+    def minperiod(self):
+        p = self.params
+        return max(p["period"] + 1, p["lma_period"], p["sma_period"], p["period"] + p["rsima_period"], p["atr_period"] + 1)
+
+    def _signals(self, bar):
+        p, close = self.params, bar["close"]
+        rsi_prev, rsi = self.rsi_prev, self.rsi.update(close)
+        self.rsi_prev = rsi
+        rsi_ma, lma = self.rsi_ma.update(rsi), self.lma.update(close)
+        self.sma.update(close)
+        atr = self.atr.update(bar["high"], bar["low"], close)
+        buy = rsi > p["high_level"] and rsi_prev <= p["high_level"] and rsi > rsi_ma and close > lma
+        sell = rsi < p["low_level"] and rsi_prev >= p["low_level"] and rsi < rsi_ma
+        # 收盘价等于前一日最高价时策略上移止损价 (close - atr * atr_multiplier)
+        ratchet = close == self.prev_high
+        self.prev_high = bar["high"]
+        return {"buy": buy, "sell": sell, "rsi": rsi, "atr": atr, "ratchet": ratchet}
+
+
+class BollingerSignal(StreamSignal):
+    strategy = Bollinger_Strategy
+    _fields = StreamSignal._fields + ("bands", "lma", "lmama", "atr")
+
+    def _build(self):
+        p = self.params
+        self.bands = Bollinger(p["period"], p["devfactor"])
+        self.lma, self.lmama, self.atr = SMA(p["lma_period"]), SMA(10), ATR(p["atr_period"])
+
+    def minperiod(self):
+        p = self.params
+        return max(p["period"], p["atr_period"] + 1, p["lma_period"] + 9)
+
+    def _signals(self, bar):
+        close = bar["close"]
+        mid, top, bot = self.bands.update(close)
+        lma = self.lma.update(close)
+        lmama = self.lmama.update(lma)
+        atr = self.atr.update(bar["high"], bar["low"], close)
+        # 持仓时只在 trend 为 False 时平仓或止损
+        return {"buy": close < bot, "sell": close > top, "trend": lma > lmama, "top": top, "bot": bot, "atr": atr}
+
+
+STREAM_SIGNALS = {
+    DMAStrategy: DMASignal,
+    RSI_Reversal_Strategy: RSIReversalSignal,
+    RSI_Trend_Strategy: RSITrendSignal,
+    Bollinger_Strategy: BollingerSignal,
+}
+
+
+# --- C. 股票池 ---
+def scan(signals: Dict[str, StreamSignal], bars: Dict[str, dict]) -> pd.DataFrame:
+    """用当天的 K 线 {code: bar} 更新股票池中每只股票的信号, 返回每只股票一行的信号表。没有当天 K 线 (停牌) 的股票不更新。"""
+    rows = {code: signals[code].update(bar) for code, bar in bars.items() if code in signals}
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def save_states(path: str, signals: Dict[str, StreamSignal]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({code: signal.state() for code, signal in signals.items()}, f)
+
+
+def load_states(path: str) -> Dict[str, StreamSignal]:
+    with open(path, encoding="utf-8") as f:
+        return {code: StreamIndicator.from_state(state) for code, state in json.load(f).items()}
@@ -0,0 +1,248 @@
+"""
+滚动前推 (walk-forward) 优化。
+
+把回测区间划分为依次向后推进的 训练窗口 + 测试窗口: 在训练窗口上遍历参数网格 (与 run_opt 相同), 按 metric 选出最佳参数组合,
+再在紧随其后的测试窗口上做样本外回测, 最后把各测试窗口的日收益率拼接为完整的样本外收益曲线并生成 QuantStats 报告。
+
+    - rolling: 训练窗口长度固定, 随测试窗口一起向后移动
+    - anchored: 训练窗口的起点固定为数据起点, 长度逐步增加
+
+数据只加载一次, 各窗口按位置切片 (不复制数据); 多个窗口可在进程池中并行 (每个进程负责一个窗口的优化与样本外回测)。
+某个训练窗口内 metric 全部不可用时 (训练窗口较短时 sharpe 可能为 None), 该窗口改按总收益 rtot 选优, 结果表的 metric 列记录实际使用的指标。
+样本外回测使用 训练窗口起点 ~ 测试窗口终点 的数据, 训练窗口部分只用于指标预热, 策略在测试窗口开始前不交易。
+"""
+import os
+import re
+import time
+import math
+import logging
+import datetime
+import functools
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+import backtrader as bt
+
+from backtest import load_pool_data, build_opt_combos, run_combo
+from strategies import IndicatorCache
+from utils import *
+
+_SPAN_UNITS = {"D": "days", "W": "weeks", "M": "months", "Y": "years"}
+FALLBACK_METRIC = "rtot"  # metric 在训练窗口内全部不可用时的选优指标 (Returns 分析器)
+
+
+def parse_span(span: str) -> pd.DateOffset:
+    """'3Y' / '6M' / '2W' / '90D' 转换为 DateOffset。"""
+    match = re.fullmatch(r"\s*(\d+)\s*([DWMY])\s*", span.upper())
+    if not match:
+        raise ValueError(f"无法解析的窗口长度: {span}, 应为数字加 D / W / M / Y, 如 '3Y'")
+    return pd.DateOffset(**{_SPAN_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def make_windows(dates: pd.DatetimeIndex, train: str, test: str, step: Optional[str] = None,
+                 anchored: bool = False) -> List[dict]:
+    """
+    按交易日 dates 划分窗口。每个窗口包含训练区间与测试区间的首末交易日, step 为窗口推进的长度 (默认与 test 相同, 测试窗口首尾相接)。
+    最后一个测试窗口不足 test 长度时截止到数据终点。
+    """
+    train_off, test_off = parse_span(train), parse_span(test)
+    step_off = parse_span(step) if step else test_off
+    first, last = dates[0], dates[-1]
+
+    windows = []
+    train_start, test_start = first, first + train_off
+    while test_start <= last:
+        test_end = test_start + test_off
+        train_idx = dates[(dates >= train_start) & (dates < test_start)]
+        test_idx = dates[(dates >= test_start) & (dates < test_end)]
+        if len(train_idx) and len(test_idx):
+            windows.append({"window": len(windows), "train_start": train_idx[0], "train_end": train_idx[-1],
+                            "test_start": test_idx[0], "test_end": test_idx[-1]})
+        test_start = test_start + step_off
+        if not anchored:
+            train_start = train_start + step_off
+    return windows
+
+
+def slice_data(stock_data_dict: Dict[str, pd.DataFrame], start: pd.Timestamp, end: pd.Timestamp) -> Dict[str, pd.DataFrame]:
+    """按日期 [start, end] 切片, 使用位置切片, 不复制数据。"""
+    sliced = {}
+    for code, df in stock_data_dict.items():
+        a, b = df.index.searchsorted(start, side="left"), df.index.searchsorted(end, side="right")
+        if b > a:
+            sliced[code] = df.iloc[a:b]
+    return sliced
+
+
+@functools.lru_cache(maxsize=None)
+def _gated(strategy: type) -> type:
+    """策略的子类: 参数 trade_start 之前只更新指标, 不执行 next (不交易)。"""
+    def next(self):
+        if self.datas[0].datetime.date(0) < self.p.trade_start:
+            return
+        strategy.next(self)
+
+    return type(strategy.__name__, (strategy,), {"params": (("trade_start", datetime.date.min),), "next": next,
+                                                 "__module__": strategy.__module__})
+
+
+def _score(result: Optional[dict], metric: str) -> float:
+    value = None if result is None else result.get(metric)
+    if not isinstance(value, (int, float)) or value != value:
+        return -math.inf
+    return float(value)
+
+
+def returns_metrics(returns: pd.Series) -> dict:
+    """
+    日收益率序列的统计量: 总收益 rtot、年化收益 rnorm (按 252 个交易日)、最大回撤 max_dd (%)、
+    年化夏普比率 sharpe (日收益率, 无风险利率为 0, 与 SharpeRatio 分析器的年度口径不同)。
+    """
+    if returns is None or returns.empty:
+        return {"rtot": "N/A", "rnorm": "N/A", "max_dd": "N/A", "sharpe": "N/A"}
+    equity = np.cumprod(1.0 + returns.to_numpy())
+    peak = np.maximum.accumulate(np.r_[1.0, equity])[1:]
+    rtot = float(equity[-1] - 1.0)
+    std = returns.std(ddof=1)
+    sharpe = returns.mean() / std * math.sqrt(252) if std > 0 else None
+    return {
+        "rtot": rtot,
+        "rnorm": (1.0 + rtot) ** (252 / len(returns)) - 1.0 if rtot > -1.0 else -1.0,
+        "max_dd": float(100.0 * np.max(1.0 - equity / peak)),
+        "sharpe": None if sharpe is None else float(sharpe),
+    }
+
+
+def run_window(window: dict, stock_data_dict: dict, strategy: bt.Strategy, grid: ParamGrid, remains_params: dict,
+               global_options: dict, opt_analyzers: list, output_dir: str, metric: str = "sharpe",
+               ind_cache: bool = True) -> dict:
+    """单个窗口: 训练窗口上遍历参数组合并按 metric 选优, 再在测试窗口上回测最佳参数组合。并行时在工作进程中执行。"""
+    # --- a. 训练窗口优化 ---
+    train_data = slice_data(stock_data_dict, window["train_start"], window["train_end"])
+    cache = IndicatorCache() if ind_cache and "ind_cache" in strategy.params._getkeys() else None
+    results = [run_combo(combo, train_data, strategy, remains_params, global_options, opt_analyzers, output_dir, ind_cache=cache)
+               for combo in grid]
+    if cache is not None:
+        cache.close()
+    scores = [_score(result, metric) for result in results]
+    used = metric
+    if results and max(scores) == -math.inf and metric != FALLBACK_METRIC:
+        # 训练窗口较短或交易过少时 sharpe 等指标为 None, 改按总收益选优
+        used = FALLBACK_METRIC
+        scores = [_score(result, used) for result in results]
+        print_and_log(f"窗口 {window["window"]}: 训练窗口内没有可用的 {metric}, 改按 {used} 选优", level=logging.WARNING)
+    if not results or max(scores) == -math.inf:
+        raise RuntimeError(f"窗口 {window["window"]}: 训练窗口内没有可用的 {metric} 或 {FALLBACK_METRIC}, "
+                           f"请检查训练窗口的数据与 opt_analyzers (需要包含 Returns)")
+    best = results[int(np.argmax(scores))]
+
+    # --- b. 测试窗口样本外回测 ---
+    test_data = slice_data(stock_data_dict, window["train_start"], window["test_end"])
+    test_analyzers = list(opt_analyzers) + (["PyFolio"] if "PyFolio" not in opt_analyzers else [])
+    oos = run_combo(best["combo"], test_data, _gated(strategy), remains_params | {"trade_start": window["test_start"].date()},
+                    global_options, test_analyzers, output_dir, with_returns=True)
+    returns = None if oos is None or oos["returns"] is None else oos["returns"]
+    if returns is not None:
+        if returns.index.tz is not None:
+            returns = returns.tz_convert(None)
+        returns = returns[(returns.index >= window["test_start"]) & (returns.index <= window["test_end"])]
+
+    row = dict(window)
+    row["best_combo"] = best["combo"]
+    row["metric"] = used
+    row |= {f"is_{k}": v for k, v in best.items() if k not in ("combo", "returns") and k not in best["combo"]}
+    row |= {f"oos_{k}": v for k, v in returns_metrics(returns).items()}
+    row["returns"] = returns
+    print_and_log(f"窗口 {window["window"]} ({window["test_start"].date()} ~ {window["test_end"].date()}) 完成: "
+                  f"{", ".join([f"{k}={v}" for k, v in best["combo"].items()])}, 样本内 {used}={best.get(used)}, "
+                  f"样本外 rtot={row["oos_rtot"]}")
+    return row
+
+
+def run_walk_forward(strategy: bt.Strategy, opt_params: dict, opt_vars: list, global_options: dict, opt_analyzers: list,
+                     train: str = "3Y", test: str = "1Y", step: Optional[str] = None, anchored: bool = False,
+                     metric: str = "sharpe", workers: Optional[int] = 1, ind_cache: bool = True):
+    """
+    滚动前推优化。train / test / step 为窗口长度 ('3Y'、'6M' 等), anchored 为 True 时训练窗口起点固定。
+    metric 为训练窗口选优的指标 (越大越好), 某个训练窗口内全部不可用时 (如 sharpe 为 None) 改按 FALLBACK_METRIC 选优,
+    两者都不可用时报错; workers 为并行处理窗口的进程数 (None 或 0 为全部核心)。
+
+    返回 (各窗口结果表, 拼接后的样本外日收益率, 输出目录)。结果表每个窗口一行: 窗口日期、最佳参数组合、选优指标 metric、样本内指标 (is_ 前缀)、
+    样本外指标 (oos_ 前缀, 由日收益率计算)。结果表保存为 walk_forward.csv, 样本外收益生成 QuantStats 报告。
+    """
+    # --- A. 初始化输出和日志 ---
+    name = global_options["strategy_name"]
+    output_dir = make_filename("results", "WalkForward", name, global_options["start_date"], global_options["end_date"],
+                               time.strftime(r'%H%M%S'))
+    output_dir, logger = setup_logger_opt(name, global_options["start_date"], global_options["end_date"], output_dir=output_dir)
+    print_and_log(f"滚动前推优化开始: {name}, 训练 {train} / 测试 {test}{" (锚定起点)" if anchored else ""}")
+    print(f"结果保存路径: {output_dir}")
+
+    # --- B. 加载全部数据, 划分窗口 ---
+    stock_data_dict = load_pool_data(global_options)
+    if not stock_data_dict:
+        print_and_log(f"加载股票代码 {global_options["data_pool"]} 在 {global_options["start_date"]} ~ {global_options["end_date"]} 期间的数据失败, 优化结束", level=logging.ERROR)
+        return None, None, output_dir
+
+    dates = pd.DatetimeIndex(sorted(set().union(*[df.index for df in stock_data_dict.values()])))
+    windows = make_windows(dates, train, test, step, anchored)
+    if not windows:
+        print_and_log(f"数据区间 {dates[0].date()} ~ {dates[-1].date()} 不足以划分训练 {train} + 测试 {test} 的窗口", level=logging.ERROR)
+        return None, None, output_dir
+    grid, remains_params = build_opt_combos(opt_params, opt_vars)
+    print_and_log(f"共 {len(windows)} 个窗口, 每个窗口 {len(grid)} 个参数组合")
+
+    # --- C. 各窗口优化与样本外回测 ---
+    window_kwargs = dict(strategy=strategy, grid=grid, remains_params=remains_params,
+                         global_options=global_options, opt_analyzers=opt_analyzers, output_dir=output_dir,
+                         metric=metric, ind_cache=ind_cache)
+    if resolve_workers(workers) == 1:
+        rows = [run_window(window, stock_data_dict, **window_kwargs) for window in windows]
+    else:
+        rows = run_combos_parallel(run_window, windows, stock_data_dict, workers=workers, chunksize=1, **window_kwargs)
+
+    # --- D. 拼接样本外收益, 输出结果 ---
+    segments = [row.pop("returns") for row in rows]
+    segments = [r for r in segments if r is not None and not r.empty]
+    oos_returns = pd.concat(segments) if segments else pd.Series(dtype=float)
+    oos_returns = oos_returns[~oos_returns.index.duplicated(keep="first")]
+
+    df_windows = pd.DataFrame(rows)
+    table_path = os.path.join(output_dir, "walk_forward.csv")
+    df_windows.to_csv(table_path, index=False)
+    print_and_log(f"各窗口结果已保存到: {table_path}")
+
+    summary = format_float_output(returns_metrics(oos_returns))
+    print_and_log(f"样本外合计: 总回报率 {summary["rtot"]}, 年化回报率 {summary["rnorm"]}, 最大回撤 {summary["max_dd"]}%, 夏普比率 {summary["sharpe"]}")
+    report_path = generate_quantstats_report(oos_returns, output_dir, f"{name} Walk-Forward")
+    if report_path:
+        print_and_log(f"样本外 QuantStats HTML 报告已生成, 路径为： {report_path}")
+
+    logging.shutdown()
+    return df_windows, oos_returns, output_dir
+
+
+if __name__ == "__main__":
+    from strategies import DMAStrategy
+
+    global_options = {
+        "strategy_name": 'DMAStrategy',
+        "data_pool": ['600519'],
+        "start_date": "2016-01-01",
+        "end_date": "2025-12-31",
+        'commission': 0.001,
+        "cash": 1000000.0
+    }
+    opt_params = {
+        "fast": range(5, 51, 5),
+        "slow": range(10, 251, 10),
+        "loss_stop": 0.05,
+        'target_pos': 0.95,
+        'constraints': ['fast < slow']
+    }
+    opt_vars = ['fast', 'slow']
+    opt_analyzers = ["Returns", "DrawDown", "SharpeRatio", 'TradeAnalyzer']
+
+    df_windows, oos_returns, output_dir = run_walk_forward(DMAStrategy, opt_params, opt_vars, global_options, opt_analyzers,
+                                                           train="3Y", test="1Y", workers=None)